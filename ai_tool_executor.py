@@ -1,13 +1,79 @@
 import json
-import subprocess
 import logging
 import re
 from typing import Dict, List, Optional, Any, Tuple
 from openai import OpenAI
 import os
-from models import ApiTool, SystemPrompt
+from models import SystemPrompt
+from tool_registry import tool_registry
+from tool_router import tool_router
+from tool_http_client import tool_http_client
+from tool_response_cache import tool_response_cache
 from flask import current_app
 
+# Common ambiguous keywords that might need clarification
+AMBIGUOUS_KEYWORDS = [
+    'credits', 'credit', 'account', 'balance', 'status', 'info', 'information',
+    'details', 'data', 'token', 'tokens', 'user', 'profile', 'settings'
+]
+
+# Words that show a clear intent, so the question doesn't need clarification
+CLEAR_INTENT_WORDS = [
+    'how', 'what', 'where', 'when', 'why', 'can', 'could', 'should', 'would',
+    'help', 'show', 'get', 'find', 'search', 'post', 'create', 'update', 'delete'
+]
+
+CLARIFICATION_RULES = """ONLY ask for clarification if:
+1. The question is a single generic word that could match multiple tools
+2. The question is so vague it's impossible to determine intent
+3. There are multiple tools that could handle the exact same keyword
+
+DO NOT ask for clarification if:
+1. The question contains context or action words
+2. The question is a complete sentence
+3. The question has clear intent even if it's not perfectly specific
+4. The question doesn't match any tool closely"""
+
+CLARIFICATION_EXAMPLES = """Examples of when TO ask clarification:
+- "credits" (single word, could mean balance OR purchase)
+- "account" (single word, could mean details OR balance)
+
+Examples of when NOT to ask clarification:
+- "how can I post my job" (clear intent and context)
+- "what is my balance" (clear intent)
+- "help me with account settings" (clear context)
+- "show me my status" (clear action)
+
+Be extremely conservative - only ask when truly necessary."""
+
+# Pseudo-tool offered next to the real tools, so one function calling request can decide
+# between clarification, a tool call and no tool
+CLARIFICATION_FUNCTION_NAME = "ask_for_clarification"
+
+CLARIFICATION_FUNCTION = {
+    "type": "function",
+    "function": {
+        "name": CLARIFICATION_FUNCTION_NAME,
+        "description": "Ask the user a clarifying question when their question is extremely ambiguous and could match multiple tools",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "question": {
+                    "type": "string",
+                    "description": "The clarifying question to ask the user"
+                }
+            },
+            "required": ["question"]
+        }
+    }
+}
+
+COMBINED_CLARIFICATION_INSTRUCTIONS = f"""The user's question is short and may be ambiguous. Be a conservative assistant: call {CLARIFICATION_FUNCTION_NAME} only when the question is EXTREMELY ambiguous and could match multiple available tools. Otherwise call the matching tool, or answer without tools if none fits.
+
+{CLARIFICATION_RULES}
+
+{CLARIFICATION_EXAMPLES}"""
+
 class AIToolExecutor:
     """AI-driven tool executor using OpenAI Function Calling"""
     
@@ -16,34 +82,30 @@ class AIToolExecutor:
         if api_key:
             api_key = api_key.strip()  # Remove any whitespace
         self.openai_client = OpenAI(api_key=api_key)
+        # Decide clarification and tool selection in a single gpt-4o call
+        self.combined_decision = os.environ.get('AI_TOOL_COMBINED_DECISION', 'true').lower() == 'true'
         self.logger = logging.getLogger(__name__)
     
-    def get_available_tools(self) -> List[ApiTool]:
-        """Get all active API tools from database"""
+    def get_available_tools(self) -> List[Dict[str, Any]]:
+        """Get all active API tools from the tool registry"""
         try:
-            tools = ApiTool.query.filter_by(active=True).order_by(ApiTool.priority.desc()).all()
-            return tools
+            return tool_registry.get_tools()
         except Exception as e:
             self.logger.error(f"Error loading API tools: {e}")
             return []
     
     def get_tools_as_openai_functions(self) -> List[Dict[str, Any]]:
-        """Convert API tools to OpenAI function calling format"""
-        tools = self.get_available_tools()
-        functions = []
-        
-        for tool in tools:
-            function_spec = tool.get_openai_function_spec()
-            functions.append({
-                "type": "function",
-                "function": function_spec
-            })
-        
-        return functions
+        """Get API tools in OpenAI function calling format (prebuilt by the tool registry)"""
+        try:
+            return tool_registry.get_functions()
+        except Exception as e:
+            self.logger.error(f"Error loading API tools: {e}")
+            return []
     
-    def should_use_tools(self, question: str, conversation_history: List[Dict] = None) -> Tuple[bool, Optional[str], Optional[Dict], Optional[str]]:
+    def should_use_tools(self, question: str, conversation_history: List[Dict] = None, question_embedding: List[float] = None) -> Tuple[bool, Optional[str], Optional[Dict], Optional[str]]:
         """
         Use AI to determine if tools should be used and which one
+        question_embedding, if the caller already has it, is reused by the tool router
         Returns: (should_use_tools, tool_name, tool_arguments, clarification_question)
         """
         try:
@@ -52,13 +114,26 @@ class AIToolExecutor:
             if not tools:
                 return False, None, None, None
             
-            # First, check if the question is ambiguous and needs clarification
-            clarification_check = self.check_for_clarification_needed(question, tools)
-            if clarification_check:
-                return False, None, None, clarification_check
+            offer_clarification = False
+            if self._may_need_clarification(question, tools):
+                if self.combined_decision:
+                    # Let the tool selection call also ask for clarification (one round trip instead of two)
+                    offer_clarification = True
+                else:
+                    # First, check if the question is ambiguous and needs clarification
+                    clarification_check = self.check_for_clarification_needed(question, tools)
+                    if clarification_check:
+                        return False, None, None, clarification_check
+            
+            # Skip the function calling round trip when no tool is close to the question
+            if not offer_clarification and not tool_router.should_escalate(question, tools, conversation_history, question_embedding):
+                return False, None, None, None
             
             # Build conversation context with system prompt from database
             system_prompt = SystemPrompt.get_active_prompt()
+            if offer_clarification:
+                system_prompt = f"{system_prompt}\n\n{COMBINED_CLARIFICATION_INSTRUCTIONS}"
+                tools = tools + [CLARIFICATION_FUNCTION]
             messages = [
                 {
                     "role": "system",
@@ -67,7 +142,8 @@ class AIToolExecutor:
             ]
             
             if conversation_history:
-                messages.extend(conversation_history[-5:])  # Last 5 messages for context
+                # Last 5 messages for context (only the fields the chat API accepts)
+                messages.extend({"role": message["role"], "content": message["content"]} for message in conversation_history[-5:])
             
             messages.append({
                 "role": "user",
@@ -90,6 +166,13 @@ class AIToolExecutor:
                 function_name = tool_call.function.name
                 function_args = json.loads(tool_call.function.arguments)
                 
+                if offer_clarification and function_name == CLARIFICATION_FUNCTION_NAME:
+                    clarification = (function_args.get('question') or '').strip()
+                    if clarification:
+                        self.logger.info(f"Clarification needed for question: '{question}' -> '{clarification}'")
+                        return False, None, None, clarification
+                    return False, None, None, None
+                
                 self.logger.info(f"AI selected tool: {function_name} with args: {function_args}")
                 return True, function_name, function_args, None
             
@@ -107,35 +190,31 @@ class AIToolExecutor:
             
             return False, None, None, None
     
+    def _may_need_clarification(self, question: str, tools: List[Dict]) -> bool:
+        """
+        Pre-filter: only short, generic questions with ambiguous keywords can need clarification,
+        and only when there are multiple tools they could match
+        """
+        if len(tools) < 2:
+            return False
+        
+        question_lower = question.lower().strip()
+        
+        # Skip clarification if the question is long or contains action words
+        if len(question.split()) > 5 or any(word in question_lower for word in CLEAR_INTENT_WORDS):
+            return False
+        
+        # Only proceed if the question contains ambiguous keywords
+        return any(keyword in question_lower for keyword in AMBIGUOUS_KEYWORDS)
+    
     def check_for_clarification_needed(self, question: str, tools: List[Dict]) -> Optional[str]:
         """
-        Check if the question is ambiguous and needs clarification
+        Check if the question is ambiguous and needs clarification (separate gpt-4o call, used when
+        AI_TOOL_COMBINED_DECISION is disabled)
         Returns clarification question if needed, None otherwise
         """
         try:
-            # Only check for clarification if we have multiple tools and the question is very short/generic
-            if len(tools) < 2:
-                return None
-            
-            # Pre-filter: Only check for clarification if the question is potentially ambiguous
-            # Look for single words or very generic terms that could match multiple tools
-            question_lower = question.lower().strip()
-            
-            # Common ambiguous keywords that might need clarification
-            ambiguous_keywords = [
-                'credits', 'credit', 'account', 'balance', 'status', 'info', 'information',
-                'details', 'data', 'token', 'tokens', 'user', 'profile', 'settings'
-            ]
-            
-            # Skip clarification if the question is long or contains action words
-            if len(question.split()) > 5 or any(word in question_lower for word in [
-                'how', 'what', 'where', 'when', 'why', 'can', 'could', 'should', 'would',
-                'help', 'show', 'get', 'find', 'search', 'post', 'create', 'update', 'delete'
-            ]):
-                return None
-            
-            # Only proceed if the question contains ambiguous keywords
-            if not any(keyword in question_lower for keyword in ambiguous_keywords):
+            if not self._may_need_clarification(question, tools):
                 return None
                 
             # Extract tool names and descriptions for context
@@ -156,16 +235,7 @@ class AIToolExecutor:
 Available tools and their purposes:
 {json.dumps(tool_context, indent=2)}
 
-ONLY ask for clarification if:
-1. The question is a single generic word that could match multiple tools
-2. The question is so vague it's impossible to determine intent
-3. There are multiple tools that could handle the exact same keyword
-
-DO NOT ask for clarification if:
-1. The question contains context or action words
-2. The question is a complete sentence
-3. The question has clear intent even if it's not perfectly specific
-4. The question doesn't match any tool closely
+{CLARIFICATION_RULES}
 
 If clarification is absolutely needed, respond with:
 CLARIFICATION_NEEDED: [Your clarifying question here]
@@ -173,17 +243,7 @@ CLARIFICATION_NEEDED: [Your clarifying question here]
 If the question is clear enough to proceed, respond with:
 CLEAR
 
-Examples of when TO ask clarification:
-- "credits" (single word, could mean balance OR purchase)
-- "account" (single word, could mean details OR balance)
-
-Examples of when NOT to ask clarification:
-- "how can I post my job" (clear intent and context)
-- "what is my balance" (clear intent)
-- "help me with account settings" (clear context)
-- "show me my status" (clear action)
-
-Be extremely conservative - only ask when truly necessary."""
+{CLARIFICATION_EXAMPLES}"""
                 },
                 {
                     "role": "user", 
@@ -211,58 +271,41 @@ Be extremely conservative - only ask when truly necessary."""
             self.logger.error(f"Error checking for clarification: {e}")
             return None
     
-    def execute_tool(self, tool_name: str, tool_arguments: Dict[str, Any], original_question: str) -> Dict[str, Any]:
-        """Execute the selected tool with given arguments"""
+    def execute_tool(self, tool_name: str, tool_arguments: Dict[str, Any], original_question: str, cache_scope: str = None) -> Dict[str, Any]:
+        """
+        Execute the selected tool with given arguments
+        Results of tools with a cache TTL are reused for the same cache_scope (user or session) and
+        resolved arguments; the result reports 'cached' and, for hits, 'cache_age_seconds'
+        """
         try:
-            # Get tool from database
-            tool = ApiTool.query.filter_by(name=tool_name, active=True).first()
+            # Get tool from the registry
+            tool = tool_registry.get_tool(tool_name)
             if not tool:
                 return {
                     'success': False,
                     'error': f'Tool {tool_name} not found or inactive'
                 }
             
-            # Process curl command with arguments
-            processed_command = self._process_curl_command(tool.curl_command, tool_arguments, original_question)
-            
-            # Execute the curl command
-            result = subprocess.run(
-                processed_command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0:
-                # Try to parse JSON response
-                try:
-                    response_data = json.loads(result.stdout)
-                    
-                    # Apply response mapping if configured
-                    mapped_response = self._apply_response_mapping(response_data, tool.get_response_mapping())
-                    
-                    return {
-                        'success': True,
-                        'data': mapped_response,
-                        'raw_data': response_data,
-                        'tool_name': tool_name,
-                        'response_template': tool.response_template
-                    }
-                except json.JSONDecodeError:
-                    return {
-                        'success': True,
-                        'data': result.stdout,
-                        'raw_data': result.stdout,
-                        'tool_name': tool_name,
-                        'response_template': tool.response_template
-                    }
-            else:
-                return {
-                    'success': False,
-                    'error': f'Command failed: {result.stderr}',
-                    'tool_name': tool_name
-                }
+            substitutions = dict(tool_arguments)
+            substitutions['question'] = original_question
+            substitutions['user_query'] = original_question
+            
+            cache_key = None
+            if tool['cache_ttl_seconds'] > 0 and cache_scope:
+                # Only the placeholders the command actually uses identify the request
+                resolved = {key: value for key, value in substitutions.items() if f"{{{key}}}" in tool['curl_command']}
+                cache_key = tool_response_cache.make_key(tool_name, tool_registry.version, resolved, cache_scope)
+                cached = tool_response_cache.get(cache_key)
+                if cached:
+                    cached_result, age = cached
+                    self.logger.info(f"Tool response cache hit: {tool_name} (age {age:.0f}s)")
+                    return dict(cached_result, cached=True, cache_age_seconds=round(age, 1))
+            
+            result = self._run_tool(tool, tool_name, substitutions)
+            result['cached'] = False
+            if cache_key is not None and result['success']:
+                tool_response_cache.set(cache_key, result, tool['cache_ttl_seconds'])
+            return result
                 
         except Exception as e:
             self.logger.error(f"Error executing tool {tool_name}: {e}")
@@ -272,20 +315,39 @@ Be extremely conservative - only ask when truly necessary."""
                 'tool_name': tool_name
             }
     
-    def _process_curl_command(self, curl_command: str, arguments: Dict[str, Any], original_question: str) -> str:
-        """Process curl command by replacing placeholders with actual values"""
-        processed_command = curl_command
-        
-        # Replace function arguments
-        for key, value in arguments.items():
-            placeholder = f"{{{key}}}"
-            processed_command = processed_command.replace(placeholder, str(value))
+    def _run_tool(self, tool: Dict[str, Any], tool_name: str, substitutions: Dict[str, Any]) -> Dict[str, Any]:
+        """Send the tool's curl command (with placeholders filled) on the pooled HTTP client"""
+        result = tool_http_client.execute(tool['curl_command'], substitutions)
         
-        # Replace special placeholders
-        processed_command = processed_command.replace("{question}", original_question)
-        processed_command = processed_command.replace("{user_query}", original_question)
-        
-        return processed_command
+        if result['success']:
+            # Try to parse JSON response
+            try:
+                response_data = json.loads(result['text'])
+                
+                # Apply response mapping if configured
+                mapped_response = self._apply_response_mapping(response_data, tool['response_mapping'])
+                
+                return {
+                    'success': True,
+                    'data': mapped_response,
+                    'raw_data': response_data,
+                    'tool_name': tool_name,
+                    'response_template': tool['response_template']
+                }
+            except json.JSONDecodeError:
+                return {
+                    'success': True,
+                    'data': result['text'],
+                    'raw_data': result['text'],
+                    'tool_name': tool_name,
+                    'response_template': tool['response_template']
+                }
+        else:
+            return {
+                'success': False,
+                'error': f"Request failed: {result['error']}",
+                'tool_name': tool_name
+            }
     
     def _apply_response_mapping(self, response_data: Any, mapping_config: Dict[str, Any]) -> Any:
         """Apply response mapping configuration to extract specific fields"""
@@ -376,13 +438,16 @@ Be extremely conservative - only ask when truly necessary."""
             self.logger.error(f"Error formatting tool response: {e}")
             return f"I found some information but had trouble formatting it: {tool_result.get('data', 'No data available')}"
     
-    def process_question_with_tools(self, question: str, conversation_history: List[Dict] = None) -> Tuple[bool, str]:
+    def process_question_with_tools(self, question: str, conversation_history: List[Dict] = None, cache_scope: str = None, tool_info: Dict[str, Any] = None, question_embedding: List[float] = None) -> Tuple[bool, str]:
         """
         Main method to process a question with AI tool selection
+        cache_scope identifies the user or session for cached tool responses
+        tool_info, if given, receives the executed tool's name, 'cached' and 'cache_age_seconds'
+        question_embedding, if the caller already has it, is reused by the tool router
         Returns: (used_tools, formatted_response)
         """
         # Check if AI wants to use tools
-        should_use, tool_name, tool_args, clarification = self.should_use_tools(question, conversation_history)
+        should_use, tool_name, tool_args, clarification = self.should_use_tools(question, conversation_history, question_embedding)
         
         # If clarification is needed, return it immediately
         if clarification:
@@ -390,7 +455,12 @@ Be extremely conservative - only ask when truly necessary."""
         
         if should_use and tool_name and tool_args is not None:
             # Execute the selected tool
-            tool_result = self.execute_tool(tool_name, tool_args, question)
+            tool_result = self.execute_tool(tool_name, tool_args, question, cache_scope)
+            if tool_info is not None:
+                tool_info['tool_name'] = tool_name
+                tool_info['cached'] = tool_result.get('cached', False)
+                if tool_result.get('cached'):
+                    tool_info['cache_age_seconds'] = tool_result.get('cache_age_seconds')
             
             # Format the response
             formatted_response = self.format_tool_response(tool_result, question)
@@ -0,0 +1,423 @@
+"""
+Hourly and daily rollups of conversation and feedback counts.
+
+The stats endpoints used to count whole tables on every dashboard refresh. A compactor thread in
+each worker now aggregates recent hours (grouped range queries over created_at indexes) into the
+analytics_rollups table, sums each touched day into a day row, and backfills older history a chunk
+at a time (migrate_analytics_rollups.py backfills it all at once). The endpoints then add up a
+handful of day rows plus the hour rows at the edges of the requested range; ranges reaching further
+back than the backfill so far are counted live instead.
+
+Writes that change already compacted data (a conversation transferred to live chat, feedback marked
+for training, cleared messages) call mark_dirty() or mark_rows_dirty() so those hours are recomputed
+on the next pass.
+"""
+
+import os
+import atexit
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+from sqlalchemy import and_, or_
+from models import AnalyticsRollup, UnifiedConversation, UnifiedMessage, RagFeedback, db
+
+# Marker row of a computed hour: value 1 when up to date, 0 when marked dirty
+COMPACTED = '_compacted'
+
+
+def _hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _day(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ceil(moment: datetime, floor, unit: timedelta) -> datetime:
+    floored = floor(moment)
+    return floored if floored == moment else floored + unit
+
+
+def parse_range(args) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Time range from request args: ?days=N, or ?from=/&to= as ISO dates or datetimes (UTC)"""
+    if args.get('days'):
+        return datetime.utcnow() - timedelta(days=float(args['days'])), None
+    start = datetime.fromisoformat(args['from']) if args.get('from') else None
+    end = datetime.fromisoformat(args['to']) if args.get('to') else None
+    return start, end
+
+
+class AnalyticsRollups:
+    """Maintains and reads the analytics_rollups table"""
+
+    def __init__(self, interval_seconds: float = 60, lookback_hours: int = 2, backfill_hours: int = 24 * 90):
+        self.interval_seconds = interval_seconds
+        self.lookback_hours = lookback_hours
+        self.backfill_hours = backfill_hours
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._app = None
+        self._thread = None
+        self._thread_pid = None
+        self._backfilled = False
+        self.compactions = 0
+        self.live_fallbacks = 0
+        self.hours_compacted = 0
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app) -> None:
+        """Compact in the background of every worker serving this Flask app"""
+        self._app = app
+        # Started on the first request so that every gunicorn worker (after fork) runs its own thread
+        app.before_request(self._ensure_worker)
+        atexit.register(self.shutdown)
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='analytics-rollups', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                with self._app.app_context():
+                    self.compact_if_due()
+            except Exception as e:
+                db.session.rollback()
+                self.logger.error(f"Error compacting analytics rollups: {str(e)}")
+
+    def _last_compacted_at(self) -> Optional[datetime]:
+        return db.session.query(db.func.max(AnalyticsRollup.computed_at)).filter(
+            AnalyticsRollup.granularity == 'hour', AnalyticsRollup.metric == COMPACTED
+        ).scalar()
+
+    def compact_if_due(self) -> int:
+        """Compact unless another worker did so within the interval"""
+        last = self._last_compacted_at()
+        if last is not None and (datetime.utcnow() - last).total_seconds() < self.interval_seconds:
+            return 0
+        return self.compact()
+
+    def mark_dirty(self, moment: Optional[datetime]) -> None:
+        """Have the hour containing `moment` recomputed on the next pass (part of the caller's transaction)"""
+        if moment is None:
+            return
+        self._mark_hours_dirty([_hour(moment)])
+
+    def mark_rows_dirty(self, query, column) -> None:
+        """Mark every hour holding rows of `query` (bucketed by `column`) dirty, e.g. just before deleting them"""
+        bucket = self._bucket(column)
+        hours = [self._to_datetime(hour) for (hour,) in query.with_entities(bucket).distinct() if hour is not None]
+        self._mark_hours_dirty(hours)
+
+    def _mark_hours_dirty(self, hours: List[datetime]) -> None:
+        if not hours:
+            return
+        AnalyticsRollup.query.filter(
+            AnalyticsRollup.granularity == 'hour', AnalyticsRollup.metric == COMPACTED,
+            AnalyticsRollup.bucket_start.in_(hours)
+        ).update({AnalyticsRollup.value: 0}, synchronize_session=False)
+
+    def _bucket(self, column):
+        """SQL expression truncating a timestamp column to the hour"""
+        dialect = db.engine.dialect.name
+        if dialect == 'postgresql':
+            return db.func.date_trunc('hour', column)
+        if dialect in ('mysql', 'mariadb'):
+            return db.func.date_format(column, '%Y-%m-%d %H:00:00')
+        return db.func.strftime('%Y-%m-%d %H:00:00', column)
+
+    @staticmethod
+    def _to_datetime(value) -> datetime:
+        """Hour bucket as returned by the database: a datetime, or text from strftime/DATE_FORMAT"""
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, bytes):
+            value = value.decode('ascii')
+        return datetime.fromisoformat(value)
+
+    def _aggregate(self, start: Optional[datetime], end: Optional[datetime]) -> Dict[tuple, int]:
+        """Counts per (hour, metric, dimension) for [start, end) (unbounded where None), one grouped query per source"""
+        values: Dict[tuple, int] = {}
+
+        def in_range(column):
+            conditions = []
+            if start is not None:
+                conditions.append(column >= start)
+            if end is not None:
+                conditions.append(column < end)
+            return and_(*conditions) if conditions else db.true()
+
+        def collect(metric, rows):
+            for row in rows:
+                bucket, dimension, count = row
+                values[(self._to_datetime(bucket), metric, dimension or '')] = count
+
+        conversation_bucket = self._bucket(UnifiedConversation.created_at)
+        collect('conversations', db.session.query(
+            conversation_bucket, UnifiedConversation.conversation_type, db.func.count(UnifiedConversation.id)
+        ).filter(in_range(UnifiedConversation.created_at)).group_by(conversation_bucket, UnifiedConversation.conversation_type))
+
+        message_bucket = self._bucket(UnifiedMessage.created_at)
+        collect('messages', db.session.query(
+            message_bucket, db.literal(''), db.func.count(UnifiedMessage.id)
+        ).filter(in_range(UnifiedMessage.created_at)).group_by(message_bucket))
+
+        # A user counts once, in the hour of their first conversation, so hours and days add up
+        earlier = db.aliased(UnifiedConversation)
+        collect('new_users', db.session.query(
+            conversation_bucket, db.literal(''), db.func.count(db.distinct(UnifiedConversation.user_identifier))
+        ).filter(
+            in_range(UnifiedConversation.created_at),
+            ~db.session.query(earlier.id).filter(
+                earlier.user_identifier == UnifiedConversation.user_identifier,
+                earlier.created_at < UnifiedConversation.created_at
+            ).exists()
+        ).group_by(conversation_bucket))
+
+        feedback_bucket = self._bucket(RagFeedback.feedback_timestamp)
+        feedback_rows = db.session.query(
+            feedback_bucket, RagFeedback.feedback_type, RagFeedback.response_type,
+            db.func.count(RagFeedback.id),
+            db.func.sum(db.case((RagFeedback.used_for_training == True, 1), else_=0))
+        ).filter(in_range(RagFeedback.feedback_timestamp)).group_by(feedback_bucket, RagFeedback.feedback_type, RagFeedback.response_type)
+        for bucket, feedback_type, response_type, count, used_for_training in feedback_rows:
+            bucket = self._to_datetime(bucket)
+            values[(bucket, 'feedback', f"{feedback_type}|{response_type}")] = count
+            if used_for_training:
+                key = (bucket, 'feedback_used_for_training', '')
+                values[key] = values.get(key, 0) + int(used_for_training)
+
+        return values
+
+    def _earliest_data(self) -> Optional[datetime]:
+        earliest = [
+            db.session.query(db.func.min(UnifiedConversation.created_at)).scalar(),
+            db.session.query(db.func.min(UnifiedMessage.created_at)).scalar(),
+            db.session.query(db.func.min(RagFeedback.feedback_timestamp)).scalar()
+        ]
+        earliest = [moment for moment in earliest if moment is not None]
+        return min(earliest) if earliest else None
+
+    def _oldest_compacted(self) -> Optional[datetime]:
+        return db.session.query(db.func.min(AnalyticsRollup.bucket_start)).filter(
+            AnalyticsRollup.granularity == 'hour', AnalyticsRollup.metric == COMPACTED
+        ).scalar()
+
+    def _hours_to_compact(self, now: datetime) -> List[datetime]:
+        current = _hour(now)
+        hours = {current - timedelta(hours=offset) for offset in range(self.lookback_hours)}
+
+        # Catch up on hours missed while no compactor ran
+        newest_compacted = db.session.query(db.func.max(AnalyticsRollup.bucket_start)).filter(
+            AnalyticsRollup.granularity == 'hour', AnalyticsRollup.metric == COMPACTED
+        ).scalar()
+        if newest_compacted is not None:
+            hour = newest_compacted + timedelta(hours=1)
+            while hour < current:
+                hours.add(hour)
+                hour += timedelta(hours=1)
+
+        hours.update(row.bucket_start for row in AnalyticsRollup.query.filter_by(
+            granularity='hour', metric=COMPACTED, value=0
+        ).all())
+
+        # Backfill history, newest first, a chunk per pass
+        oldest_compacted = self._oldest_compacted() or min(hours)
+        earliest = self._earliest_data()
+        if earliest is not None and _hour(earliest) < oldest_compacted:
+            backfill_from = max(_hour(earliest), oldest_compacted - timedelta(hours=self.backfill_hours))
+            hour = backfill_from
+            while hour < oldest_compacted:
+                hours.add(hour)
+                hour += timedelta(hours=1)
+        return sorted(hours)
+
+    def compact(self, now: Optional[datetime] = None) -> int:
+        """Recompute recent, dirty and not yet backfilled hours plus their days; returns the number of hours"""
+        now = now or datetime.utcnow()
+        hours = self._hours_to_compact(now)
+
+        # Aggregate contiguous runs of hours with one set of range queries each
+        values: Dict[tuple, int] = {}
+        run_start = previous = None
+        for hour in hours + [None]:
+            if hour is not None and previous is not None and hour == previous + timedelta(hours=1):
+                previous = hour
+                continue
+            if run_start is not None:
+                values.update(self._aggregate(run_start, previous + timedelta(hours=1)))
+            run_start = previous = hour
+
+        AnalyticsRollup.query.filter(
+            AnalyticsRollup.granularity == 'hour', AnalyticsRollup.bucket_start.in_(hours)
+        ).delete(synchronize_session=False)
+        rows = [
+            AnalyticsRollup(granularity='hour', bucket_start=bucket, metric=metric, dimension=dimension, value=value, computed_at=now)
+            for (bucket, metric, dimension), value in values.items()
+        ]
+        rows.extend(
+            AnalyticsRollup(granularity='hour', bucket_start=hour, metric=COMPACTED, dimension='', value=1, computed_at=now)
+            for hour in hours
+        )
+        db.session.add_all(rows)
+        db.session.flush()
+
+        # Day rows are the sums of their hour rows
+        days = sorted({_day(hour) for hour in hours})
+        AnalyticsRollup.query.filter(
+            AnalyticsRollup.granularity == 'day', AnalyticsRollup.bucket_start.in_(days)
+        ).delete(synchronize_session=False)
+        for day in days:
+            sums = db.session.query(
+                AnalyticsRollup.metric, AnalyticsRollup.dimension, db.func.sum(AnalyticsRollup.value)
+            ).filter(
+                AnalyticsRollup.granularity == 'hour',
+                AnalyticsRollup.bucket_start >= day, AnalyticsRollup.bucket_start < day + timedelta(days=1),
+                AnalyticsRollup.metric != COMPACTED
+            ).group_by(AnalyticsRollup.metric, AnalyticsRollup.dimension).all()
+            db.session.add_all(
+                AnalyticsRollup(granularity='day', bucket_start=day, metric=metric, dimension=dimension, value=int(value), computed_at=now)
+                for metric, dimension, value in sums
+            )
+
+        try:
+            db.session.commit()
+        except Exception as e:
+            # Another worker compacted the same hours concurrently; its rows stand
+            db.session.rollback()
+            self.logger.warning(f"Analytics rollup compaction skipped: {str(e)}")
+            return 0
+
+        self.compactions += 1
+        self.hours_compacted += len(hours)
+        self.logger.info(f"Compacted analytics rollups for {len(hours)} hours")
+        return len(hours)
+
+    def _covers(self, start: Optional[datetime]) -> bool:
+        """Whether the compacted hours reach back to `start` (to the oldest data when start is None)"""
+        if self._backfilled:
+            return True
+        oldest_compacted = self._oldest_compacted()
+        if oldest_compacted is None:
+            return False
+        earliest = self._earliest_data()
+        if earliest is None or _hour(earliest) >= oldest_compacted:
+            # Only new hours get compacted from now on
+            self._backfilled = True
+            return True
+        return start is not None and start >= oldest_compacted
+
+    def _live_totals(self, start: Optional[datetime], end: Optional[datetime]) -> Dict[tuple, int]:
+        totals: Dict[tuple, int] = {}
+        for (_, metric, dimension), value in self._aggregate(start, end).items():
+            totals[(metric, dimension)] = totals.get((metric, dimension), 0) + value
+        return totals
+
+    def totals(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[tuple, int]:
+        """Sum of every (metric, dimension) over [start, end): whole days from day rows, the edges from hour rows"""
+        if not self._covers(start):
+            # Not compacted that far back yet: count the source tables (compaction stays in the background)
+            self.live_fallbacks += 1
+            return self._live_totals(start, end)
+
+        ranges = []
+        if start is None and end is None:
+            ranges.append(AnalyticsRollup.granularity == 'day')
+        else:
+            # Widen to whole hours, then split into whole days and the hours before and after them
+            first_hour = _hour(start) if start else datetime.min
+            end_hour = _ceil(end, _hour, timedelta(hours=1)) if end else datetime.max
+            first_day = _ceil(first_hour, _day, timedelta(days=1))
+            end_day = _day(end_hour)
+            if first_day < end_day:
+                ranges.append(and_(AnalyticsRollup.granularity == 'day',
+                                   AnalyticsRollup.bucket_start >= first_day, AnalyticsRollup.bucket_start < end_day))
+                hour_ranges = [(first_hour, first_day), (end_day, end_hour)]
+            else:
+                hour_ranges = [(first_hour, end_hour)]
+            for range_start, range_end in hour_ranges:
+                if range_start < range_end:
+                    ranges.append(and_(AnalyticsRollup.granularity == 'hour',
+                                       AnalyticsRollup.bucket_start >= range_start, AnalyticsRollup.bucket_start < range_end))
+            if not ranges:
+                return {}
+
+        rows = db.session.query(
+            AnalyticsRollup.metric, AnalyticsRollup.dimension, db.func.sum(AnalyticsRollup.value)
+        ).filter(or_(*ranges), AnalyticsRollup.metric != COMPACTED).group_by(
+            AnalyticsRollup.metric, AnalyticsRollup.dimension
+        ).all()
+        return {(metric, dimension): int(value) for metric, dimension, value in rows}
+
+    def conversation_stats(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Any]:
+        totals = self.totals(start, end)
+        by_type = {dimension: value for (metric, dimension), value in totals.items() if metric == 'conversations'}
+        return {
+            'total_conversations': sum(by_type.values()),
+            'chatbot_conversations': by_type.get('chatbot', 0),
+            'live_chat_conversations': by_type.get('live_chat', 0),
+            'total_messages': totals.get(('messages', ''), 0),
+            'unique_users': self._unique_users(start, end),
+            # Users whose first conversation falls in the range
+            'new_users': totals.get(('new_users', ''), 0)
+        }
+
+    def _unique_users(self, start: Optional[datetime], end: Optional[datetime]) -> int:
+        """Distinct users with a conversation started in the range (all users without one), counted live:
+        distinct counts can't be added up from hour rows"""
+        query = db.session.query(db.func.count(db.distinct(UnifiedConversation.user_identifier)))
+        if start is not None:
+            query = query.filter(UnifiedConversation.created_at >= start)
+        if end is not None:
+            query = query.filter(UnifiedConversation.created_at < end)
+        return query.scalar() or 0
+
+    def feedback_stats(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Any]:
+        totals = self.totals(start, end)
+        by_feedback_type: Dict[str, int] = {}
+        response_types: Dict[str, int] = {}
+        for (metric, dimension), value in totals.items():
+            if metric != 'feedback':
+                continue
+            feedback_type, _, response_type = dimension.partition('|')
+            by_feedback_type[feedback_type] = by_feedback_type.get(feedback_type, 0) + value
+            response_types[response_type] = response_types.get(response_type, 0) + value
+
+        total_feedback = sum(by_feedback_type.values())
+        thumbs_up = by_feedback_type.get('thumbs_up', 0)
+        return {
+            'total_feedback': total_feedback,
+            'thumbs_up': thumbs_up,
+            'thumbs_down': by_feedback_type.get('thumbs_down', 0),
+            'satisfaction_rate': round(thumbs_up / total_feedback * 100, 2) if total_feedback > 0 else 0,
+            'used_for_training': totals.get(('feedback_used_for_training', ''), 0),
+            'response_types': response_types
+        }
+
+    def shutdown(self) -> None:
+        self._stop.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'compactions': self.compactions,
+            'hours_compacted': self.hours_compacted,
+            'backfilled': self._backfilled,
+            'live_fallbacks': self.live_fallbacks,
+            'last_compacted_at': (self._last_compacted_at() or datetime.min).isoformat(),
+            'worker_running': self._thread is not None and self._thread.is_alive()
+        }
+
+
+# Global analytics rollups instance
+analytics_rollups = AnalyticsRollups(
+    interval_seconds=float(os.environ.get('ANALYTICS_ROLLUP_INTERVAL_SECONDS', 60)),
+    lookback_hours=int(os.environ.get('ANALYTICS_ROLLUP_LOOKBACK_HOURS', 2)),
+    backfill_hours=int(os.environ.get('ANALYTICS_ROLLUP_BACKFILL_HOURS', 24 * 90))
+)
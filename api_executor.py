@@ -1,9 +1,8 @@
-import subprocess
 import json
-import shlex
 import logging
 import re
 from typing import Dict, List, Optional, Any
+from tool_http_client import tool_http_client
 
 class ApiExecutor:
     """Handles API rule matching and execution"""
@@ -33,55 +32,33 @@ class ApiExecutor:
         return None
     
     def execute_curl_command(self, curl_command: str, question: str = "") -> Dict[str, Any]:
-        """Execute a curl command and return the result"""
+        """Execute a curl command (as an in-process HTTP request) and return the result"""
         try:
-            # Replace placeholder variables if any
-            processed_command = self._process_curl_command(curl_command, question)
+            # Placeholders are filled into the parsed request, so no shell quoting is needed
+            result = tool_http_client.execute(curl_command, {'question': question, 'QUESTION': question})
             
-            # Parse the curl command safely
-            if not processed_command.strip().startswith('curl'):
-                return {
-                    'success': False,
-                    'error': 'Invalid command: Only curl commands are allowed'
-                }
-            
-            # Execute the command
-            result = subprocess.run(
-                processed_command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=30  # 30 second timeout
-            )
-            
-            if result.returncode == 0:
+            if result['success']:
                 # Try to parse JSON response
                 try:
-                    response_data = json.loads(result.stdout)
+                    response_data = json.loads(result['text'])
                     return {
                         'success': True,
                         'data': response_data,
-                        'raw_output': result.stdout
+                        'raw_output': result['text']
                     }
                 except json.JSONDecodeError:
                     # Return raw text if not JSON
                     return {
                         'success': True,
-                        'data': result.stdout,
-                        'raw_output': result.stdout
+                        'data': result['text'],
+                        'raw_output': result['text']
                     }
             else:
                 return {
                     'success': False,
-                    'error': f'Command failed with exit code {result.returncode}',
-                    'stderr': result.stderr
+                    'error': result['error']
                 }
                 
-        except subprocess.TimeoutExpired:
-            return {
-                'success': False,
-                'error': 'Command timed out after 30 seconds'
-            }
         except Exception as e:
             self.logger.error(f"Error executing curl command: {str(e)}")
             return {
@@ -89,21 +66,6 @@ class ApiExecutor:
                 'error': f'Execution error: {str(e)}'
             }
     
-    def _process_curl_command(self, curl_command: str, question: str) -> str:
-        """Process curl command to replace placeholders"""
-        # Replace common placeholders
-        processed = curl_command
-        
-        # Replace {question} placeholder with actual question
-        processed = processed.replace('{question}', shlex.quote(question))
-        processed = processed.replace('{QUESTION}', shlex.quote(question))
-        
-        # You can add more placeholder replacements here
-        # For example:
-        # processed = processed.replace('{user_id}', str(user_id))
-        
-        return processed
-    
     def format_api_response(self, response_data: Dict[str, Any], rule_name: str) -> str:
         """Format API response for display in chat"""
         if not response_data['success']:
@@ -1,21 +1,34 @@
 import os
 import logging
 import uuid
+import queue
+import time
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash, session, make_response
+from flask import Flask, request, jsonify, render_template, redirect, url_for, flash, session, make_response, Response, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
 from vectorizer import DocumentVectorizer
 from rag_chain import RAGChain
-from models import db, UnifiedConversation, UnifiedMessage, ApiRule, ApiTool, UserConversation, SystemPrompt, RagFeedback, ChatSettings, ResponseTemplate, LiveChatSession, LiveChatMessage, LiveChatAgent, WebhookConfig, WebhookMessage
+from models import db, UnifiedConversation, UnifiedMessage, ApiRule, ApiTool, UserConversation, SystemPrompt, RagFeedback, ChatSettings, ResponseTemplate, LiveChatSession, LiveChatMessage, LiveChatAgent, WebhookConfig, WebhookMessage, WebhookDelivery
 from session_memory import session_manager
+from rag_cache import faiss_index_cache, embedding_cache, semantic_answer_cache
+from template_matcher import template_matcher
+from template_usage import template_usage_counter
+from tool_registry import tool_registry
+from tool_router import tool_router
+from tool_response_cache import tool_response_cache
+from tool_http_client import tool_http_client
+from webhook_outbox import webhook_outbox
+from conversation_events import conversation_events
+from config_cache import config_cache
+from static_assets import static_assets, IMAGE_EXTENSIONS, WIDGET_ICON_FILENAME
+from analytics_rollups import analytics_rollups, parse_range
+from conversation_pagination import order_by_recent, after_cursor, encode_cursor, InvalidCursor, conversation_count_cache
 from voice_agent import voice_agent
 from elevenlabs_embedded import embedded_agent
 import json
-import subprocess
-import shlex
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -54,16 +67,23 @@ db.init_app(app)
 with app.app_context():
     db.create_all()
 
+# Flush template usage counts in the background (and on shutdown)
+template_usage_counter.init_app(app)
+
+# Deliver queued webhook notifications in the background
+webhook_outbox.init_app(app)
+analytics_rollups.init_app(app)
+
 # Enable CORS for all routes
 CORS(app)
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 FAISS_INDEX_FOLDER = 'faiss_index'
-LOGO_FOLDER = 'static/logos'
-WIDGET_ICON_FOLDER = 'static/widget_icons'
+LOGO_FOLDER = static_assets.logo_folder
+WIDGET_ICON_FOLDER = static_assets.widget_icon_folder
 ALLOWED_EXTENSIONS = {'pdf', 'docx'}
-ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'svg'}
+ALLOWED_IMAGE_EXTENSIONS = IMAGE_EXTENSIONS
 
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -105,12 +125,7 @@ def admin():
     index_exists = os.path.exists(os.path.join(FAISS_INDEX_FOLDER, 'index.faiss'))
     
     # Get current logo
-    current_logo = None
-    if os.path.exists(LOGO_FOLDER):
-        for filename in os.listdir(LOGO_FOLDER):
-            if allowed_image_file(filename):
-                current_logo = filename
-                break
+    current_logo = static_assets.get_logo_filename()
     
     # Get AI tools
     ai_tools = ApiTool.query.order_by(ApiTool.priority.desc(), ApiTool.created_at.desc()).all()
@@ -124,15 +139,7 @@ def admin():
 @app.route('/chatbot')
 def chatbot():
     """Chatbot interface for end users"""
-    # Get current logo
-    current_logo = None
-    if os.path.exists(LOGO_FOLDER):
-        for filename in os.listdir(LOGO_FOLDER):
-            if allowed_image_file(filename):
-                current_logo = f'/static/logos/{filename}'
-                break
-    
-    return render_template('chatbot.html', current_logo=current_logo)
+    return render_template('chatbot.html', current_logo=static_assets.get_logo_url())
 
 @app.route('/test_widget_history.html')
 def test_widget_history():
@@ -230,6 +237,7 @@ def upload_logo():
         logo_filename = f'logo.{ext}'
         filepath = os.path.join(LOGO_FOLDER, logo_filename)
         file.save(filepath)
+        static_assets.invalidate()
         flash(f'Logo uploaded successfully!')
         logging.info(f"Logo uploaded: {logo_filename}")
     else:
@@ -254,6 +262,9 @@ def vectorize():
         
         # Process documents and create vector index
         vectorizer.process_documents(uploaded_files, FAISS_INDEX_FOLDER)
+        faiss_index_cache.invalidate(FAISS_INDEX_FOLDER)
+        if semantic_answer_cache:
+            semantic_answer_cache.clear()
         flash('Documents vectorized successfully!')
         logging.info("Documents vectorized successfully")
         
@@ -263,6 +274,71 @@ def vectorize():
     
     return redirect(url_for('admin'))
 
+def detect_live_chat_request(question):
+    """Detect whether a question asks to be transferred to a live agent (keywords and semantic phrase patterns)"""
+    live_chat_keywords = [
+        'live chat', 'chat with agent', 'talk to agent', 'talk with agent', 'human agent', 'speak to human', 
+        'connect to agent', 'i want to talk', 'speak with someone', 'customer service', 'support agent', 
+        'real person', 'human help', 'agent help', 'call center', 'representative', 'operator', 
+        'staff member', 'transfer me', 'escalate', 'human support', 'live support', 'personal assistance',
+        'can i talk to', 'could you transfer', 'transfer to agent', 'connect me to', 'talk to someone',
+        'speak to agent', 'contact agent', 'reach agent', 'get agent', 'agent please'
+    ]
+    
+    # Semantic pattern matching for natural language requests
+    question_lower = question.lower()
+    live_chat_patterns = [
+        'talk to' in question_lower and 'agent' in question_lower,
+        'talk with' in question_lower and 'agent' in question_lower,
+        'transfer' in question_lower and ('agent' in question_lower or 'live' in question_lower),
+        'connect' in question_lower and ('agent' in question_lower or 'human' in question_lower),
+        'speak' in question_lower and ('agent' in question_lower or 'someone' in question_lower),
+        'chat with' in question_lower and ('agent' in question_lower or 'human' in question_lower),
+        'can i' in question_lower and 'talk' in question_lower and ('agent' in question_lower or 'someone' in question_lower),
+        'could you' in question_lower and ('transfer' in question_lower or 'connect' in question_lower),
+        'need help' in question_lower and 'agent' in question_lower,
+        'speak to' in question_lower and ('human' in question_lower or 'person' in question_lower)
+    ]
+    
+    return any(keyword in question_lower for keyword in live_chat_keywords) or any(live_chat_patterns)
+
+def build_ask_response(answer, response_type, session_id, user_identifier, data, live_chat=False, answer_info=None):
+    """JSON body of an /ask answer (also the final /ask/stream event)"""
+    response = {
+        'answer': answer,
+        'logo': static_assets.get_logo_url(),
+        'response_type': response_type
+    }
+    
+    # How the answer was produced, e.g. {'tool': {'tool_name', 'cached', 'cache_age_seconds'}}
+    if answer_info:
+        response['metadata'] = answer_info
+    
+    if live_chat:
+        response['session_info'] = {
+            'session_id': session_id,
+            'user_identifier': user_identifier,
+            'mode': 'live_chat'
+        }
+        return response
+    
+    # Include user information in response if available
+    response['status'] = 'success'
+    if user_identifier:
+        response['user_info'] = {
+            'user_id': data.get('user_id'),
+            'username': data.get('username'),
+            'email': data.get('email'),
+            'device_id': data.get('device_id'),
+            'session_type': 'persistent'
+        }
+    else:
+        response['user_info'] = {
+            'session_id': session_id,
+            'session_type': 'temporary'
+        }
+    return response
+
 @app.route('/ask', methods=['POST'])
 def ask():
     """Enhanced chat endpoint for answering questions with user-specific persistent memory"""
@@ -306,6 +382,8 @@ def ask():
             device_id=device_id
         )
         
+        live_chat = True
+        answer_info = {}
         if unified_conv.is_live_chat_active():
             # Conversation is in live chat mode - don't use RAG, just acknowledge messages
             unified_conv.add_message('user', question, user_identifier, username, 'text', 'live_chat_message')
@@ -315,65 +393,13 @@ def ask():
             
             # Store bot response
             unified_conv.add_message('assistant', answer, 'system', 'Assistant', 'text', response_type)
-            
-            # Get current logo for consistent response format
-            current_logo = None
-            if os.path.exists(LOGO_FOLDER):
-                for filename in os.listdir(LOGO_FOLDER):
-                    if allowed_image_file(filename):
-                        current_logo = f'/static/logos/{filename}'
-                        break
-            
-            return jsonify({
-                'answer': answer,
-                'logo': current_logo,
-                'response_type': response_type,
-                'session_info': {
-                    'session_id': session_id,
-                    'user_identifier': user_identifier,
-                    'mode': 'live_chat'
-                }
-            })
+            db.session.commit()
         
         # Live chat transfer detection with semantic phrase patterns
-        live_chat_keywords = [
-            'live chat', 'chat with agent', 'talk to agent', 'talk with agent', 'human agent', 'speak to human', 
-            'connect to agent', 'i want to talk', 'speak with someone', 'customer service', 'support agent', 
-            'real person', 'human help', 'agent help', 'call center', 'representative', 'operator', 
-            'staff member', 'transfer me', 'escalate', 'human support', 'live support', 'personal assistance',
-            'can i talk to', 'could you transfer', 'transfer to agent', 'connect me to', 'talk to someone',
-            'speak to agent', 'contact agent', 'reach agent', 'get agent', 'agent please'
-        ]
-        
-        # Semantic pattern matching for natural language requests
-        question_lower = question.lower()
-        live_chat_patterns = [
-            'talk to' in question_lower and 'agent' in question_lower,
-            'talk with' in question_lower and 'agent' in question_lower,
-            'transfer' in question_lower and ('agent' in question_lower or 'live' in question_lower),
-            'connect' in question_lower and ('agent' in question_lower or 'human' in question_lower),
-            'speak' in question_lower and ('agent' in question_lower or 'someone' in question_lower),
-            'chat with' in question_lower and ('agent' in question_lower or 'human' in question_lower),
-            'can i' in question_lower and 'talk' in question_lower and ('agent' in question_lower or 'someone' in question_lower),
-            'could you' in question_lower and ('transfer' in question_lower or 'connect' in question_lower),
-            'need help' in question_lower and 'agent' in question_lower,
-            'speak to' in question_lower and ('human' in question_lower or 'person' in question_lower)
-        ]
-        
-        is_live_chat_request = any(keyword in question.lower() for keyword in live_chat_keywords) or any(live_chat_patterns)
-        
-        if is_live_chat_request:
+        elif detect_live_chat_request(question):
             # LIVE CHAT TRANSFER - Shows "Transferring to agent" and disables RAG
+            response_type = 'live_chat_transfer'
             try:
-                # Create or get unified conversation
-                unified_conv = UnifiedConversation.get_or_create(
-                    session_id=session_id,
-                    user_identifier=user_identifier,
-                    username=username,
-                    email=email,
-                    device_id=device_id
-                )
-                
                 # Set live chat mode (disables RAG)
                 unified_conv.set_live_chat_mode()
                 
@@ -381,97 +407,110 @@ def ask():
                 unified_conv.add_message('user', question, user_identifier, username, 'text', 'live_chat_request')
                 
                 answer = "🔄 **Transferring to agent...** \n\nI'm connecting you with our customer support team. Your conversation history has been preserved and an agent will be with you shortly to assist with your request."
-                response_type = 'live_chat_transfer'
                 
                 # Store bot response
                 unified_conv.add_message('assistant', answer, 'system', 'Assistant', 'text', response_type)
+                db.session.commit()
                 
                 logging.info(f"✅ LIVE CHAT: Activated for session {session_id} - RAG disabled")
                 
-                # Get current logo for consistent response format
-                current_logo = None
-                if os.path.exists(LOGO_FOLDER):
-                    for filename in os.listdir(LOGO_FOLDER):
-                        if allowed_image_file(filename):
-                            current_logo = f'/static/logos/{filename}'
-                            break
-                
-                return jsonify({
-                    'answer': answer,
-                    'logo': current_logo,
-                    'response_type': response_type,
-                    'session_info': {
-                        'session_id': session_id,
-                        'user_identifier': user_identifier,
-                        'mode': 'live_chat'
-                    }
-                })
-                
             except Exception as e:
                 logging.error(f"Error activating live chat: {e}")
                 answer = "I'll connect you with our customer support team. Please wait while I transfer your chat."
-                response_type = 'live_chat_transfer'
-                
-                # Get current logo for consistent response format
-                current_logo = None
-                if os.path.exists(LOGO_FOLDER):
-                    for filename in os.listdir(LOGO_FOLDER):
-                        if allowed_image_file(filename):
-                            current_logo = f'/static/logos/{filename}'
-                            break
-                
-                return jsonify({
-                    'answer': answer,
-                    'logo': current_logo,
-                    'response_type': response_type,
-                    'session_info': {
-                        'session_id': session_id,
-                        'user_identifier': user_identifier,
-                        'mode': 'live_chat'
-                    }
-                })
-                response_type = 'native_live_chat_transfer'
             
         else:
             # Normal AI/RAG processing
             logging.info(f"Using RAG chain with AI tool selection and {'user-based' if user_identifier else 'session-based'} memory")
-            answer = rag_chain.get_answer(question, FAISS_INDEX_FOLDER, session_id, user_identifier, username, email, device_id)
+            answer = rag_chain.get_answer(question, FAISS_INDEX_FOLDER, session_id, user_identifier, username, email, device_id, answer_info)
             response_type = 'rag_with_ai_tools'
+            live_chat = False
         
-        # Get current logo
-        current_logo = None
-        if os.path.exists(LOGO_FOLDER):
-            for filename in os.listdir(LOGO_FOLDER):
-                if allowed_image_file(filename):
-                    current_logo = f'/static/logos/{filename}'
-                    break
-        
-        # Include user information in response if available
-        user_info = {}
-        if user_identifier:
-            user_info = {
-                'user_id': user_id,
-                'username': username,
-                'email': email,
-                'device_id': device_id,
-                'session_type': 'persistent'
-            }
-        else:
-            user_info = {
-                'session_id': session_id,
-                'session_type': 'temporary'
-            }
+        return jsonify(build_ask_response(answer, response_type, session_id, user_identifier, data, live_chat, answer_info))
         
+    except Exception as e:
+        logging.error(f"Error in ask endpoint: {str(e)}")
         return jsonify({
-            'answer': answer,
-            'status': 'success',
-            'logo': current_logo,
-            'response_type': response_type,
-            'user_info': user_info
-        })
+            'error': 'Sorry, I encountered an error while processing your question. Please try again.',
+            'status': 'error'
+        }), 500
+
+@app.route('/ask/stream', methods=['POST'])
+def ask_stream():
+    """Streaming chat endpoint: same request body as /ask, answer delivered as Server-Sent Events.
+    
+    Emits {"type": "token", "content": ...} events while the answer is generated, then a final
+    {"type": "done", ...} event carrying the same fields as the /ask JSON response. Live chat
+    hand-offs are not generated by the LLM and are answered by /ask as a plain JSON response.
+    """
+    try:
+        data = request.get_json()
+        if not data or 'question' not in data:
+            return jsonify({'error': 'No question provided'}), 400
+        
+        question = data['question'].strip()
+        if not question:
+            return jsonify({'error': 'Question cannot be empty'}), 400
+        
+        # Extract user parameters if provided
+        user_id = data.get('user_id')
+        username = data.get('username')
+        email = data.get('email')
+        device_id = data.get('device_id')
+        
+        # Determine user identifier (priority: user_id > email > device_id)
+        user_identifier = user_id or email or device_id
+        
+        # Use provided session_id or create/get from session
+        session_id = data.get('session_id')
+        if not session_id:
+            if 'session_id' not in session:
+                session['session_id'] = str(uuid.uuid4())
+            session_id = session['session_id']
+        
+        unified_conv = UnifiedConversation.get_or_create(
+            session_id=session_id,
+            user_identifier=user_identifier,
+            username=username,
+            email=email,
+            device_id=device_id
+        )
+        
+        if unified_conv.is_live_chat_active() or detect_live_chat_request(question):
+            return ask()
+        
+        logging.info(f"Streaming RAG chain answer with {'user-based' if user_identifier else 'session-based'} memory")
+        
+        def sse_event(payload):
+            return f"data: {json.dumps(payload)}\n\n"
+        
+        def generate():
+            parts = []
+            answer_info = {}
+            try:
+                for token in rag_chain.get_answer_stream(question, FAISS_INDEX_FOLDER, session_id, user_identifier, username, email, device_id, answer_info):
+                    parts.append(token)
+                    yield sse_event({'type': 'token', 'content': token})
+                
+                yield sse_event({
+                    'type': 'done',
+                    **build_ask_response(''.join(parts), 'rag_with_ai_tools', session_id, user_identifier, data, answer_info=answer_info)
+                })
+            except Exception as e:
+                logging.error(f"Error in ask stream: {str(e)}")
+                yield sse_event({
+                    'type': 'error',
+                    'error': 'Sorry, I encountered an error while processing your question. Please try again.',
+                    'status': 'error'
+                })
+        
+        response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
         
     except Exception as e:
-        logging.error(f"Error in ask endpoint: {str(e)}")
+        logging.error(f"Error in ask stream endpoint: {str(e)}")
         return jsonify({
             'error': 'Sorry, I encountered an error while processing your question. Please try again.',
             'status': 'error'
@@ -489,6 +528,9 @@ def clear_index():
             os.remove(index_file)
         if os.path.exists(metadata_file):
             os.remove(metadata_file)
+        faiss_index_cache.invalidate(FAISS_INDEX_FOLDER)
+        if semantic_answer_cache:
+            semantic_answer_cache.clear()
         
         flash('Vector index cleared successfully!')
         logging.info("Vector index cleared")
@@ -562,11 +604,13 @@ def add_ai_tool():
             response_mapping=data.get('response_mapping', '{}'),
             response_template=data.get('response_template', ''),
             priority=int(data.get('priority', 0)),
+            cache_ttl_seconds=max(0, int(data.get('cache_ttl_seconds') or 0)),
             active=data.get('active', True)
         )
         
         db.session.add(new_tool)
         db.session.commit()
+        tool_registry.invalidate()
         
         flash(f'AI tool "{new_tool.name}" added successfully!')
         return jsonify({'success': True, 'message': 'AI tool added successfully', 'tool': new_tool.to_dict()})
@@ -604,9 +648,12 @@ def update_ai_tool(tool_id):
         tool.response_mapping = data.get('response_mapping', tool.response_mapping)
         tool.response_template = data.get('response_template', tool.response_template)
         tool.priority = int(data.get('priority', tool.priority))
+        if 'cache_ttl_seconds' in data:
+            tool.cache_ttl_seconds = max(0, int(data['cache_ttl_seconds'] or 0))
         tool.active = data.get('active', tool.active)
         
         db.session.commit()
+        tool_registry.invalidate()
         
         flash(f'AI tool "{tool.name}" updated successfully!')
         return jsonify({'success': True, 'message': 'AI tool updated successfully', 'tool': tool.to_dict()})
@@ -625,6 +672,7 @@ def delete_ai_tool(tool_id):
         
         db.session.delete(tool)
         db.session.commit()
+        tool_registry.invalidate()
         
         flash(f'AI tool "{tool_name}" deleted successfully!')
         return jsonify({'success': True, 'message': 'AI tool deleted successfully'})
@@ -642,6 +690,7 @@ def toggle_ai_tool(tool_id):
         tool.active = not tool.active
         
         db.session.commit()
+        tool_registry.invalidate()
         
         status = "activated" if tool.active else "deactivated"
         flash(f'AI tool "{tool.name}" {status}!')
@@ -662,53 +711,32 @@ def test_api_response():
         if not curl_command:
             return jsonify({'success': False, 'error': 'No curl command provided'}), 400
         
-        # Execute the curl command using subprocess
-        import subprocess
-        import json
-        
-        # Process the curl command (replace any placeholders with test values)
-        processed_command = curl_command
-        
-        # Replace common placeholders with test values
-        processed_command = processed_command.replace('{question}', 'test')
-        processed_command = processed_command.replace('{user_query}', 'test')
-        processed_command = processed_command.replace('{query}', 'test')
-        
-        # Execute the command
-        result = subprocess.run(
-            processed_command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        # Execute the curl command in-process, with test values for the common placeholders
+        result = tool_http_client.execute(curl_command, {'question': 'test', 'user_query': 'test', 'query': 'test'})
         
-        if result.returncode == 0:
+        if result['success']:
             try:
                 # Try to parse as JSON
-                response_data = json.loads(result.stdout)
+                response_data = json.loads(result['text'])
                 return jsonify({
                     'success': True,
                     'data': response_data,
-                    'raw_output': result.stdout
+                    'raw_output': result['text']
                 })
             except json.JSONDecodeError:
                 # If not JSON, return as plain text
                 return jsonify({
                     'success': True,
-                    'data': {'response': result.stdout},
-                    'raw_output': result.stdout
+                    'data': {'response': result['text']},
+                    'raw_output': result['text']
                 })
         else:
             return jsonify({
                 'success': False,
-                'error': f'Command failed with return code {result.returncode}',
-                'stderr': result.stderr,
-                'stdout': result.stdout
+                'error': result['error'],
+                'stdout': result.get('text', '')
             }), 500
             
-    except subprocess.TimeoutExpired:
-        return jsonify({'success': False, 'error': 'API request timed out'}), 500
     except Exception as e:
         logging.error(f"Error testing API response: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -807,6 +835,40 @@ def session_info():
         logging.error(f"Error getting session info: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/session_store/stats', methods=['GET'])
+def session_store_stats():
+    """Get session memory backend metrics (size, hits, evictions, rehydrations)"""
+    try:
+        return jsonify({'success': True, 'stats': session_manager.get_store_stats()})
+    except Exception as e:
+        logging.error(f"Error getting session store stats: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/cache_stats', methods=['GET'])
+def admin_cache_stats():
+    """Get the metrics of every per-worker cache in one place (sizes, hits, misses, reloads)"""
+    try:
+        caches = {
+            'faiss_index': faiss_index_cache,
+            'embedding': embedding_cache,
+            'semantic_answer': semantic_answer_cache,
+            'template_matcher': template_matcher,
+            'template_usage': template_usage_counter,
+            'tool_registry': tool_registry,
+            'tool_router': tool_router,
+            'tool_response': tool_response_cache,
+            'tool_http_client': tool_http_client,
+            'config': config_cache,
+            'static_assets': static_assets,
+            'conversation_count': conversation_count_cache
+        }
+        stats = {name: cache.get_stats() if cache else None for name, cache in caches.items()}
+        stats['session_store'] = session_manager.get_store_stats()
+        return jsonify({'success': True, 'worker_pid': os.getpid(), 'stats': stats})
+    except Exception as e:
+        logging.error(f"Error getting cache stats: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/widget_history', methods=['POST'])
 def widget_history():
     """Get chat history for widget (last N messages)"""
@@ -1047,6 +1109,7 @@ def system_prompts():
             )
             
             db.session.add(new_prompt)
+            config_cache.bump('system_prompts')
             db.session.commit()
             
             return jsonify({'success': True, 'id': new_prompt.id})
@@ -1077,6 +1140,7 @@ def system_prompt_detail(prompt_id):
             elif not is_active:
                 prompt.is_active = False
             
+            config_cache.bump('system_prompts')
             db.session.commit()
             return jsonify({'success': True})
             
@@ -1089,6 +1153,7 @@ def system_prompt_detail(prompt_id):
         # Delete system prompt
         try:
             db.session.delete(prompt)
+            config_cache.bump('system_prompts')
             db.session.commit()
             return jsonify({'success': True})
             
@@ -1108,6 +1173,7 @@ def activate_system_prompt(prompt_id):
         prompt = SystemPrompt.query.get_or_404(prompt_id)
         prompt.is_active = True
         
+        config_cache.bump('system_prompts')
         db.session.commit()
         return jsonify({'success': True})
         
@@ -1122,10 +1188,9 @@ def get_widget_icon():
     """Get current widget icon"""
     try:
         # Check for custom icon
-        icon_path = os.path.join(WIDGET_ICON_FOLDER, 'widget_icon.png')
-        if os.path.exists(icon_path):
+        if static_assets.has_widget_icon():
             return jsonify({
-                'iconUrl': f'{request.url_root}static/widget_icons/widget_icon.png',
+                'iconUrl': f'{request.url_root}static/widget_icons/{WIDGET_ICON_FILENAME}',
                 'isCustom': True
             })
         
@@ -1153,9 +1218,10 @@ def upload_widget_icon():
             return jsonify({'error': 'Invalid file type. Please use PNG, JPG, or SVG.'}), 400
         
         # Save the icon
-        filename = 'widget_icon.png'
+        filename = WIDGET_ICON_FILENAME
         file_path = os.path.join(WIDGET_ICON_FOLDER, filename)
         file.save(file_path)
+        static_assets.invalidate()
         
         # Generate the icon URL
         icon_url = f'{request.url_root}static/widget_icons/{filename}'
@@ -1174,9 +1240,10 @@ def upload_widget_icon():
 def delete_widget_icon():
     """Reset to default widget icon"""
     try:
-        icon_path = os.path.join(WIDGET_ICON_FOLDER, 'widget_icon.png')
+        icon_path = os.path.join(WIDGET_ICON_FOLDER, WIDGET_ICON_FILENAME)
         if os.path.exists(icon_path):
             os.remove(icon_path)
+        static_assets.invalidate()
         
         return jsonify({
             'success': True,
@@ -1193,35 +1260,66 @@ def delete_widget_icon():
 
 @app.route('/api/conversations')
 def get_conversations():
-    """Get all conversations (both chatbot and live chat)"""
+    """Get all conversations (both chatbot and live chat).
+    
+    Pass the returned next_cursor as `cursor` to get the following page (offset is still accepted
+    but gets slower the deeper the page). `count` is 'exact' (default), 'cached' (reused for up to
+    CONVERSATION_COUNT_CACHE_SECONDS, for clients that page through large lists) or 'none'.
+    """
     try:
         # Get query parameters
         conversation_type = request.args.get('type')  # 'chatbot', 'live_chat', or 'all'
         user_identifier = request.args.get('user')
+        tag = request.args.get('tag')  # e.g. 'Live Agent'
         limit = int(request.args.get('limit', 50))
         offset = int(request.args.get('offset', 0))
+        cursor = request.args.get('cursor')
+        count_mode = request.args.get('count', 'exact')
         
         # Build query
         query = UnifiedConversation.query
+        filters = {}
         
         if conversation_type and conversation_type != 'all':
             query = query.filter_by(conversation_type=conversation_type)
+            filters['type'] = conversation_type
         
         if user_identifier:
             query = query.filter_by(user_identifier=user_identifier)
+            filters['user'] = user_identifier
         
-        # Order by most recent first
-        query = query.order_by(UnifiedConversation.last_activity.desc())
+        if tag:
+            query = query.filter(UnifiedConversation.has_tag(tag))
+            filters['tag'] = tag
         
-        # Apply pagination
-        conversations = query.offset(offset).limit(limit).all()
-        total_count = query.count()
+        # Order by most recent first
+        page_query = order_by_recent(query)
         
-        return jsonify({
+        # Apply pagination; one extra row tells whether there is a next page
+        if cursor:
+            try:
+                page_query = after_cursor(page_query, cursor)
+            except InvalidCursor as e:
+                return jsonify({'error': str(e)}), 400
+        elif offset:
+            page_query = page_query.offset(offset)
+        conversations = page_query.limit(limit + 1).all()
+        has_more = len(conversations) > limit
+        conversations = conversations[:limit]
+        
+        result = {
             'conversations': [conv.to_dict() for conv in conversations],
-            'total_count': total_count,
-            'has_more': (offset + limit) < total_count
-        })
+            'has_more': has_more,
+            'next_cursor': encode_cursor(conversations[-1]) if has_more else None
+        }
+        
+        if count_mode == 'cached':
+            result['total_count'], count_age = conversation_count_cache.get_count(query, filters)
+            result['total_count_age_seconds'] = round(count_age, 1)
+        elif count_mode != 'none':
+            result['total_count'] = query.count()
+        
+        return jsonify(result)
         
     except Exception as e:
         logging.error(f"Error fetching conversations: {str(e)}")
@@ -1280,34 +1378,23 @@ def export_conversation(session_id):
 
 @app.route('/api/conversations/stats')
 def get_conversation_stats():
-    """Get conversation statistics"""
+    """Get conversation statistics (from the analytics rollups; optional ?days=N or ?from=&to=)"""
     try:
-        # Total conversations
-        total_conversations = UnifiedConversation.query.count()
-        chatbot_conversations = UnifiedConversation.query.filter_by(conversation_type='chatbot').count()
-        live_chat_conversations = UnifiedConversation.query.filter_by(conversation_type='live_chat').count()
+        try:
+            start, end = parse_range(request.args)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid time range: {e}'}), 400
         
-        # Active conversations (last 24 hours)
+        stats = analytics_rollups.conversation_stats(start, end)
+        
+        # Active conversations (last 24 hours), a range count on the last_activity index
         yesterday = datetime.utcnow() - timedelta(days=1)
-        active_conversations = UnifiedConversation.query.filter(
+        stats['active_conversations_24h'] = UnifiedConversation.query.filter(
             UnifiedConversation.last_activity >= yesterday
         ).count()
         
-        # Total messages
-        total_messages = UnifiedMessage.query.count()
-        
-        # Unique users
-        unique_users = db.session.query(UnifiedConversation.user_identifier)\
-            .distinct().count()
-        
-        return jsonify({
-            'total_conversations': total_conversations,
-            'chatbot_conversations': chatbot_conversations,
-            'live_chat_conversations': live_chat_conversations,
-            'active_conversations_24h': active_conversations,
-            'total_messages': total_messages,
-            'unique_users': unique_users
-        })
+        stats['range'] = {'from': start.isoformat() if start else None, 'to': end.isoformat() if end else None}
+        return jsonify(stats)
         
     except Exception as e:
         logging.error(f"Error fetching conversation stats: {str(e)}")
@@ -1435,6 +1522,7 @@ def update_feedback(feedback_id):
         # Update fields
         if 'used_for_training' in data:
             feedback.used_for_training = data['used_for_training']
+            analytics_rollups.mark_dirty(feedback.feedback_timestamp)
         
         if 'training_notes' in data:
             feedback.training_notes = data['training_notes']
@@ -1469,32 +1557,16 @@ def update_feedback(feedback_id):
 
 @app.route('/feedback/stats', methods=['GET'])
 def get_feedback_stats():
-    """Get feedback statistics for analytics"""
+    """Get feedback statistics for analytics (from the analytics rollups; optional ?days=N or ?from=&to=)"""
     try:
-        total_feedback = RagFeedback.query.count()
-        thumbs_up = RagFeedback.query.filter(RagFeedback.feedback_type == 'thumbs_up').count()
-        thumbs_down = RagFeedback.query.filter(RagFeedback.feedback_type == 'thumbs_down').count()
-        used_for_training = RagFeedback.query.filter(RagFeedback.used_for_training == True).count()
-        
-        # Calculate satisfaction rate
-        satisfaction_rate = (thumbs_up / total_feedback * 100) if total_feedback > 0 else 0
-        
-        # Get feedback by response type
-        response_types = db.session.query(
-            RagFeedback.response_type,
-            db.func.count(RagFeedback.id).label('count')
-        ).group_by(RagFeedback.response_type).all()
+        try:
+            start, end = parse_range(request.args)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': f'Invalid time range: {e}'}), 400
         
         return jsonify({
             'status': 'success',
-            'stats': {
-                'total_feedback': total_feedback,
-                'thumbs_up': thumbs_up,
-                'thumbs_down': thumbs_down,
-                'satisfaction_rate': round(satisfaction_rate, 2),
-                'used_for_training': used_for_training,
-                'response_types': {rt[0]: rt[1] for rt in response_types}
-            }
+            'stats': analytics_rollups.feedback_stats(start, end)
         })
         
     except Exception as e:
@@ -1509,23 +1581,10 @@ def get_feedback_stats():
 def get_chat_settings():
     """Get all chat settings"""
     try:
-        settings = ChatSettings.query.all()
         settings_dict = {}
-        for setting in settings:
-            if setting.setting_type == 'boolean':
-                settings_dict[setting.setting_name] = setting.setting_value.lower() in ('true', '1', 'yes')
-            elif setting.setting_type == 'integer':
-                try:
-                    settings_dict[setting.setting_name] = int(setting.setting_value)
-                except ValueError:
-                    settings_dict[setting.setting_name] = 0
-            elif setting.setting_type == 'json':
-                try:
-                    settings_dict[setting.setting_name] = json.loads(setting.setting_value)
-                except json.JSONDecodeError:
-                    settings_dict[setting.setting_name] = {}
-            else:
-                settings_dict[setting.setting_name] = setting.setting_value
+        for name, setting in config_cache.get_settings().items():
+            fallback = {'integer': 0, 'json': {}}.get(setting['type'])
+            settings_dict[name] = ChatSettings.parse_value(setting['value'], setting['type'], fallback)
         
         # Add defaults for required settings
         defaults = {
@@ -1605,6 +1664,8 @@ def get_chat_setting(setting_name):
 def get_response_templates():
     """Get all response templates"""
     try:
+        # Include usage counts that are still waiting for the next batched write
+        template_usage_counter.flush()
         templates = ResponseTemplate.query.order_by(ResponseTemplate.priority.desc()).all()
         return jsonify({
             'success': True,
@@ -1642,6 +1703,7 @@ def create_response_template():
         
         db.session.add(template)
         db.session.commit()
+        template_matcher.invalidate()
         
         return jsonify({
             'success': True,
@@ -1687,6 +1749,7 @@ def update_response_template(template_id):
         
         template.updated_at = datetime.utcnow()
         db.session.commit()
+        template_matcher.invalidate()
         
         return jsonify({
             'success': True,
@@ -1708,6 +1771,7 @@ def delete_response_template(template_id):
         
         db.session.delete(template)
         db.session.commit()
+        template_matcher.invalidate()
         
         return jsonify({
             'success': True,
@@ -1828,31 +1892,68 @@ def agent_portal():
     """Agent portal interface with chatbot and live chat tabs"""
     return render_template('agent_portal_tabs.html')
 
+# An open stream holds a worker thread (a whole worker with sync workers), so streams are capped and
+# clients reconnect periodically; deployments limited to sync workers turn streaming off
+AGENT_EVENTS_ENABLED = os.environ.get('AGENT_EVENTS_ENABLED', 'true').lower() == 'true'
+AGENT_EVENTS_STREAM_SECONDS = int(os.environ.get('AGENT_EVENTS_STREAM_SECONDS', 300))
+AGENT_EVENTS_KEEPALIVE_SECONDS = 15
+
+@app.route('/api/agent_portal/events')
+def agent_portal_events():
+    """Server-Sent Events stream of conversation changes (new messages, status and tag updates)"""
+    if not AGENT_EVENTS_ENABLED:
+        # 204 tells EventSource not to reconnect; the portal falls back to polling
+        return Response(status=204)
+    subscriber = conversation_events.subscribe()
+    
+    def generate():
+        try:
+            # Reconnect delay for EventSource; 'shared' tells the client whether other workers' changes arrive too
+            yield "retry: 3000\n\n"
+            yield f"data: {json.dumps({'type': 'hello', 'shared': conversation_events.shared})}\n\n"
+            deadline = time.time() + AGENT_EVENTS_STREAM_SECONDS
+            while time.time() < deadline:
+                try:
+                    event = subscriber.get(timeout=min(AGENT_EVENTS_KEEPALIVE_SECONDS, max(deadline - time.time(), 0.1)))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+        finally:
+            conversation_events.unsubscribe(subscriber)
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/agent_portal/events/stats', methods=['GET'])
+def agent_portal_event_stats():
+    """Subscriber and event counters of this worker's conversation event bus"""
+    return jsonify({'success': True, 'stats': conversation_events.get_stats()})
+
 @app.route('/api/chatbot/conversations', methods=['GET'])
 def get_chatbot_conversations():
     """Get all chatbot conversations"""
     try:
-        from models import UnifiedConversation
-        
-        # Query unified conversations that are chatbot type
-        conversations = UnifiedConversation.query.filter_by(
-            conversation_type='chatbot'
-        ).order_by(UnifiedConversation.updated_at.desc()).limit(100).all()
+        # Query unified conversations that are chatbot type, optionally only those with a tag (e.g. ?tag=Live Agent)
+        query = UnifiedConversation.query.filter_by(conversation_type='chatbot')
+        tag = request.args.get('tag')
+        if tag:
+            query = query.filter(UnifiedConversation.has_tag(tag))
+        conversations = query.order_by(UnifiedConversation.updated_at.desc()).limit(100).all()
         
-        # Format for display
+        # Format for display (message counts are stored on the conversation, no query per row)
         chatbot_sessions = []
         for conv in conversations:
-            # Get message count
-            from models import UnifiedMessage
-            message_count = UnifiedMessage.query.filter_by(session_id=conv.session_id).count()
-            
             chatbot_sessions.append({
                 'session_id': conv.session_id,
                 'user_identifier': conv.user_identifier,
                 'username': conv.username or 'Anonymous',
                 'email': conv.email or 'Not provided',
                 'device_id': conv.device_id or 'Unknown device',
-                'message_count': message_count,
+                'message_count': conv.message_count or 0,
                 'created_at': conv.created_at.isoformat() if conv.created_at else '',
                 'updated_at': conv.updated_at.isoformat() if conv.updated_at else '',
                 'last_activity': conv.updated_at.strftime('%Y-%m-%d %H:%M:%S') if conv.updated_at else 'Unknown',
@@ -2056,6 +2157,7 @@ def send_live_chat_message(session_id):
         
         # Update conversation timestamp
         conversation.updated_at = datetime.utcnow()
+        conversation.record_message(message.created_at)
         if sender_type == 'agent' and not conversation.agent_id:
             conversation.agent_id = data.get('sender_id', 'agent')
         
@@ -2101,6 +2203,7 @@ def transfer_to_agent():
         if existing_conversation:
             # Update existing conversation to live chat type
             existing_conversation.conversation_type = 'live_chat'
+            analytics_rollups.mark_dirty(existing_conversation.created_at)
             existing_conversation.agent_id = None  # Will be assigned when agent connects
             existing_conversation.updated_at = datetime.utcnow()
             
@@ -2116,6 +2219,7 @@ def transfer_to_agent():
             )
             
             db.session.add(transfer_message)
+            existing_conversation.record_message(transfer_message.created_at)
             db.session.commit()
             
             logging.info(f"Transferred existing conversation {session_id} to live chat for user {user_identifier}")
@@ -2246,7 +2350,10 @@ def create_webhook():
             webhook_secret=data.get('webhook_secret'),
             auth_type=data.get('auth_type', 'none'),
             retry_count=data.get('retry_count', 3),
-            timeout_seconds=data.get('timeout_seconds', 30)
+            timeout_seconds=data.get('timeout_seconds', 30),
+            batch_enabled=bool(data.get('batch_enabled', False)),
+            batch_window_seconds=int(data.get('batch_window_seconds', 5)),
+            batch_max_events=int(data.get('batch_max_events', 50))
         )
         
         webhook.set_event_types(data.get('event_types', []))
@@ -2265,6 +2372,32 @@ def create_webhook():
         logging.error(f"Error creating webhook: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/webhooks/<int:webhook_id>/batching', methods=['PUT'])
+def update_webhook_batching(webhook_id):
+    """Enable/disable event batching for a webhook and set its window and size thresholds"""
+    try:
+        webhook = WebhookConfig.query.get_or_404(webhook_id)
+        data = request.get_json() or {}
+        
+        if 'batch_enabled' in data:
+            webhook.batch_enabled = bool(data['batch_enabled'])
+        if 'batch_window_seconds' in data:
+            webhook.batch_window_seconds = max(0, int(data['batch_window_seconds']))
+        if 'batch_max_events' in data:
+            webhook.batch_max_events = max(1, int(data['batch_max_events']))
+        
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'webhook': webhook.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error updating webhook batching: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/webhooks/<int:webhook_id>/test', methods=['POST'])
 def test_webhook(webhook_id):
     """Test a webhook configuration"""
@@ -2294,6 +2427,39 @@ except ImportError:
     webhook_integration = None
 
 # Webhook Integration Routes
+@app.route('/api/webhooks/metrics', methods=['GET'])
+def get_webhook_metrics():
+    """Get per-webhook delivery latency/failure metrics of this worker"""
+    try:
+        from webhook_manager import webhook_manager
+        
+        return jsonify({'success': True, 'metrics': webhook_manager.get_metrics()})
+        
+    except Exception as e:
+        logging.error(f"Error getting webhook metrics: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/webhooks/deliveries', methods=['GET'])
+def get_webhook_deliveries():
+    """Get queued/recent webhook deliveries (filter with ?status=pending|sending|delivered|failed)"""
+    try:
+        query = WebhookDelivery.query
+        status = request.args.get('status')
+        if status:
+            query = query.filter_by(status=status)
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        deliveries = query.order_by(WebhookDelivery.id.desc()).limit(limit).all()
+        
+        return jsonify({
+            'success': True,
+            'deliveries': [delivery.to_dict() for delivery in deliveries],
+            'stats': webhook_outbox.get_stats()
+        })
+        
+    except Exception as e:
+        logging.error(f"Error getting webhook deliveries: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/webhook/incoming', methods=['POST'])
 def webhook_incoming():
     """Receive messages from third-party platforms"""
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark AI tool selection: separate clarification check + tool selection calls (before)
+vs. a single combined decision call (after)
+
+Usage:
+    python benchmark_tool_decision.py          # real gpt-4o calls (needs OPENAI_API_KEY and active tools)
+    python benchmark_tool_decision.py --mock   # fake OpenAI client and fixed tools, fixed latency per call
+"""
+import sys
+import os
+import time
+import types
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from ai_tool_executor import AIToolExecutor
+from tool_router import tool_router
+
+# Fixed question set: ambiguous short questions first, then clear ones
+QUESTIONS = [
+    "credits",
+    "account",
+    "status",
+    "token",
+    "balance",
+    "profile info",
+    "What is my current credit balance?",
+    "How do I purchase more credits?",
+    "show me my account",
+    "What are your opening hours?",
+]
+
+MOCK_LATENCY_SECONDS = 0.3
+
+# Tool specs used in mock mode, so the comparison doesn't depend on the tools in the database
+MOCK_TOOLS = [
+    {'type': 'function', 'function': {
+        'name': 'get_credit_balance',
+        'description': 'Get the current credit balance of the user account',
+        'parameters': {'type': 'object', 'properties': {'email': {'type': 'string', 'description': 'Account email'}}, 'required': []}
+    }},
+    {'type': 'function', 'function': {
+        'name': 'get_account_details',
+        'description': 'Get profile and subscription status of the user account',
+        'parameters': {'type': 'object', 'properties': {'email': {'type': 'string', 'description': 'Account email'}}, 'required': []}
+    }},
+    {'type': 'function', 'function': {
+        'name': 'get_token_usage',
+        'description': 'Get API token usage for the current billing period',
+        'parameters': {'type': 'object', 'properties': {}, 'required': []}
+    }},
+]
+
+
+class CountingCompletions:
+    """Wraps chat.completions to count calls and time spent in them"""
+
+    def __init__(self, completions):
+        self._completions = completions
+        self.calls = 0
+        self.seconds = 0.0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        start = time.time()
+        try:
+            return self._completions.create(**kwargs)
+        finally:
+            self.seconds += time.time() - start
+
+
+class MockCompletions:
+    """Answers like gpt-4o deciding that no tool or clarification is needed"""
+
+    def create(self, **kwargs):
+        time.sleep(MOCK_LATENCY_SECONDS)
+        message = types.SimpleNamespace(content="CLEAR", tool_calls=None)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def run(combined: bool, mock: bool) -> dict:
+    executor = AIToolExecutor()
+    executor.combined_decision = combined
+    completions = MockCompletions() if mock else executor.openai_client.chat.completions
+    counter = CountingCompletions(completions)
+    executor.openai_client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=counter))
+    if mock:
+        executor.get_tools_as_openai_functions = lambda: MOCK_TOOLS
+
+    results = []
+    start = time.time()
+    for question in QUESTIONS:
+        calls_before = counter.calls
+        question_start = time.time()
+        should_use, tool_name, tool_args, clarification = executor.should_use_tools(question)
+        if clarification:
+            outcome = f"clarify: {clarification}"
+        elif should_use:
+            outcome = f"tool: {tool_name} {tool_args}"
+        else:
+            outcome = "none"
+        results.append((question, counter.calls - calls_before, time.time() - question_start, outcome))
+
+    return {
+        'results': results,
+        'calls': counter.calls,
+        'llm_seconds': counter.seconds,
+        'total_seconds': time.time() - start
+    }
+
+
+def benchmark_tool_decision(mock: bool = False):
+    """Run the question set in both modes and print call counts and latency"""
+    if mock:
+        # Every question reaches function calling, so call counts depend only on the decision mode
+        tool_router.enabled = False
+
+    with app.app_context():
+        if not mock and not AIToolExecutor().get_tools_as_openai_functions():
+            # Without tools neither mode calls the LLM and the comparison would show no difference
+            print("No active AI tools: create tools first, or run with --mock to use a fixed set")
+            sys.exit(1)
+        runs = [("Before (separate clarification call)", run(False, mock)),
+                ("After (combined decision call)", run(True, mock))]
+
+    for label, result in runs:
+        print(f"\n{label}")
+        print("=" * 70)
+        for question, calls, seconds, outcome in result['results']:
+            print(f"{question[:35]:<35} calls={calls} {seconds * 1000:7.0f} ms  {outcome[:60]}")
+        print("-" * 70)
+        print(f"LLM calls: {result['calls']} | LLM time: {result['llm_seconds']:.2f}s | total: {result['total_seconds']:.2f}s")
+
+    before, after = runs[0][1], runs[1][1]
+    print(f"\nCalls saved: {before['calls'] - after['calls']} | "
+          f"time saved: {before['total_seconds'] - after['total_seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    benchmark_tool_decision(mock='--mock' in sys.argv)
@@ -0,0 +1,136 @@
+"""
+In-process cache of chat settings and the active system prompt.
+
+Both are tiny, rarely changing tables read on every request (the system prompt up to twice per
+question). Each worker keeps a copy of them and checks the config_versions row of each group at most
+every CONFIG_CACHE_CHECK_SECONDS; writers call bump() in the same transaction as their change, so
+the change reaches this worker as soon as it commits and every other worker within one check
+interval.
+"""
+
+import os
+import logging
+import threading
+import time
+from typing import Dict, Any, Optional
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import ChatSettings, SystemPrompt, ConfigVersion, db
+
+_PENDING_KEY = 'config_cache_pending'
+
+
+class ConfigCache:
+    """Versioned copies of the chat_settings and system_prompts groups"""
+
+    GROUPS = ('chat_settings', 'system_prompts')
+
+    def __init__(self, check_interval_seconds: float = 5):
+        self.check_interval_seconds = check_interval_seconds
+        self._lock = threading.Lock()
+        # group -> {'version': int, 'data': ...}
+        self._groups: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._checked_at = 0.0
+        self.loads = 0
+        self.version_checks = 0
+        self.logger = logging.getLogger(__name__)
+
+    def _load(self, group: str) -> Any:
+        if group == 'chat_settings':
+            return {
+                setting.setting_name: {'value': setting.setting_value, 'type': setting.setting_type,
+                                       'description': setting.description}
+                for setting in ChatSettings.query.all()
+            }
+        active_prompt = SystemPrompt.query.filter_by(is_active=True).first()
+        return active_prompt.prompt_text if active_prompt else None
+
+    def _refresh_versions(self) -> None:
+        if time.time() - self._checked_at < self.check_interval_seconds:
+            return
+        self._versions = dict(db.session.query(ConfigVersion.name, ConfigVersion.version).all())
+        self._checked_at = time.time()
+        self.version_checks += 1
+
+    def _get(self, group: str) -> Any:
+        with self._lock:
+            self._refresh_versions()
+            version = self._versions.get(group, 0)
+            cached = self._groups.get(group)
+            if cached is None or cached['version'] != version:
+                cached = {'version': version, 'data': self._load(group)}
+                self._groups[group] = cached
+                self.loads += 1
+                self.logger.info(f"Loaded {group} into config cache (v{version})")
+            return cached['data']
+
+    def get_settings(self) -> Dict[str, Dict[str, Any]]:
+        """Stored chat settings by name: {'value', 'type', 'description'} (shared, do not modify)"""
+        return self._get('chat_settings')
+
+    def get_active_prompt_text(self) -> Optional[str]:
+        """Text of the active system prompt, or None if no prompt is active"""
+        return self._get('system_prompts')
+
+    @staticmethod
+    def _increment(session, group: str) -> int:
+        return session.query(ConfigVersion).filter_by(name=group).update(
+            {ConfigVersion.version: ConfigVersion.version + 1}, synchronize_session=False
+        )
+
+    def bump(self, group: str, session=None) -> None:
+        """Record a change to a group in the current transaction; caches reload once it commits"""
+        session = session or db.session()
+        if not self._increment(session, group):
+            # First change to this group: two writers can both find no row, so insert in a savepoint
+            # and let the loser of the race increment the row the winner created
+            try:
+                with session.begin_nested():
+                    session.add(ConfigVersion(name=group, version=1))
+            except IntegrityError:
+                self._increment(session, group)
+        session.info.setdefault(_PENDING_KEY, set()).add(group)
+
+    def invalidate(self, group: str = None) -> None:
+        """Reload a group (or all) on next use and re-read the versions"""
+        with self._lock:
+            if group:
+                self._groups.pop(group, None)
+            else:
+                self._groups.clear()
+            self._checked_at = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            versions = {group: cached['version'] for group, cached in self._groups.items()}
+        return {
+            'cached_versions': versions,
+            'loads': self.loads,
+            'version_checks': self.version_checks,
+            'check_interval_seconds': self.check_interval_seconds
+        }
+
+
+@sqlalchemy_event.listens_for(Session, 'after_commit')
+def _invalidate_pending(session) -> None:
+    # Also fired when a savepoint is released; wait for the outer commit
+    if session.in_nested_transaction():
+        return
+    for group in session.info.pop(_PENDING_KEY, None) or ():
+        config_cache.invalidate(group)
+
+
+@sqlalchemy_event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending(session, previous_transaction) -> None:
+    # A savepoint rollback (e.g. bump() losing the insert race) leaves the outer change pending
+    if session.in_transaction():
+        return
+    session.info.pop(_PENDING_KEY, None)
+
+
+# Global config cache instance
+config_cache = ConfigCache(
+    check_interval_seconds=float(os.environ.get('CONFIG_CACHE_CHECK_SECONDS', 5))
+)
@@ -0,0 +1,180 @@
+"""
+In-process pub/sub of conversation changes for real-time agent views.
+
+Models and the live chat manager publish small deltas (new message, status change, tags); the agent
+portal receives them over Server-Sent Events instead of polling. Events raised inside a database
+transaction are only published once it commits. With Redis available (CONVERSATION_EVENTS_REDIS_URL,
+defaulting to REDIS_URL) events are relayed between workers, so an agent connected to one gunicorn
+worker also sees changes made in the others.
+"""
+
+import os
+import json
+import queue
+import socket
+import logging
+import threading
+import uuid
+from typing import Dict, Any, List
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.orm import Session
+
+try:
+    import redis
+except ImportError:  # Optional dependency: without it events stay within each worker
+    redis = None
+
+_PENDING_KEY = 'conversation_events_pending'
+
+
+class ConversationEventBus:
+    """Fans out conversation events to subscriber queues (one per connected agent stream)"""
+
+    def __init__(self, max_queue_size: int = 500, redis_url: str = None, channel: str = 'conversation_events'):
+        self.max_queue_size = max_queue_size
+        self.redis_url = redis_url
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._subscribers: List[queue.Queue] = []
+        self._redis = None
+        self._relay_thread = None
+        self._pid = None
+        self._origin = None
+        self.published = 0
+        self.dropped = 0
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def shared(self) -> bool:
+        """True when events are relayed between workers"""
+        return self._get_redis() is not None
+
+    def _check_process(self) -> None:
+        # After a fork, the parent's subscribers, connection and relay thread don't exist in this worker
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._origin = f"{socket.gethostname()}:{self._pid}:{uuid.uuid4().hex[:8]}"
+            self._subscribers = []
+            self._redis = None
+            self._relay_thread = None
+
+    def _get_redis(self):
+        if not self.redis_url or redis is None:
+            return None
+        with self._lock:
+            self._check_process()
+            if self._redis is None:
+                try:
+                    self._redis = redis.Redis.from_url(self.redis_url)
+                except Exception as e:
+                    self.logger.error(f"Error connecting to Redis for conversation events: {e}")
+                    self.redis_url = None
+            return self._redis
+
+    def subscribe(self) -> queue.Queue:
+        """Register a subscriber; events arrive on the returned queue until unsubscribe()"""
+        subscriber = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            self._check_process()
+            self._subscribers.append(subscriber)
+        self._ensure_relay()
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue) -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Deliver an event to the subscribers of this worker and, with Redis, of all other workers"""
+        self.published += 1
+        self._fan_out(event)
+        client = self._get_redis()
+        if client is not None:
+            try:
+                client.publish(self.channel, json.dumps({'origin': self._origin, 'event': event}, default=str))
+            except Exception as e:
+                self.logger.error(f"Error relaying conversation event: {e}")
+
+    def publish_after_commit(self, event: Dict[str, Any], session=None) -> None:
+        """Publish once the current database transaction commits (dropped on rollback)"""
+        from models import db
+        session = session or db.session()
+        session.info.setdefault(_PENDING_KEY, []).append(event)
+
+    def _fan_out(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self._check_process()
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A stalled client: replace its backlog with a request to reload everything
+                self.dropped += 1
+                try:
+                    while True:
+                        subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait({'type': 'resync'})
+
+    def _ensure_relay(self) -> None:
+        client = self._get_redis()
+        if client is None:
+            return
+        with self._lock:
+            if self._relay_thread is not None and self._relay_thread.is_alive():
+                return
+            self._relay_thread = threading.Thread(target=self._relay, args=(client,), name='conversation-events-relay', daemon=True)
+            self._relay_thread.start()
+
+    def _relay(self, client) -> None:
+        """Forward events published by other workers to this worker's subscribers"""
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self.channel)
+            for message in pubsub.listen():
+                try:
+                    data = json.loads(message['data'])
+                except (TypeError, ValueError):
+                    continue
+                if data.get('origin') != self._origin:
+                    self._fan_out(data['event'])
+        except Exception as e:
+            self.logger.error(f"Conversation event relay stopped: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subscribers = len(self._subscribers)
+        return {
+            'subscribers': subscribers,
+            'published': self.published,
+            'dropped': self.dropped,
+            'shared': self.redis_url is not None and redis is not None
+        }
+
+
+@sqlalchemy_event.listens_for(Session, 'after_commit')
+def _publish_pending(session) -> None:
+    # Also fired when a SAVEPOINT is released; only the outermost commit makes events visible
+    if session.in_nested_transaction():
+        return
+    events = session.info.pop(_PENDING_KEY, None)
+    for pending_event in events or []:
+        conversation_events.publish(pending_event)
+
+
+@sqlalchemy_event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending(session, previous_transaction) -> None:
+    # A rolled back SAVEPOINT leaves the enclosing transaction (and its events) alive
+    if session.in_transaction():
+        return
+    session.info.pop(_PENDING_KEY, None)
+
+
+# Global conversation event bus instance
+conversation_events = ConversationEventBus(
+    max_queue_size=int(os.environ.get('CONVERSATION_EVENTS_QUEUE_SIZE', 500)),
+    redis_url=os.environ.get('CONVERSATION_EVENTS_REDIS_URL') or os.environ.get('REDIS_URL')
+)
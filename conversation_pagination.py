@@ -0,0 +1,101 @@
+"""
+Keyset (cursor) pagination for conversation lists.
+
+Pages are ordered by (last_activity, id) descending and the cursor carries the position of the
+last row of the previous page, so fetching a deep page costs the same index range scan as the
+first one instead of skipping `offset` rows. Total counts over the same filters are cached for a
+short time, since counting millions of rows on every page turn costs more than the page itself.
+"""
+
+import os
+import json
+import base64
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+from sqlalchemy import and_, or_
+from models import UnifiedConversation
+
+
+class InvalidCursor(ValueError):
+    """The pagination cursor is malformed"""
+
+
+def encode_cursor(conversation: UnifiedConversation) -> str:
+    """Opaque cursor pointing just after this conversation in (last_activity, id) order"""
+    last_activity = conversation.last_activity.isoformat() if conversation.last_activity else None
+    raw = json.dumps([last_activity, conversation.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        last_activity, conversation_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (datetime.fromisoformat(last_activity) if last_activity else None), int(conversation_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+
+def order_by_recent(query):
+    """Most recently active first; id breaks ties so every row has a unique position"""
+    return query.order_by(UnifiedConversation.last_activity.desc(), UnifiedConversation.id.desc())
+
+
+def after_cursor(query, cursor: str):
+    """Restrict an order_by_recent() query to the rows after the cursor"""
+    last_activity, conversation_id = decode_cursor(cursor)
+    if last_activity is None:
+        return query.filter(UnifiedConversation.last_activity.is_(None), UnifiedConversation.id < conversation_id)
+    return query.filter(or_(
+        UnifiedConversation.last_activity < last_activity,
+        and_(UnifiedConversation.last_activity == last_activity, UnifiedConversation.id < conversation_id)
+    ))
+
+
+class ConversationCountCache:
+    """Short-lived cache of conversation counts per filter combination"""
+
+    def __init__(self, ttl_seconds: float = 60, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # filters key -> (counted_at, count)
+        self._counts: Dict[tuple, Tuple[float, int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger(__name__)
+
+    def get_count(self, query, filters: Dict[str, Any]) -> Tuple[int, float]:
+        """Return (count, age_seconds) for the filtered query, counting only when the cached value expired"""
+        key = tuple(sorted(filters.items()))
+        now = time.time()
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached is not None and now - cached[0] < self.ttl_seconds:
+                self.hits += 1
+                return cached[1], now - cached[0]
+            self.misses += 1
+
+        count = query.order_by(None).count()
+        with self._lock:
+            if len(self._counts) >= self.max_entries:
+                self._counts.clear()
+            self._counts[key] = (now, count)
+        return count, 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._counts)
+        return {'entries': entries, 'ttl_seconds': self.ttl_seconds, 'hits': self.hits, 'misses': self.misses}
+
+
+# Global conversation count cache instance
+conversation_count_cache = ConversationCountCache(
+    ttl_seconds=float(os.environ.get('CONVERSATION_COUNT_CACHE_SECONDS', 60))
+)
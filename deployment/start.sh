@@ -28,11 +28,12 @@ mkdir -p uploads faiss_index logs static/widget_icons
 exec gunicorn \
     --bind 0.0.0.0:5000 \
     --workers 4 \
-    --worker-class sync \
+    --worker-class gthread \
+    --threads 8 \
     --worker-connections 1000 \
     --max-requests 1000 \
     --max-requests-jitter 50 \
-    --timeout 300 \
+    --timeout 360 \
     --keep-alive 2 \
     --log-level info \
     --log-file logs/gunicorn.log \
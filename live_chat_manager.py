@@ -9,10 +9,10 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Tuple
 from models import (
-    LiveChatSession, LiveChatMessage, LiveChatAgent, 
-    WebhookConfig, db
+    LiveChatSession, LiveChatMessage, LiveChatAgent, db
 )
-from webhook_manager import webhook_manager
+from webhook_outbox import webhook_outbox
+from conversation_events import conversation_events
 
 class LiveChatManager:
     """Manages live chat sessions and agent interactions"""
@@ -55,8 +55,8 @@ class LiveChatManager:
         
         self.logger.info(f"Created live chat session {session_id} for user {user_identifier}")
         
-        # Send webhook notification
-        self._send_webhook_notification('session_created', session.to_dict())
+        # Notify agent views and webhooks
+        self._notify('session_created', session.to_dict())
         
         # Try to assign an agent
         self.assign_agent(session_id)
@@ -148,12 +148,12 @@ class LiveChatManager:
         
         self.logger.info(f"Message sent in session {session_id} by {sender_type} {sender_id}")
         
-        # Send webhook notification
+        # Notify agent views and webhooks
         message_data = message.to_dict()
         message_data.update({
             'session_data': session.to_dict()
         })
-        self._send_webhook_notification('new_message', message_data)
+        self._notify('new_message', message_data)
         
         return message
     
@@ -208,14 +208,14 @@ class LiveChatManager:
             message_type='system_notification'
         )
         
-        # Send webhook notification
+        # Notify agent views and webhooks
         assignment_data = {
             'session_id': session_id,
             'agent_id': agent.agent_id,
             'agent_name': agent.agent_name,
             'assigned_at': datetime.utcnow().isoformat()
         }
-        self._send_webhook_notification('agent_assigned', assignment_data)
+        self._notify('agent_assigned', assignment_data)
         
         return True
     
@@ -281,14 +281,14 @@ class LiveChatManager:
             
             self.logger.info(f"Session {session_id} status updated from {old_status} to {status}")
             
-            # Send webhook notification
+            # Notify agent views and webhooks
             status_data = {
                 'session_id': session_id,
                 'old_status': old_status,
                 'new_status': status,
                 'updated_at': datetime.utcnow().isoformat()
             }
-            self._send_webhook_notification('status_changed', status_data)
+            self._notify('status_changed', status_data)
             
             return True
             
@@ -364,14 +364,14 @@ class LiveChatManager:
         
         self.logger.info(f"Completed live chat session {session_id}")
         
-        # Send webhook notification
+        # Notify agent views and webhooks
         completion_data = {
             'session_id': session_id,
             'completed_by': agent_id or session.agent_id,
             'completed_at': session.completed_at.isoformat(),
             'duration_minutes': self._calculate_session_duration(session)
         }
-        self._send_webhook_notification('session_completed', completion_data)
+        self._notify('session_completed', completion_data)
         
         return True
     
@@ -468,18 +468,29 @@ class LiveChatManager:
         
         return int(duration.total_seconds() / 60)
     
+    def _notify(self, event_type: str, data: Dict[str, Any]) -> None:
+        """Publish a committed live chat event to connected agent views and queue its webhook notification"""
+        try:
+            conversation_events.publish({
+                'type': event_type,
+                'conversation_type': 'live_chat',
+                'session_id': data.get('session_id'),
+                'data': data
+            })
+        except Exception as e:
+            self.logger.error(f"Error publishing conversation event: {str(e)}")
+        self._send_webhook_notification(event_type, data)
+    
     def _send_webhook_notification(self, event_type: str, data: Dict[str, Any]) -> None:
-        """Send webhook notification for live chat events"""
+        """Send webhook notification for live chat events to every active webhook"""
         try:
-            active_config = WebhookConfig.query.filter_by(is_active=True).first()
-            if not active_config:
-                return
-            
-            if webhook_manager:
-                webhook_manager.send_webhook(active_config, event_type, data)
+            # Delivered in the background so slow endpoints don't hold up the chat
+            if webhook_outbox.enqueue_all(event_type, data):
+                db.session.commit()
                 
         except Exception as e:
-            self.logger.error(f"Error sending webhook notification: {str(e)}")
+            db.session.rollback()
+            self.logger.error(f"Error queueing webhook notification: {str(e)}")
 
 # Create global instance
 live_chat_manager = LiveChatManager()
\ No newline at end of file
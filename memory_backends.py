@@ -0,0 +1,347 @@
+"""
+Storage backends for session chat memory.
+
+SessionMemoryManager keeps the recent window of every conversation in one of these:
+- InProcessMemoryBackend: bounded LRU/TTL store in the worker process (default, not shared)
+- DatabaseMemoryBackend: ring buffer table in the application database, shared by all workers
+- RedisMemoryBackend: capped Redis lists, shared by all workers and hosts
+
+Every backend only ever reads the last N messages of a conversation.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from models import SessionMemoryMessage, db
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+def message_to_dict(message: BaseMessage) -> Dict[str, Any]:
+    """Serialize a chat message for a shared backend"""
+    return {
+        'type': 'human' if isinstance(message, HumanMessage) else 'ai',
+        'content': message.content,
+        'response_type': message.additional_kwargs.get('response_type')
+    }
+
+
+def message_from_dict(data: Dict[str, Any]) -> BaseMessage:
+    """Rebuild a chat message stored by message_to_dict"""
+    if data.get('type') == 'human':
+        return HumanMessage(content=data['content'])
+    message = AIMessage(content=data['content'])
+    if data.get('response_type'):
+        message.additional_kwargs['response_type'] = data['response_type']
+    return message
+
+
+class SessionStore:
+    """Bounded LRU store for in-memory chat histories.
+
+    Entries expire after ttl_seconds without being used, and the least recently used entries are
+    evicted once max_sessions or max_bytes (approximate size of the stored messages) is exceeded.
+    """
+
+    MESSAGE_OVERHEAD_BYTES = 200  # Rough per-message cost of the LangChain message object
+
+    def __init__(self, max_sessions: int = 1000, max_bytes: int = 32 * 1024 * 1024, ttl_seconds: int = 3600):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _estimate_bytes(self, messages: List[BaseMessage]) -> int:
+        return sum(len(str(msg.content).encode('utf-8')) + self.MESSAGE_OVERHEAD_BYTES for msg in messages)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.total_bytes -= entry['bytes']
+
+    def _is_expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return now - entry['last_access'] > self.ttl_seconds
+
+    def _enforce_limits(self) -> None:
+        # Entries are kept in access order, so expired ones are at the front
+        now = time.time()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if not self._is_expired(entry, now):
+                break
+            self._remove(key)
+            self.expirations += 1
+
+        while len(self._entries) > 1 and (len(self._entries) > self.max_sessions or self.total_bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[List[BaseMessage]]:
+        """Return the messages stored for key and mark it as recently used, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.time()
+            if entry is not None and self._is_expired(entry, now):
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            entry['last_access'] = now
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['messages']
+
+    def append(self, key: str, messages: List[BaseMessage], max_messages: int = None) -> None:
+        """Append messages to key (keeping the last max_messages), evicting other entries if over the limits."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {'messages': [], 'bytes': 0, 'last_access': time.time()}
+                self._entries[key] = entry
+            entry['messages'].extend(messages)
+            if max_messages and len(entry['messages']) > max_messages:
+                del entry['messages'][:-max_messages]
+
+            new_bytes = self._estimate_bytes(entry['messages'])
+            self.total_bytes += new_bytes - entry['bytes']
+            entry['bytes'] = new_bytes
+            entry['last_access'] = time.time()
+            self._entries.move_to_end(key)
+            self._enforce_limits()
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def purge_expired(self) -> int:
+        """Drop expired entries; returns how many were removed."""
+        with self._lock:
+            before = self.expirations
+            self._enforce_limits()
+            return self.expirations - before
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'sessions': len(self._entries),
+                'persistent_sessions': sum(1 for key in self._entries if key.startswith('user:')),
+                'messages': sum(len(entry['messages']) for entry in self._entries.values()),
+                'bytes': self.total_bytes,
+                'max_sessions': self.max_sessions,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class InProcessMemoryBackend:
+    """Session memory held in this worker's process (not shared between gunicorn workers)"""
+
+    name = 'memory'
+
+    def __init__(self, max_messages: int = 20, max_sessions: int = 1000, max_bytes: int = 32 * 1024 * 1024, ttl_seconds: int = 3600):
+        self.max_messages = max_messages
+        self.store = SessionStore(max_sessions=max_sessions, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+
+    def get_messages(self, key: str, limit: int) -> List[BaseMessage]:
+        messages = self.store.get(key)
+        return list(messages[-limit:]) if messages else []
+
+    def append(self, key: str, messages: List[BaseMessage]) -> None:
+        self.store.append(key, messages, self.max_messages)
+
+    def clear(self, key: str) -> None:
+        self.store.pop(key)
+
+    def purge_expired(self) -> int:
+        return self.store.purge_expired()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.store.get_stats()
+        stats['backend'] = self.name
+        return stats
+
+
+class DatabaseMemoryBackend:
+    """Session memory in the application database (session_memory_messages), shared by all workers.
+
+    Each conversation is a ring buffer: appending prunes everything but the last max_messages rows,
+    and rows untouched for ttl_seconds are purged periodically.
+    """
+
+    name = 'database'
+    PURGE_INTERVAL_SECONDS = 300
+
+    def __init__(self, max_messages: int = 20, ttl_seconds: int = 3600):
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self._last_purge = time.time()
+        self.reads = 0
+        self.appends = 0
+
+    def get_messages(self, key: str, limit: int) -> List[BaseMessage]:
+        self.reads += 1
+        rows = SessionMemoryMessage.query.filter_by(memory_key=key).order_by(
+            SessionMemoryMessage.id.desc()
+        ).limit(limit).all()
+        return [message_from_dict(row.to_dict()) for row in reversed(rows)]
+
+    def append(self, key: str, messages: List[BaseMessage]) -> None:
+        self.appends += 1
+        try:
+            for message in messages:
+                data = message_to_dict(message)
+                db.session.add(SessionMemoryMessage(
+                    memory_key=key,
+                    message_type=data['type'],
+                    content=data['content'],
+                    response_type=data['response_type']
+                ))
+            db.session.flush()
+
+            # Keep only the newest max_messages rows for this conversation
+            cutoff_id = db.session.query(SessionMemoryMessage.id).filter_by(memory_key=key).order_by(
+                SessionMemoryMessage.id.desc()
+            ).offset(self.max_messages).limit(1).scalar()
+            if cutoff_id is not None:
+                SessionMemoryMessage.query.filter(
+                    SessionMemoryMessage.memory_key == key,
+                    SessionMemoryMessage.id <= cutoff_id
+                ).delete(synchronize_session=False)
+
+            db.session.commit()
+        except Exception as e:
+            logging.error(f"Error appending session memory: {str(e)}")
+            db.session.rollback()
+
+        if time.time() - self._last_purge > self.PURGE_INTERVAL_SECONDS:
+            self.purge_expired()
+
+    def clear(self, key: str) -> None:
+        try:
+            SessionMemoryMessage.query.filter_by(memory_key=key).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            logging.error(f"Error clearing session memory: {str(e)}")
+            db.session.rollback()
+
+    def purge_expired(self) -> int:
+        """Delete conversations with no new message within the TTL; returns how many rows were removed."""
+        self._last_purge = time.time()
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+            stale_keys = [key for (key,) in db.session.query(SessionMemoryMessage.memory_key).group_by(
+                SessionMemoryMessage.memory_key
+            ).having(db.func.max(SessionMemoryMessage.created_at) < cutoff).all()]
+            if not stale_keys:
+                return 0
+            removed = SessionMemoryMessage.query.filter(
+                SessionMemoryMessage.memory_key.in_(stale_keys)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            return removed
+        except Exception as e:
+            logging.error(f"Error purging session memory: {str(e)}")
+            db.session.rollback()
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'backend': self.name,
+            'sessions': db.session.query(db.func.count(db.distinct(SessionMemoryMessage.memory_key))).scalar(),
+            'messages': SessionMemoryMessage.query.count(),
+            'ttl_seconds': self.ttl_seconds,
+            'reads': self.reads,
+            'appends': self.appends
+        }
+
+
+class RedisMemoryBackend:
+    """Session memory in Redis lists (RPUSH + LTRIM ring buffer with a sliding TTL), shared by all workers.
+
+    Any client exposing the redis-py list commands and pipeline() can be passed in, e.g. a local stand-in.
+    """
+
+    name = 'redis'
+
+    def __init__(self, client=None, url: str = None, max_messages: int = 20, ttl_seconds: int = 3600, prefix: str = 'chat_memory:'):
+        if client is None:
+            if redis is None:
+                raise ImportError("The redis package is required for the redis session memory backend")
+            client = redis.Redis.from_url(url or 'redis://localhost:6379/0')
+        self.client = client
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.reads = 0
+        self.appends = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def get_messages(self, key: str, limit: int) -> List[BaseMessage]:
+        self.reads += 1
+        raw_messages = self.client.lrange(self._key(key), -limit, -1)
+        return [message_from_dict(json.loads(raw)) for raw in raw_messages]
+
+    def append(self, key: str, messages: List[BaseMessage]) -> None:
+        self.appends += 1
+        redis_key = self._key(key)
+        pipe = self.client.pipeline()
+        pipe.rpush(redis_key, *[json.dumps(message_to_dict(message)) for message in messages])
+        pipe.ltrim(redis_key, -self.max_messages, -1)
+        pipe.expire(redis_key, self.ttl_seconds)
+        pipe.execute()
+
+    def clear(self, key: str) -> None:
+        self.client.delete(self._key(key))
+
+    def purge_expired(self) -> int:
+        # Redis expires keys itself
+        return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'backend': self.name,
+            'ttl_seconds': self.ttl_seconds,
+            'reads': self.reads,
+            'appends': self.appends
+        }
+
+
+def create_memory_backend(name: str = None, max_messages: int = 20, max_sessions: int = 1000, max_bytes: int = 32 * 1024 * 1024, ttl_seconds: int = 3600, redis_url: str = None):
+    """Create the session memory backend named by SESSION_MEMORY_BACKEND (memory, database or redis)"""
+    name = (name or 'memory').lower()
+    if name == 'database':
+        return DatabaseMemoryBackend(max_messages=max_messages, ttl_seconds=ttl_seconds)
+    if name == 'redis':
+        try:
+            return RedisMemoryBackend(url=redis_url, max_messages=max_messages, ttl_seconds=ttl_seconds)
+        except ImportError as e:
+            logging.error(f"{str(e)}; falling back to in-process session memory")
+    elif name != 'memory':
+        logging.warning(f"Unknown session memory backend '{name}', using in-process memory")
+    return InProcessMemoryBackend(max_messages=max_messages, max_sessions=max_sessions, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
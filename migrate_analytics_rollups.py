@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the analytics_rollups table and the created_at indexes its compactor
+queries by to existing databases.
+
+New databases get both from db.create_all(). The rollups are then backfilled for all history, so
+the stats endpoints read them from the first request; pass --no-compact to leave the backfill to the
+running app (stats over ranges it hasn't reached yet are counted live until then).
+"""
+
+import sys
+from sqlalchemy import inspect, text
+from app import app
+from models import db
+from analytics_rollups import analytics_rollups
+
+NEW_INDEXES = {
+    'ix_unified_conversations_created_at': ('unified_conversations', 'created_at'),
+    'ix_unified_messages_created_at': ('unified_messages', 'created_at'),
+    'ix_rag_feedback_feedback_timestamp': ('rag_feedback', 'feedback_timestamp')
+}
+
+def migrate_database(compact=True):
+    """Create the rollup table and missing indexes, optionally backfilling the rollups"""
+    with app.app_context():
+        db.create_all()
+        inspector = inspect(db.engine)
+        
+        try:
+            for index, (table, column) in NEW_INDEXES.items():
+                if index not in [existing['name'] for existing in inspector.get_indexes(table)]:
+                    db.session.execute(text(f"CREATE INDEX {index} ON {table} ({column})"))
+                    print(f"Created index: {index}")
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            return False
+        
+        if compact:
+            # Each pass backfills another ANALYTICS_ROLLUP_BACKFILL_HOURS; stop once only recent hours remain
+            while analytics_rollups.compact() > analytics_rollups.lookback_hours:
+                pass
+            print("Analytics rollups backfilled")
+        return True
+
+if __name__ == "__main__":
+    migrate_database(compact='--no-compact' not in sys.argv)
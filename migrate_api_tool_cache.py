@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the cache_ttl_seconds column to existing api_tools tables.
+
+New databases get the column from db.create_all(); run this once against existing databases.
+"""
+
+from sqlalchemy import inspect, text
+from app import app
+from models import db
+
+def migrate_database():
+    """Add api_tools.cache_ttl_seconds if it is missing"""
+    with app.app_context():
+        columns = [column['name'] for column in inspect(db.engine).get_columns('api_tools')]
+        if 'cache_ttl_seconds' in columns:
+            print("api_tools.cache_ttl_seconds already exists - nothing to do")
+            return True
+        
+        try:
+            db.session.execute(text("ALTER TABLE api_tools ADD COLUMN cache_ttl_seconds INTEGER DEFAULT 0"))
+            db.session.commit()
+            print("Added column: api_tools.cache_ttl_seconds")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    migrate_database()
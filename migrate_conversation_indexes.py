@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the conversation list indexes to existing unified_conversations tables.
+
+New databases get the indexes from db.create_all(); run this once against existing databases.
+Rows without last_activity are given one so that every conversation has a cursor position.
+"""
+
+from sqlalchemy import inspect, text
+from app import app
+from models import db
+
+NEW_INDEXES = {
+    'ix_unified_conversations_activity': 'last_activity, id',
+    'ix_unified_conversations_type_activity': 'conversation_type, last_activity, id',
+    'ix_unified_conversations_user_activity': 'user_identifier, last_activity, id'
+}
+
+def migrate_database():
+    """Backfill last_activity and create the indexes that are missing"""
+    with app.app_context():
+        indexes = [index['name'] for index in inspect(db.engine).get_indexes('unified_conversations')]
+        
+        try:
+            result = db.session.execute(text(
+                "UPDATE unified_conversations SET last_activity = COALESCE(updated_at, created_at) WHERE last_activity IS NULL"
+            ))
+            if result.rowcount:
+                print(f"Set last_activity on {result.rowcount} conversations")
+            
+            for index, columns in NEW_INDEXES.items():
+                if index not in indexes:
+                    db.session.execute(text(f"CREATE INDEX {index} ON unified_conversations ({columns})"))
+                    print(f"Created index: {index}")
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    migrate_database()
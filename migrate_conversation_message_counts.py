@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the denormalized message_count/last_message_at columns to existing
+unified_conversations tables and fill them from unified_messages.
+
+New databases get the columns from db.create_all(); run this once against existing databases.
+"""
+
+from sqlalchemy import inspect, text
+from app import app
+from models import db
+
+NEW_COLUMNS = {
+    'message_count': 'INTEGER DEFAULT 0',
+    'last_message_at': 'TIMESTAMP'
+}
+
+def migrate_database():
+    """Add the missing columns and backfill them with one grouped aggregate per column"""
+    with app.app_context():
+        columns = [column['name'] for column in inspect(db.engine).get_columns('unified_conversations')]
+        
+        try:
+            for column, definition in NEW_COLUMNS.items():
+                if column not in columns:
+                    db.session.execute(text(f"ALTER TABLE unified_conversations ADD COLUMN {column} {definition}"))
+                    print(f"Added column: unified_conversations.{column}")
+            
+            result = db.session.execute(text("""
+                UPDATE unified_conversations SET
+                    message_count = (SELECT COUNT(*) FROM unified_messages m
+                                     WHERE m.session_id = unified_conversations.session_id),
+                    last_message_at = (SELECT MAX(m.created_at) FROM unified_messages m
+                                       WHERE m.session_id = unified_conversations.session_id)
+            """))
+            db.session.commit()
+            print(f"Backfilled message counts for {result.rowcount} conversations")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    migrate_database()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Migration script to fill the conversation_tags table from the JSON tags column of existing
+unified_conversations rows.
+
+The table itself is created by db.create_all(); the script only adds rows that are missing, so it
+can be run again safely.
+"""
+
+from app import app
+from models import db, UnifiedConversation, ConversationTag
+
+BATCH_SIZE = 500
+
+def migrate_database():
+    """Create conversation_tags rows for every tag stored in unified_conversations.tags"""
+    with app.app_context():
+        db.create_all()
+        
+        try:
+            added = 0
+            last_id = 0
+            while True:
+                conversations = UnifiedConversation.query.filter(
+                    UnifiedConversation.id > last_id,
+                    UnifiedConversation.tags.isnot(None)
+                ).order_by(UnifiedConversation.id).limit(BATCH_SIZE).all()
+                if not conversations:
+                    break
+                
+                for conversation in conversations:
+                    existing = {row.tag for row in conversation.tag_rows}
+                    for tag in dict.fromkeys(conversation.get_tags()):
+                        if tag not in existing:
+                            db.session.add(ConversationTag(conversation_id=conversation.id, tag=tag))
+                            added += 1
+                last_id = conversations[-1].id
+                db.session.commit()
+            
+            print(f"Added {added} conversation tag rows")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    migrate_database()
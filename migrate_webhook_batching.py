@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the event batching columns to existing webhook_configs tables.
+
+New databases get the columns from db.create_all(); run this once against existing databases.
+"""
+
+from sqlalchemy import inspect, text
+from app import app
+from models import db
+
+NEW_COLUMNS = {
+    'batch_enabled': 'BOOLEAN DEFAULT FALSE',
+    'batch_window_seconds': 'INTEGER DEFAULT 5',
+    'batch_max_events': 'INTEGER DEFAULT 50'
+}
+
+def migrate_database():
+    """Add the webhook_configs batching columns that are missing"""
+    with app.app_context():
+        columns = [column['name'] for column in inspect(db.engine).get_columns('webhook_configs')]
+        
+        try:
+            for column, definition in NEW_COLUMNS.items():
+                if column not in columns:
+                    db.session.execute(text(f"ALTER TABLE webhook_configs ADD COLUMN {column} {definition}"))
+                    print(f"Added column: webhook_configs.{column}")
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    migrate_database()
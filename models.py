@@ -2,6 +2,7 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import os
 import json
+from conversation_events import conversation_events
 
 # Database configuration
 db = SQLAlchemy()
@@ -33,13 +34,26 @@ class UnifiedConversation(db.Model):
     extra_metadata = db.Column(db.Text, nullable=True)  # Additional JSON metadata
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_activity = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
     
+    # Denormalized from unified_messages so conversation lists don't count messages per row
+    message_count = db.Column(db.Integer, default=0)
+    last_message_at = db.Column(db.DateTime, nullable=True)
+    
     # Relationship with messages
     messages = db.relationship('UnifiedMessage', backref='conversation', lazy='dynamic', cascade='all, delete-orphan')
+    # Tags as rows, so tag filters run in SQL (the tags column keeps the list for display)
+    tag_rows = db.relationship('ConversationTag', backref='conversation', cascade='all, delete-orphan')
+    
+    # Conversation lists are paged newest first by (last_activity, id), optionally filtered by type or user
+    __table_args__ = (
+        db.Index('ix_unified_conversations_activity', 'last_activity', 'id'),
+        db.Index('ix_unified_conversations_type_activity', 'conversation_type', 'last_activity', 'id'),
+        db.Index('ix_unified_conversations_user_activity', 'user_identifier', 'last_activity', 'id'),
+    )
     
     def __repr__(self):
         return f'<UnifiedConversation {self.session_id} ({self.conversation_type})>'
@@ -54,6 +68,25 @@ class UnifiedConversation(db.Model):
     def set_tags(self, tag_list):
         """Set tags from list"""
         self.tags = json.dumps(tag_list)
+        
+        # Keep the conversation_tags rows in step
+        existing = {row.tag: row for row in self.tag_rows}
+        for tag in dict.fromkeys(tag_list):
+            if tag not in existing:
+                self.tag_rows.append(ConversationTag(tag=tag))
+        for tag, row in existing.items():
+            if tag not in tag_list:
+                self.tag_rows.remove(row)
+    
+    @classmethod
+    def has_tag(cls, tag):
+        """SQL condition for conversations carrying a tag (uses the conversation_tags index)"""
+        return cls.tag_rows.any(ConversationTag.tag == tag)
+    
+    @classmethod
+    def tagged(cls, tag):
+        """Query of conversations carrying a tag, most recently active first"""
+        return cls.query.filter(cls.has_tag(tag)).order_by(cls.last_activity.desc(), cls.id.desc())
     
     def get_metadata(self):
         """Return metadata as dict"""
@@ -66,9 +99,13 @@ class UnifiedConversation(db.Model):
         """Set metadata from dict"""
         self.extra_metadata = json.dumps(meta_dict)
     
-    def get_conversation_history(self):
-        """Return conversation history as list of messages for compatibility"""
-        messages = self.messages.order_by(UnifiedMessage.created_at.asc()).all()
+    def get_conversation_history(self, limit=None):
+        """Return conversation history as list of messages for compatibility (only the last `limit` if given)"""
+        if limit:
+            recent = self.messages.order_by(UnifiedMessage.created_at.desc(), UnifiedMessage.id.desc()).limit(limit).all()
+            messages = list(reversed(recent))
+        else:
+            messages = self.messages.order_by(UnifiedMessage.created_at.asc(), UnifiedMessage.id.asc()).all()
         return [
             {
                 'type': 'human' if msg.sender_type == 'user' else 'ai',
@@ -99,6 +136,22 @@ class UnifiedConversation(db.Model):
         # Update conversation timestamps
         self.last_activity = datetime.utcnow()
         self.updated_at = datetime.utcnow()
+        self.record_message(self.last_activity)
+        
+        # Agent views get the new message once it is committed
+        conversation_events.publish_after_commit({
+            'type': 'message',
+            'session_id': self.session_id,
+            'conversation_type': self.conversation_type,
+            'last_activity': self.last_activity.isoformat(),
+            'message': {
+                'sender_type': sender_type,
+                'sender_name': sender_name,
+                'content': content,
+                'response_type': response_type,
+                'created_at': self.last_activity.isoformat()
+            }
+        })
         
         # Check for live agent requests in user messages
         if sender_type == 'user' and self.detect_live_agent_request(content):
@@ -106,6 +159,30 @@ class UnifiedConversation(db.Model):
         
         return message
     
+    def publish_update(self):
+        """Notify agent views of a tag or status change once it is committed"""
+        conversation_events.publish_after_commit({
+            'type': 'conversation_updated',
+            'session_id': self.session_id,
+            'conversation_type': self.conversation_type,
+            'status': self.status,
+            'tags': self.get_tags()
+        })
+    
+    def record_message(self, created_at=None):
+        """Count a message added to this conversation in message_count and last_message_at"""
+        created_at = created_at or datetime.utcnow()
+        if self.id is None:
+            self.message_count = (self.message_count or 0) + 1
+        else:
+            # Incremented in SQL so messages added by concurrent requests are all counted
+            UnifiedConversation.query.filter_by(id=self.id).update(
+                {UnifiedConversation.message_count: UnifiedConversation.message_count + 1},
+                synchronize_session='evaluate'
+            )
+        if self.last_message_at is None or created_at > self.last_message_at:
+            self.last_message_at = created_at
+    
     def detect_live_agent_request(self, message_content):
         """Detect if user is requesting to talk with a live agent"""
         if not message_content:
@@ -132,12 +209,13 @@ class UnifiedConversation(db.Model):
         return False
     
     def add_live_agent_tag(self):
-        """Add Live Agent tag to conversation"""
+        """Add Live Agent tag to conversation (committed by the caller with the message that requested it)"""
         current_tags = self.get_tags()
         if 'Live Agent' not in current_tags:
             current_tags.append('Live Agent')
             self.set_tags(current_tags)
-            db.session.commit()
+            self.publish_update()
+            db.session.flush()
             print(f"🏷️ Added 'Live Agent' tag to session {self.session_id}")
     
     def set_live_chat_mode(self):
@@ -147,6 +225,7 @@ class UnifiedConversation(db.Model):
             current_tags.append('Live Chat')
             self.set_tags(current_tags)
             self.status = 'live_chat'  # Set special status
+            self.publish_update()
             db.session.commit()
             print(f"🔄 Enabled Live Chat mode for session {self.session_id}")
     
@@ -193,7 +272,12 @@ class UnifiedConversation(db.Model):
     
     def clear_conversation(self):
         """Clear all conversation messages"""
+        from analytics_rollups import analytics_rollups
+        # Message totals of the hours these messages were counted in must be recomputed
+        analytics_rollups.mark_rows_dirty(self.messages, UnifiedMessage.created_at)
         self.messages.delete()
+        self.message_count = 0
+        self.last_message_at = None
         self.last_activity = datetime.utcnow()
     
     def to_dict(self):
@@ -228,7 +312,8 @@ class UnifiedConversation(db.Model):
             'updated_at': convert_to_ist(self.updated_at),
             'last_activity': convert_to_ist(self.last_activity),
             'completed_at': convert_to_ist(self.completed_at),
-            'message_count': self.messages.count()
+            'last_message_at': convert_to_ist(self.last_message_at),
+            'message_count': self.message_count or 0
         }
 
 class UnifiedMessage(db.Model):
@@ -246,7 +331,7 @@ class UnifiedMessage(db.Model):
     response_type = db.Column(db.String(50), nullable=True)  # SMALL_TALK, RAG_KNOWLEDGE_BASE, AI_TOOL, TEMPLATE_MATCH
     message_metadata = db.Column(db.Text, nullable=True)  # JSON metadata (file info, etc.)
     is_read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     def __repr__(self):
         return f'<UnifiedMessage {self.message_id}>'
@@ -286,9 +371,69 @@ class UnifiedMessage(db.Model):
             'timestamp': created_at_ist.strftime('%H:%M:%S')
         }
 
+class ConversationTag(db.Model):
+    """One tag of a unified conversation (Live Agent, Live Chat...)"""
+    __tablename__ = 'conversation_tags'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('unified_conversations.id', ondelete='CASCADE'), nullable=False)
+    tag = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('conversation_id', 'tag', name='uq_conversation_tags_conversation_tag'),
+        # Finds the conversations with a tag without touching unified_conversations
+        db.Index('ix_conversation_tags_tag_conversation', 'tag', 'conversation_id'),
+    )
+    
+    def __repr__(self):
+        return f'<ConversationTag {self.tag} on {self.conversation_id}>'
+
 # Legacy alias for backward compatibility
 UserConversation = UnifiedConversation
 
+class AnalyticsRollup(db.Model):
+    """Pre-aggregated count of a metric per hour or day, read by the stats endpoints"""
+    __tablename__ = 'analytics_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)  # hour, day
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    metric = db.Column(db.String(50), nullable=False)  # conversations, messages, new_users, feedback, ...
+    dimension = db.Column(db.String(150), nullable=False, default='')  # e.g. conversation type
+    value = db.Column(db.Integer, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'bucket_start', 'metric', 'dimension', name='uq_analytics_rollups_bucket_metric'),
+    )
+    
+    def __repr__(self):
+        return f'<AnalyticsRollup {self.granularity} {self.bucket_start} {self.metric}:{self.dimension}={self.value}>'
+
+class SessionMemoryMessage(db.Model):
+    """Recent chat memory shared by all workers (ring buffer of the last N messages per memory key)"""
+    __tablename__ = 'session_memory_messages'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    memory_key = db.Column(db.String(300), nullable=False)  # session:<session_id> or user:<user_identifier>
+    message_type = db.Column(db.String(10), nullable=False)  # human, ai
+    content = db.Column(db.Text, nullable=False)
+    response_type = db.Column(db.String(50), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_session_memory_key_id', 'memory_key', 'id'),
+    )
+    
+    def to_dict(self):
+        """Convert to the dictionary format used by the session memory backends"""
+        return {
+            'type': self.message_type,
+            'content': self.content,
+            'response_type': self.response_type
+        }
+
 class ChatSettings(db.Model):
     """Model for storing chat widget configuration settings"""
     __tablename__ = 'chat_settings'
@@ -303,25 +448,30 @@ class ChatSettings(db.Model):
     
     @staticmethod
     def get_setting(name, default_value=None):
-        """Get a setting value by name"""
-        setting = ChatSettings.query.filter_by(setting_name=name).first()
+        """Get a setting value by name (served from the in-process config cache)"""
+        from config_cache import config_cache
+        setting = config_cache.get_settings().get(name)
         if not setting:
             return default_value
-            
-        if setting.setting_type == 'boolean':
-            return setting.setting_value.lower() in ('true', '1', 'yes')
-        elif setting.setting_type == 'integer':
+        return ChatSettings.parse_value(setting['value'], setting['type'], default_value)
+    
+    @staticmethod
+    def parse_value(setting_value, setting_type, default_value=None):
+        """Convert a stored setting string to its type (default_value if it can't be parsed)"""
+        if setting_type == 'boolean':
+            return setting_value.lower() in ('true', '1', 'yes')
+        elif setting_type == 'integer':
             try:
-                return int(setting.setting_value)
+                return int(setting_value)
             except ValueError:
                 return default_value
-        elif setting.setting_type == 'json':
+        elif setting_type == 'json':
             try:
-                return json.loads(setting.setting_value)
+                return json.loads(setting_value)
             except json.JSONDecodeError:
                 return default_value
         else:
-            return setting.setting_value
+            return setting_value
     
     @staticmethod
     def set_setting(name, value, setting_type='string', description=None):
@@ -351,6 +501,8 @@ class ChatSettings(db.Model):
             )
             db.session.add(setting)
         
+        from config_cache import config_cache
+        config_cache.bump('chat_settings')
         db.session.commit()
         return setting
 
@@ -370,10 +522,11 @@ class SystemPrompt(db.Model):
     
     @classmethod
     def get_active_prompt(cls):
-        """Get the currently active system prompt text"""
-        active_prompt = cls.query.filter_by(is_active=True).first()
-        if active_prompt:
-            return active_prompt.prompt_text
+        """Get the currently active system prompt text (served from the in-process config cache)"""
+        from config_cache import config_cache
+        active_prompt_text = config_cache.get_active_prompt_text()
+        if active_prompt_text:
+            return active_prompt_text
         
         # Return default comprehensive system prompt if none is active
         return """You are a helpful, knowledgeable AI assistant designed to provide excellent customer support and assistance. You have access to both a knowledge base and API tools to help users.
@@ -420,6 +573,8 @@ Remember: Your goal is to provide the best possible user experience by being hel
         selected_prompt = cls.query.get(prompt_id)
         if selected_prompt:
             selected_prompt.is_active = True
+            from config_cache import config_cache
+            config_cache.bump('system_prompts')
             db.session.commit()
     
     def to_dict(self):
@@ -434,6 +589,17 @@ Remember: Your goal is to provide the best possible user experience by being hel
         }
 
 
+class ConfigVersion(db.Model):
+    """Change counter of a cached configuration group (chat_settings, system_prompts) shared by all workers"""
+    __tablename__ = 'config_versions'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ConfigVersion {self.name} v{self.version}>'
+
 class RagFeedback(db.Model):
     """Model for storing user feedback on RAG responses for training purposes"""
     __tablename__ = 'rag_feedback'
@@ -459,7 +625,7 @@ class RagFeedback(db.Model):
     
     # Timestamps
     question_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    feedback_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    feedback_timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Training Status
     used_for_training = db.Column(db.Boolean, default=False)
@@ -612,6 +778,7 @@ class ApiTool(db.Model):
     response_mapping = db.Column(db.Text, nullable=True)  # JSON mapping for response fields
     response_template = db.Column(db.Text, nullable=True)  # Template for AI response formatting
     priority = db.Column(db.Integer, default=0)  # Higher priority = preferred tool
+    cache_ttl_seconds = db.Column(db.Integer, default=0)  # Reuse responses for this long (0 = no caching)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -652,6 +819,7 @@ class ApiTool(db.Model):
             'response_mapping': self.response_mapping,
             'response_template': self.response_template,
             'priority': self.priority,
+            'cache_ttl_seconds': self.cache_ttl_seconds or 0,
             'active': self.active,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
@@ -732,6 +900,9 @@ class WebhookConfig(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     retry_count = db.Column(db.Integer, default=3)  # Number of retry attempts
     timeout_seconds = db.Column(db.Integer, default=30)  # Request timeout
+    batch_enabled = db.Column(db.Boolean, default=False)  # Coalesce events into one payload per window
+    batch_window_seconds = db.Column(db.Integer, default=5)  # Longest an event waits for its batch
+    batch_max_events = db.Column(db.Integer, default=50)  # Send as soon as this many events are waiting
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_used = db.Column(db.DateTime, nullable=True)
@@ -789,12 +960,58 @@ class WebhookConfig(db.Model):
             'is_active': self.is_active,
             'retry_count': self.retry_count,
             'timeout_seconds': self.timeout_seconds,
+            'batch_enabled': bool(self.batch_enabled),
+            'batch_window_seconds': self.batch_window_seconds,
+            'batch_max_events': self.batch_max_events,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'last_used': self.last_used.isoformat() if self.last_used else None
         }
 
 
+class WebhookDelivery(db.Model):
+    """Outbox of webhook notifications, delivered by background workers with retries"""
+    __tablename__ = 'webhook_deliveries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    webhook_config_id = db.Column(db.Integer, db.ForeignKey('webhook_configs.id', ondelete='CASCADE'), nullable=False)
+    event_type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON payload in the provider's format
+    status = db.Column(db.String(20), default='pending')  # pending, sending, delivered, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)  # When a worker claimed the delivery
+    last_status_code = db.Column(db.Integer, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    delivered_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_webhook_deliveries_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    def get_payload(self):
+        """Return payload as dict"""
+        try:
+            return json.loads(self.payload) if self.payload else {}
+        except json.JSONDecodeError:
+            return {}
+    
+    def to_dict(self):
+        """Convert to dictionary for JSON serialization"""
+        return {
+            'id': self.id,
+            'webhook_config_id': self.webhook_config_id,
+            'event_type': self.event_type,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_status_code': self.last_status_code,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat(),
+            'delivered_at': self.delivered_at.isoformat() if self.delivered_at else None
+        }
+
 class WebhookMessage(db.Model):
     """Messages sent/received through webhook integrations"""
     __tablename__ = 'webhook_messages'
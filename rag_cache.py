@@ -0,0 +1,408 @@
+"""
+Process-wide caches for the RAG pipeline.
+Keeps the FAISS index and chunk metadata resident in each worker and reloads
+them only when the files on disk change, caches query embeddings so
+repeated questions skip the embeddings API, and caches answers to
+near-duplicate questions so they skip the chat model.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+
+INDEX_FILENAME = 'index.faiss'
+METADATA_FILENAME = 'metadata.json'
+
+
+class FaissIndexCache:
+    """Resident FAISS index + metadata cache with file-change invalidation"""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # index_folder -> (file signature, index, metadata)
+        self._entries: Dict[str, Tuple[tuple, Any, Dict[str, Any]]] = {}
+        self.loads = 0
+        self.hits = 0
+
+    def _file_signature(self, index_folder: str) -> Optional[tuple]:
+        """Return (mtime_ns, size) of both index files, or None if either is missing"""
+        try:
+            index_stat = os.stat(os.path.join(index_folder, INDEX_FILENAME))
+            metadata_stat = os.stat(os.path.join(index_folder, METADATA_FILENAME))
+        except OSError:
+            return None
+        return (
+            index_stat.st_mtime_ns, index_stat.st_size,
+            metadata_stat.st_mtime_ns, metadata_stat.st_size
+        )
+
+    def _load_from_disk(self, index_folder: str) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        """Read the FAISS index and metadata from disk"""
+        try:
+            index = faiss.read_index(os.path.join(index_folder, INDEX_FILENAME))
+            with open(os.path.join(index_folder, METADATA_FILENAME), 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            return index, metadata
+        except Exception as e:
+            self.logger.error(f"Error loading index and metadata: {str(e)}")
+            return None, None
+
+    def get(self, index_folder: str) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        """
+        Get the index and metadata for a folder, reloading if the files changed
+
+        Returns:
+            (index, metadata) or (None, None) if no index exists
+        """
+        signature = self._file_signature(index_folder)
+        if signature is None:
+            self._entries.pop(index_folder, None)
+            return None, None
+
+        entry = self._entries.get(index_folder)
+        if entry and entry[0] == signature:
+            self.hits += 1
+            return entry[1], entry[2]
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            entry = self._entries.get(index_folder)
+            if entry and entry[0] == signature:
+                self.hits += 1
+                return entry[1], entry[2]
+
+            index, metadata = self._load_from_disk(index_folder)
+            if index is None or metadata is None:
+                return None, None
+
+            # Swap in the new entry as a single assignment so readers never see a mixed state
+            self._entries[index_folder] = (signature, index, metadata)
+            self.loads += 1
+            self.logger.info(f"📦 Loaded FAISS index from {index_folder} ({index.ntotal} vectors)")
+            return index, metadata
+
+    def get_generation(self, index_folder: str) -> Optional[str]:
+        """Return an identifier for the index version on disk (same across workers)"""
+        signature = self._file_signature(index_folder)
+        if signature is None:
+            return None
+        return '-'.join(str(part) for part in signature)
+
+    def invalidate(self, index_folder: str = None) -> None:
+        """Drop cached entries so the next lookup reloads from disk"""
+        with self._lock:
+            if index_folder is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(index_folder, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache statistics"""
+        return {
+            'cached_indexes': len(self._entries),
+            'loads': self.loads,
+            'hits': self.hits
+        }
+
+
+class EmbeddingCache:
+    """
+    LRU + TTL cache for query embeddings keyed by normalized text and model.
+    Optionally backed by a SQLite file so all workers on a host share entries.
+    """
+
+    def __init__(self, max_entries: int = 5000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: int = 86400, db_path: str = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # (model, normalized text) -> (created_at, float32 vector)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, np.ndarray]]" = OrderedDict()
+        self._bytes = 0
+        self._db = None
+        self._db_pid = None
+        self._writes_since_prune = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize question text so trivial variations share an entry"""
+        return ' '.join(text.lower().split())
+
+    def _shared_store(self) -> Optional[sqlite3.Connection]:
+        """Open the SQLite store shared between workers, once per process (lock held)"""
+        if not self.db_path:
+            return None
+        # Connections must not be shared across a fork, so reopen in each worker
+        if self._db is not None and self._db_pid == os.getpid():
+            return self._db
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS embedding_cache ('
+                'cache_key TEXT PRIMARY KEY, model TEXT NOT NULL, '
+                'embedding BLOB NOT NULL, created_at REAL NOT NULL)'
+            )
+            self._db.commit()
+            self._db_pid = os.getpid()
+        except Exception as e:
+            self.logger.error(f"Error opening shared embedding cache {self.db_path}: {e}")
+            self._db = None
+        return self._db
+
+    def _shared_key(self, key: Tuple[str, str]) -> str:
+        return hashlib.sha256(f"{key[0]}\n{key[1]}".encode('utf-8')).hexdigest()
+
+    def _store_local(self, key: Tuple[str, str], created_at: float, vector: np.ndarray) -> None:
+        """Insert into the in-process LRU and evict until within bounds (lock held)"""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[1].nbytes
+        self._entries[key] = (created_at, vector)
+        self._bytes += vector.nbytes
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        """Return a cached embedding or None"""
+        key = (model, self.normalize(text))
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1].tolist()
+                self._entries.pop(key)
+                self._bytes -= entry[1].nbytes
+
+            shared_db = self._shared_store()
+            if shared_db is not None:
+                try:
+                    row = shared_db.execute(
+                        'SELECT embedding, created_at FROM embedding_cache WHERE cache_key = ?',
+                        (self._shared_key(key),)
+                    ).fetchone()
+                except Exception as e:
+                    self.logger.error(f"Error reading shared embedding cache: {e}")
+                    row = None
+                if row and now - row[1] <= self.ttl_seconds:
+                    vector = np.frombuffer(row[0], dtype='float32').copy()
+                    self._store_local(key, row[1], vector)
+                    self.shared_hits += 1
+                    return vector.tolist()
+
+            self.misses += 1
+            return None
+
+    def set(self, text: str, model: str, embedding: List[float]) -> None:
+        """Store an embedding"""
+        key = (model, self.normalize(text))
+        vector = np.asarray(embedding, dtype='float32')
+        now = time.time()
+
+        with self._lock:
+            self._store_local(key, now, vector)
+
+            shared_db = self._shared_store()
+            if shared_db is not None:
+                try:
+                    shared_db.execute(
+                        'INSERT OR REPLACE INTO embedding_cache (cache_key, model, embedding, created_at) '
+                        'VALUES (?, ?, ?, ?)',
+                        (self._shared_key(key), model, vector.tobytes(), now)
+                    )
+                    self._writes_since_prune += 1
+                    if self._writes_since_prune >= 500:
+                        self._prune_shared_store(shared_db, now)
+                    shared_db.commit()
+                except Exception as e:
+                    self.logger.error(f"Error writing shared embedding cache: {e}")
+
+    def _prune_shared_store(self, shared_db: sqlite3.Connection, now: float) -> None:
+        """Drop expired rows and keep the shared store within max_entries (lock held)"""
+        self._writes_since_prune = 0
+        shared_db.execute('DELETE FROM embedding_cache WHERE created_at < ?', (now - self.ttl_seconds,))
+        shared_db.execute(
+            'DELETE FROM embedding_cache WHERE cache_key IN ('
+            'SELECT cache_key FROM embedding_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+    def clear(self) -> None:
+        """Remove all cached embeddings"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            shared_db = self._shared_store()
+            if shared_db is not None:
+                try:
+                    shared_db.execute('DELETE FROM embedding_cache')
+                    shared_db.commit()
+                except Exception as e:
+                    self.logger.error(f"Error clearing shared embedding cache: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache statistics"""
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'shared_store': self.db_path
+        }
+
+
+class SemanticAnswerCache:
+    """
+    Cache of previously generated RAG answers looked up by question similarity.
+    Entries belong to a scope (index generation + active system prompt); when the
+    scope changes every entry is dropped. Callers only use it for questions asked without prior
+    conversation history, whose answer is the same for every user.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_distance: float = 0.03):
+        self.logger = logging.getLogger(__name__)
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._scope = None
+        self._vectors: Optional[np.ndarray] = None  # (max_entries, dim) unit vectors
+        self._questions: List[Optional[str]] = []
+        self._answers: List[Optional[str]] = []
+        self._last_used = np.zeros(max_entries, dtype='float64')
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype='float32')
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
+
+    def _reset(self, scope: Optional[str]) -> None:
+        """Drop all entries and adopt a new scope (lock held)"""
+        self._scope = scope
+        self._vectors = None
+        self._questions = [None] * self.max_entries
+        self._answers = [None] * self.max_entries
+        self._last_used[:] = 0
+        self._size = 0
+
+    def lookup(self, embedding: List[float], scope: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a cached answer for a question embedding within the same scope
+
+        Returns:
+            dict with 'answer', 'question' and 'distance', or None
+        """
+        vector = self._unit(embedding)
+        with self._lock:
+            if scope != self._scope:
+                self._reset(scope)
+            if vector is None or self._size == 0 or len(vector) != self._vectors.shape[1]:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors[:self._size] @ vector
+            best = int(np.argmax(similarities))
+            distance = 1.0 - float(similarities[best])
+            if distance > self.max_distance:
+                self.misses += 1
+                return None
+
+            self._last_used[best] = time.time()
+            self.hits += 1
+            return {
+                'answer': self._answers[best],
+                'question': self._questions[best],
+                'distance': distance
+            }
+
+    def add(self, question: str, embedding: List[float], scope: str, answer: str) -> None:
+        """Store an answer, evicting the least recently used entry when full"""
+        vector = self._unit(embedding)
+        if vector is None or self.max_entries <= 0:
+            return
+        with self._lock:
+            if scope != self._scope:
+                self._reset(scope)
+            if self._vectors is None or len(vector) != self._vectors.shape[1]:
+                self._reset(scope)
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype='float32')
+
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+
+            self._vectors[slot] = vector
+            self._questions[slot] = question
+            self._answers[slot] = answer
+            self._last_used[slot] = time.time()
+
+    def clear(self) -> None:
+        """Remove all cached answers"""
+        with self._lock:
+            self._reset(None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache statistics"""
+        return {
+            'entries': self._size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'max_distance': self.max_distance
+        }
+
+
+# Global FAISS index cache instance
+faiss_index_cache = FaissIndexCache()
+
+# Global query embedding cache instance
+embedding_cache = EmbeddingCache(
+    max_entries=int(os.environ.get('EMBEDDING_CACHE_MAX_ENTRIES', 5000)),
+    max_bytes=int(os.environ.get('EMBEDDING_CACHE_MAX_MB', 64)) * 1024 * 1024,
+    ttl_seconds=int(os.environ.get('EMBEDDING_CACHE_TTL_SECONDS', 86400)),
+    db_path=os.environ.get('EMBEDDING_CACHE_DB_PATH') or None
+)
+
+# Global semantic answer cache instance (disabled when SEMANTIC_CACHE_ENABLED=false)
+semantic_answer_cache = SemanticAnswerCache(
+    max_entries=int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES', 1000)),
+    max_distance=float(os.environ.get('SEMANTIC_CACHE_MAX_DISTANCE', 0.03))
+) if os.environ.get('SEMANTIC_CACHE_ENABLED', 'true').lower() in ('true', '1', 'yes') else None
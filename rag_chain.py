@@ -4,7 +4,9 @@ import json
 import faiss
 import numpy as np
 import random
-from typing import List, Dict, Any
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Any, Iterator
 from openai import OpenAI
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
@@ -12,6 +14,9 @@ from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from session_memory import session_manager
 from ai_tool_executor import AIToolExecutor
 from models import SystemPrompt
+from rag_cache import faiss_index_cache, embedding_cache, semantic_answer_cache
+from template_matcher import template_matcher
+from template_usage import template_usage_counter
 
 class RAGChain:
     def __init__(self):
@@ -25,6 +30,13 @@ class RAGChain:
         self.chat_model = "gpt-4o"
         self.top_k = 3
         
+        # Speculative knowledge base retrieval that runs while AI tool selection is in progress
+        self.parallel_retrieval = os.environ.get('RAG_PARALLEL_RETRIEVAL', 'true').lower() == 'true'
+        self.retrieval_executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get('RAG_PARALLEL_WORKERS', 4)),
+            thread_name_prefix='rag-retrieval'
+        ) if self.parallel_retrieval else None
+        
         # Initialize AI tool executor
         self.ai_tool_executor = AIToolExecutor()
         
@@ -136,36 +148,29 @@ class RAGChain:
         return ""
     
     def get_embedding(self, text: str) -> List[float]:
-        """Get embedding for a single text"""
+        """Get embedding for a single text (cached by normalized text and model)"""
+        cached_embedding = embedding_cache.get(text, self.embedding_model)
+        if cached_embedding is not None:
+            return cached_embedding
+        
         try:
             response = self.openai_client.embeddings.create(
                 model=self.embedding_model,
                 input=[text]
             )
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
+            embedding_cache.set(text, self.embedding_model, embedding)
+            return embedding
         except Exception as e:
             logging.error(f"Error getting embedding: {str(e)}")
             raise
     
     def load_index_and_metadata(self, index_folder: str) -> tuple:
-        """Load FAISS index and metadata"""
-        index_path = os.path.join(index_folder, 'index.faiss')
-        metadata_path = os.path.join(index_folder, 'metadata.json')
-        
-        if not os.path.exists(index_path) or not os.path.exists(metadata_path):
-            return None, None
-        
-        try:
-            index = faiss.read_index(index_path)
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-            return index, metadata
-        except Exception as e:
-            logging.error(f"Error loading index and metadata: {str(e)}")
-            return None, None
+        """Load FAISS index and metadata (served from the process-wide cache)"""
+        return faiss_index_cache.get(index_folder)
     
-    def retrieve_relevant_chunks(self, question: str, index_folder: str) -> List[Dict[str, Any]]:
-        """Retrieve relevant chunks for a question"""
+    def retrieve_relevant_chunks(self, question: str, index_folder: str, question_embedding: List[float] = None) -> List[Dict[str, Any]]:
+        """Retrieve relevant chunks for a question (embedding it unless question_embedding is given)"""
         index, metadata = self.load_index_and_metadata(index_folder)
         
         if index is None or metadata is None:
@@ -173,7 +178,8 @@ class RAGChain:
         
         try:
             # Get question embedding
-            question_embedding = self.get_embedding(question)
+            if question_embedding is None:
+                question_embedding = self.get_embedding(question)
             question_array = np.array([question_embedding], dtype='float32')
             
             # Search in FAISS index
@@ -241,11 +247,16 @@ class RAGChain:
             else:
                 return "I'm sorry, I encountered an error while processing your question. Please try again."
     
-    def generate_answer_with_memory(self, question: str, relevant_chunks: List[Dict[str, Any]], session_id: str = None, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None) -> str:
-        """Generate answer using LangChain with session memory (persistent or temporary)"""
-        if not relevant_chunks:
-            return "I couldn't find any relevant information. Please try a different question."
-        
+    def get_semantic_cache_scope(self, index_folder: str) -> str:
+        """Scope for cached answers: the index version on disk plus the active system prompt"""
+        index_generation = faiss_index_cache.get_generation(index_folder)
+        if index_generation is None:
+            return None
+        prompt_hash = hashlib.sha256(SystemPrompt.get_active_prompt().encode('utf-8')).hexdigest()[:16]
+        return f"{index_generation}:{prompt_hash}"
+    
+    def _build_memory_messages(self, question: str, relevant_chunks: List[Dict[str, Any]], session_id: str = None, user_identifier: str = None) -> list:
+        """Build the LangChain messages (system prompt, knowledge base context, recent history) for a RAG answer"""
         # Create context from relevant chunks
         context = "\n\n".join([
             f"From {chunk['source']}:\n{chunk['text']}"
@@ -257,49 +268,98 @@ class RAGChain:
         if user_identifier or session_id:
             conversation_history = session_manager.get_memory_context(session_id, user_identifier)
         
-        try:
-            # Get the active system prompt from database
-            system_prompt_text = SystemPrompt.get_active_prompt()
+        # Get the active system prompt from database
+        system_prompt_text = SystemPrompt.get_active_prompt()
+        
+        # Create messages for LangChain with the dynamic system prompt
+        return [
+            SystemMessage(content=f"""{system_prompt_text}
             
-            # Create messages for LangChain with the dynamic system prompt
-            messages = [
-                SystemMessage(content=f"""{system_prompt_text}
-                
-                Context from knowledge base:
-                {context}
-                
-                Previous conversation:
-                {conversation_history}"""),
-                HumanMessage(content=question)
-            ]
+            Context from knowledge base:
+            {context}
+            
+            Previous conversation:
+            {conversation_history}"""),
+            HumanMessage(content=question)
+        ]
+    
+    def _remember_rag_answer(self, question: str, answer: str, session_id: str = None, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None, semantic_cache_entry: tuple = None) -> None:
+        """Store a generated RAG answer in the semantic cache and session memory"""
+        # Remember the answer for near-duplicate questions (embedding, scope)
+        if semantic_answer_cache and semantic_cache_entry:
+            question_embedding, cache_scope = semantic_cache_entry
+            semantic_answer_cache.add(question, question_embedding, cache_scope, answer)
+        
+        # Add to session memory (user-based or session-based)
+        if user_identifier or session_id:
+            session_manager.add_exchange(session_id, question, answer, user_identifier, username, email, device_id, 'RAG_KNOWLEDGE_BASE')
+    
+    def _llm_error_message(self, e: Exception) -> str:
+        """Map an OpenAI/LangChain error to a helpful user-friendly message"""
+        error_msg = str(e).lower()
+        if "quota" in error_msg or "rate limit" in error_msg:
+            return "I'm currently experiencing high demand. Please try asking your question again in a moment, or contact support if this continues."
+        elif "api key" in error_msg or "authentication" in error_msg:
+            return "There's an issue with my configuration. Please contact support for assistance."
+        elif "model" in error_msg:
+            return "I'm having trouble accessing my language model. Please try again shortly."
+        else:
+            return "I'm sorry, I encountered an error while processing your question. Please try again."
+    
+    def generate_answer_with_memory(self, question: str, relevant_chunks: List[Dict[str, Any]], session_id: str = None, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None, semantic_cache_entry: tuple = None) -> str:
+        """Generate answer using LangChain with session memory (persistent or temporary)"""
+        if not relevant_chunks:
+            return "I couldn't find any relevant information. Please try a different question."
+        
+        try:
+            messages = self._build_memory_messages(question, relevant_chunks, session_id, user_identifier)
             
             # Generate response using LangChain
             response = self.langchain_llm.invoke(messages)
             answer = response.content.strip()
             
-            # Add to session memory (user-based or session-based)
-            if user_identifier or session_id:
-                session_manager.add_user_message(session_id, question, user_identifier, username, email, device_id)
-                session_manager.add_ai_message(session_id, answer, user_identifier, username, email, device_id, 'RAG_KNOWLEDGE_BASE')
+            self._remember_rag_answer(question, answer, session_id, user_identifier, username, email, device_id, semantic_cache_entry)
             
             return answer
             
         except Exception as e:
-            error_msg = str(e).lower()
             logging.error(f"Error generating answer with memory: {str(e)}")
+            return self._llm_error_message(e)
+    
+    def generate_answer_with_memory_stream(self, question: str, relevant_chunks: List[Dict[str, Any]], session_id: str = None, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None, semantic_cache_entry: tuple = None) -> Iterator[str]:
+        """Streaming variant of generate_answer_with_memory: yields answer tokens as the LLM produces them.
+        
+        Session memory and the semantic cache are updated once the full answer has been generated.
+        """
+        if not relevant_chunks:
+            yield "I couldn't find any relevant information. Please try a different question."
+            return
+        
+        parts = []
+        try:
+            messages = self._build_memory_messages(question, relevant_chunks, session_id, user_identifier)
             
-            # Handle specific OpenAI API errors with helpful user-friendly messages
-            if "quota" in error_msg or "rate limit" in error_msg:
-                return "I'm currently experiencing high demand. Please try asking your question again in a moment, or contact support if this continues."
-            elif "api key" in error_msg or "authentication" in error_msg:
-                return "There's an issue with my configuration. Please contact support for assistance."
-            elif "model" in error_msg:
-                return "I'm having trouble accessing my language model. Please try again shortly."
-            else:
-                return "I'm sorry, I encountered an error while processing your question. Please try again."
+            for chunk in self.langchain_llm.stream(messages):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+        except Exception as e:
+            logging.error(f"Error streaming answer with memory: {str(e)}")
+            # Only replace the answer if nothing has been sent yet; a partial answer is not stored
+            if not parts:
+                yield self._llm_error_message(e)
+            return
+        
+        answer = "".join(parts).strip()
+        self._remember_rag_answer(question, answer, session_id, user_identifier, username, email, device_id, semantic_cache_entry)
     
-    def get_answer(self, question: str, index_folder: str, session_id: str = None, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None) -> str:
-        """Get answer for a question with optional session memory (persistent or temporary)"""
+    def _get_answer_before_rag(self, question: str, index_folder: str, session_id: str = None, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None, answer_info: Dict[str, Any] = None) -> tuple:
+        """Run the answer steps that do not need LLM generation over the knowledge base.
+        
+        Returns (answer, semantic_cache_entry, retrieval); answer is None when the question must go to
+        RAG generation, retrieval is the speculative knowledge base retrieval (a Future) or None.
+        answer_info, if given, receives details of a tool answer (see get_answer).
+        """
         logging.info(f"🚀 PROCESSING QUESTION: '{question}'")
         logging.info(f"📋 USER: {user_identifier or 'anonymous'} | SESSION: {session_id}")
         
@@ -310,9 +370,8 @@ class RAGChain:
             logging.info(f"📝 Template Response: {template_response[:100]}...")
             # Add to session memory
             if user_identifier or session_id:
-                session_manager.add_user_message(session_id, question, user_identifier, username, email, device_id)
-                session_manager.add_ai_message(session_id, template_response, user_identifier, username, email, device_id, 'TEMPLATE_MATCH')
-            return template_response
+                session_manager.add_exchange(session_id, question, template_response, user_identifier, username, email, device_id, 'TEMPLATE_MATCH')
+            return template_response, None, None
         
         # **STEP 2: Check for small talk (Basic Pattern Matching)**
         if self.is_small_talk(question):
@@ -321,40 +380,99 @@ class RAGChain:
             logging.info(f"💬 Small Talk Response: {response}")
             # Add to session memory (user-based or session-based)
             if user_identifier or session_id:
-                session_manager.add_user_message(session_id, question, user_identifier, username, email, device_id)
-                session_manager.add_ai_message(session_id, response, user_identifier, username, email, device_id, 'SMALL_TALK')
-            return response
+                session_manager.add_exchange(session_id, question, response, user_identifier, username, email, device_id, 'SMALL_TALK')
+            return response, None, None
         
         # Get conversation history for AI tool selection
         conversation_history = []
         if user_identifier or session_id:
             history = session_manager.get_session_history(session_id, user_identifier)
             conversation_history = [
-                {"role": "user" if isinstance(msg, HumanMessage) else "assistant", "content": msg.content}
+                {"role": "user" if isinstance(msg, HumanMessage) else "assistant", "content": msg.content,
+                 "response_type": msg.additional_kwargs.get('response_type')}
                 for msg in history[-10:]  # Last 10 messages
             ]
         
+        # Embed the question once for the tool router, retrieval and the semantic cache (embedding it
+        # separately in each of them would miss the cache concurrently and pay for several API calls)
+        question_embedding = None
+        try:
+            question_embedding = self.get_embedding(question)
+        except Exception as e:
+            logging.error(f"❌ Question embedding error: {str(e)}")
+        
+        # Start FAISS retrieval now so RAG-bound questions don't wait for tool selection first
+        retrieval = None
+        if self.retrieval_executor is not None:
+            retrieval = self.retrieval_executor.submit(self.retrieve_relevant_chunks, question, index_folder, question_embedding)
+        
         # **STEP 3: AI Tool Selection (OpenAI Function Calling - Semantic Analysis)**
         logging.info(f"🔍 STEP 3: AI Tool Selection - Analyzing question semantically")
         try:
-            used_tool, tool_response = self.ai_tool_executor.process_question_with_tools(question, conversation_history)
+            # Cached tool responses are only shared within the same user (or session)
+            tool_cache_scope = f"user:{user_identifier}" if user_identifier else (f"session:{session_id}" if session_id else None)
+            tool_info = {}
+            used_tool, tool_response = self.ai_tool_executor.process_question_with_tools(question, conversation_history, tool_cache_scope, tool_info, question_embedding)
             
             if used_tool:
                 logging.info(f"✅ RESPONSE TYPE: AI_TOOL - Tool '{used_tool}' executed successfully")
                 logging.info(f"🛠️ AI Tool Response: {tool_response[:100]}...")
                 # Add to session memory (user-based or session-based)
                 if user_identifier or session_id:
-                    session_manager.add_user_message(session_id, question, user_identifier, username, email, device_id)
-                    session_manager.add_ai_message(session_id, tool_response, user_identifier, username, email, device_id, 'AI_TOOL')
+                    session_manager.add_exchange(session_id, question, tool_response, user_identifier, username, email, device_id, 'AI_TOOL')
                 
-                return tool_response
+                if answer_info is not None and tool_info:
+                    answer_info['tool'] = tool_info
+                
+                # The tool answered: discard the speculative retrieval
+                if retrieval is not None:
+                    retrieval.cancel()
+                return tool_response, None, None
         except Exception as e:
             logging.error(f"❌ AI Tool Error: {str(e)}")
             # Continue to RAG fallback
         
         # **STEP 4: RAG Knowledge Base (Vector Similarity Search + LLM)**
         logging.info(f"🧠 STEP 4: RAG Knowledge Base - Searching vector database")
-        relevant_chunks = self.retrieve_relevant_chunks(question, index_folder)
+        
+        # Reuse the answer of a near-duplicate question answered against the same index and prompt.
+        # Only opening questions take part: with prior history the answer also depends on this
+        # user's conversation, so it must not be served to (or cached from) anyone else.
+        semantic_cache_entry = None
+        if semantic_answer_cache and not conversation_history:
+            try:
+                cache_scope = self.get_semantic_cache_scope(index_folder)
+                if cache_scope:
+                    if question_embedding is None:
+                        question_embedding = self.get_embedding(question)
+                    semantic_cache_entry = (question_embedding, cache_scope)
+                    cached = semantic_answer_cache.lookup(question_embedding, cache_scope)
+                    if cached:
+                        answer = cached['answer']
+                        logging.info(f"✅ RESPONSE TYPE: RAG_KNOWLEDGE_BASE - Semantic cache hit (distance: {cached['distance']:.4f}, cached question: '{cached['question']}')")
+                        if user_identifier or session_id:
+                            session_manager.add_exchange(session_id, question, answer, user_identifier, username, email, device_id, 'RAG_KNOWLEDGE_BASE')
+                        if retrieval is not None:
+                            retrieval.cancel()
+                        return answer, None, None
+            except Exception as e:
+                logging.error(f"❌ Semantic cache error: {str(e)}")
+        
+        return None, semantic_cache_entry, retrieval
+    
+    def _retrieve_for_answer(self, question: str, index_folder: str, retrieval: Future = None) -> List[Dict[str, Any]]:
+        """Retrieve knowledge base chunks for RAG generation and log what was found
+        
+        Uses the result of the speculative retrieval started before tool selection when there is one.
+        """
+        relevant_chunks = None
+        if retrieval is not None:
+            try:
+                relevant_chunks = retrieval.result()
+            except Exception as e:
+                logging.error(f"❌ Speculative retrieval error: {str(e)}")
+        if relevant_chunks is None:
+            relevant_chunks = self.retrieve_relevant_chunks(question, index_folder)
         
         if relevant_chunks:
             logging.info(f"📚 Found {len(relevant_chunks)} relevant chunks from knowledge base")
@@ -363,73 +481,61 @@ class RAGChain:
         else:
             logging.info(f"❌ No relevant chunks found in knowledge base")
         
+        return relevant_chunks
+    
+    def get_answer(self, question: str, index_folder: str, session_id: str = None, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None, answer_info: Dict[str, Any] = None) -> str:
+        """Get answer for a question with optional session memory (persistent or temporary)
+        
+        answer_info, if given, receives {'tool': {'tool_name', 'cached', 'cache_age_seconds'}} when an
+        AI tool produced the answer, so callers can report cached tool responses.
+        """
+        answer, semantic_cache_entry, retrieval = self._get_answer_before_rag(question, index_folder, session_id, user_identifier, username, email, device_id, answer_info)
+        if answer is not None:
+            return answer
+        
+        relevant_chunks = self._retrieve_for_answer(question, index_folder, retrieval)
+        
         # Generate answer with memory
-        answer = self.generate_answer_with_memory(question, relevant_chunks, session_id, user_identifier, username, email, device_id)
+        answer = self.generate_answer_with_memory(question, relevant_chunks, session_id, user_identifier, username, email, device_id, semantic_cache_entry)
         
         logging.info(f"✅ RESPONSE TYPE: RAG_KNOWLEDGE_BASE - Generated from documents + LLM")
         logging.info(f"📖 RAG Response: {answer[:100]}...")
         
         return answer
     
+    def get_answer_stream(self, question: str, index_folder: str, session_id: str = None, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None, answer_info: Dict[str, Any] = None) -> Iterator[str]:
+        """Streaming variant of get_answer.
+        
+        Template, small talk, tool and cached answers are yielded as a single chunk as soon as they
+        are known; RAG answers are yielded token by token while the LLM generates them.
+        """
+        answer, semantic_cache_entry, retrieval = self._get_answer_before_rag(question, index_folder, session_id, user_identifier, username, email, device_id, answer_info)
+        if answer is not None:
+            yield answer
+            return
+        
+        relevant_chunks = self._retrieve_for_answer(question, index_folder, retrieval)
+        
+        parts = []
+        for token in self.generate_answer_with_memory_stream(question, relevant_chunks, session_id, user_identifier, username, email, device_id, semantic_cache_entry):
+            parts.append(token)
+            yield token
+        
+        logging.info(f"✅ RESPONSE TYPE: RAG_KNOWLEDGE_BASE - Streamed from documents + LLM")
+        logging.info(f"📖 RAG Response: {''.join(parts)[:100]}...")
+    
     def check_response_templates(self, question: str) -> str:
-        """Check if question matches any response templates (improved keyword/pattern based)"""
+        """Check if question matches any response templates (precompiled keyword matcher)"""
         try:
-            from models import ResponseTemplate
-            import json
-            import re
-            
-            # Get all active templates ordered by priority
-            templates = ResponseTemplate.query.filter_by(is_active=True).order_by(ResponseTemplate.priority.desc()).all()
+            match = template_matcher.match(question)
+            if not match:
+                return None
             
-            question_lower = question.lower().strip()
+            # Usage count is written to the database in batches
+            template_usage_counter.record(match['id'])
             
-            for template in templates:
-                # Check trigger keywords with improved matching
-                try:
-                    keywords = json.loads(template.trigger_keywords) if template.trigger_keywords else []
-                    
-                    # Check if any keyword matches with improved logic
-                    for keyword in keywords:
-                        keyword_lower = keyword.lower().strip()
-                        
-                        # IMPROVED MATCHING LOGIC:
-                        # 1. For very short keywords (1-2 words), require exact match or word boundary
-                        # 2. For longer keywords, allow substring matching
-                        # 3. Avoid matching common question starters like "can you", "how to", etc.
-                        
-                        if len(keyword_lower.split()) <= 2:
-                            # Short keywords: require word boundaries to avoid false positives
-                            pattern = r'\b' + re.escape(keyword_lower) + r'\b'
-                            if re.search(pattern, question_lower):
-                                # Skip common question starters that shouldn't trigger templates
-                                common_starters = ['can you', 'how to', 'how do', 'what is', 'tell me', 'explain']
-                                if any(starter in question_lower for starter in common_starters):
-                                    # Only match if the question is VERY simple (less than 6 words)
-                                    if len(question_lower.split()) >= 6:
-                                        continue
-                                
-                                # Increment usage count
-                                template.usage_count = (template.usage_count or 0) + 1
-                                from models import db
-                                db.session.commit()
-                                
-                                logging.info(f"🎯 Template Match: '{template.name}' triggered by keyword '{keyword}'")
-                                return template.template_text
-                        else:
-                            # Longer keywords: allow substring matching
-                            if keyword_lower in question_lower:
-                                # Increment usage count
-                                template.usage_count = (template.usage_count or 0) + 1
-                                from models import db
-                                db.session.commit()
-                                
-                                logging.info(f"🎯 Template Match: '{template.name}' triggered by keyword '{keyword}'")
-                                return template.template_text
-                            
-                except (json.JSONDecodeError, TypeError):
-                    continue
-            
-            return None
+            logging.info(f"🎯 Template Match: '{match['name']}' triggered by keyword '{match['keyword']}'")
+            return match['template_text']
             
         except Exception as e:
             logging.error(f"Error checking response templates: {e}")
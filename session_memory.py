@@ -1,6 +1,8 @@
 """
 Session-based memory management for LangChain chatbot with persistent user storage.
 Each user session gets isolated conversation memory with database persistence.
+The recent window of every conversation lives in a pluggable backend (see memory_backends.py)
+so it can be shared between workers.
 """
 
 import os
@@ -13,78 +15,144 @@ from langchain.memory import ConversationBufferWindowMemory
 from langchain.schema import BaseChatMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
 from models import UnifiedConversation, db
+from memory_backends import InProcessMemoryBackend, create_memory_backend
 
+# Response type of the empty message stored for a persistent user without any history, so that the
+# database isn't queried again on every read until the backend entry expires
+EMPTY_HISTORY_MARKER = 'EMPTY_HISTORY'
 
-class PersistentChatMessageHistory(BaseChatMessageHistory):
-    """Persistent chat message history for a user with database storage."""
+
+class BackendChatMessageHistory(BaseChatMessageHistory):
+    """Chat message history stored in a session memory backend (only the last max_messages are kept)."""
+    
+    def __init__(self, memory_key: str, backend, max_messages: int = 20):
+        self.memory_key = memory_key
+        self.backend = backend
+        self.max_messages = max_messages
+    
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self.get_recent(self.max_messages)
     
-    def __init__(self, user_identifier: str, username: str = None, email: str = None, device_id: str = None):
+    def get_recent(self, limit: int) -> List[BaseMessage]:
+        """Read only the last `limit` messages."""
+        return self.backend.get_messages(self.memory_key, limit)
+    
+    def add_message(self, message: BaseMessage) -> None:
+        """Add a message to the session history."""
+        self.add_messages([message])
+    
+    def add_messages(self, messages: List[BaseMessage]) -> None:
+        """Add several messages to the session history."""
+        self.backend.append(self.memory_key, list(messages))
+    
+    def clear(self) -> None:
+        """Clear all messages from the session."""
+        self.backend.clear(self.memory_key)
+
+
+class PersistentChatMessageHistory(BackendChatMessageHistory):
+    """Persistent chat message history for a user with database storage.
+    
+    The backend holds the recent window; the database holds the full history and is used to
+    rehydrate the window when the backend has nothing for this user (restart, eviction, expiry).
+    """
+    
+    rehydrations = 0  # Per process
+    empty_rehydrations = 0
+    
+    def __init__(self, user_identifier: str, backend, username: str = None, email: str = None, device_id: str = None, max_messages: int = 20):
+        super().__init__(f"user:{user_identifier}", backend, max_messages)
         self.user_identifier = user_identifier
         self.username = username
         self.email = email
         self.device_id = device_id
-        self.messages: List[BaseMessage] = []
-        self._load_from_database()
     
-    def _load_from_database(self) -> None:
-        """Load conversation history from database."""
+    def _load_from_database(self) -> Optional[List[BaseMessage]]:
+        """Load recent conversation history from database (None if it could not be read)."""
+        messages = []
         try:
             user_conversation = UnifiedConversation.query.filter_by(
                 user_identifier=self.user_identifier,
                 conversation_type='chatbot'
             ).first()
             if user_conversation:
-                history = user_conversation.get_conversation_history()
-                self.messages = []
+                history = user_conversation.get_conversation_history(limit=self.max_messages)
                 for msg in history:
                     if msg['type'] == 'human':
-                        self.messages.append(HumanMessage(content=msg['content']))
+                        messages.append(HumanMessage(content=msg['content']))
                     elif msg['type'] == 'ai':
-                        self.messages.append(AIMessage(content=msg['content']))
+                        messages.append(AIMessage(content=msg['content']))
         except Exception as e:
             print(f"Error loading conversation history: {e}")
-            self.messages = []
+            return None
+        return messages
     
-    def _save_to_database(self) -> None:
-        """Save conversation history to database."""
-        try:
-            user_conversation = UnifiedConversation.query.filter_by(
+    @staticmethod
+    def _is_marker(message: BaseMessage) -> bool:
+        return isinstance(message, AIMessage) and message.additional_kwargs.get('response_type') == EMPTY_HISTORY_MARKER
+    
+    def _rehydrate(self) -> List[BaseMessage]:
+        """Copy the recent history from the database into the backend (or mark it as empty there)."""
+        messages = self._load_from_database()
+        if messages is None:
+            return []
+        if messages:
+            PersistentChatMessageHistory.rehydrations += 1
+            self.backend.append(self.memory_key, messages)
+        else:
+            # The marker stays the oldest entry and is trimmed away once enough messages follow it
+            PersistentChatMessageHistory.empty_rehydrations += 1
+            self.backend.append(self.memory_key, [AIMessage(content='', additional_kwargs={'response_type': EMPTY_HISTORY_MARKER})])
+        return messages
+    
+    def get_recent(self, limit: int) -> List[BaseMessage]:
+        """Read only the last `limit` messages, rehydrating from the database on a miss."""
+        messages = self.backend.get_messages(self.memory_key, limit)
+        if not messages:
+            return self._rehydrate()[-limit:]
+        return [message for message in messages if not self._is_marker(message)]
+    
+    def _get_or_create_conversation(self) -> UnifiedConversation:
+        """Get the user's chatbot conversation, creating it if needed."""
+        user_conversation = UnifiedConversation.query.filter_by(
+            user_identifier=self.user_identifier,
+            conversation_type='chatbot'
+        ).first()
+        if not user_conversation:
+            from uuid import uuid4
+            user_conversation = UnifiedConversation(
+                session_id=f"chatbot_{uuid4().hex[:12]}",
                 user_identifier=self.user_identifier,
+                username=self.username,
+                email=self.email,
+                device_id=self.device_id,
                 conversation_type='chatbot'
-            ).first()
-            if not user_conversation:
-                from uuid import uuid4
-                user_conversation = UnifiedConversation(
-                    session_id=f"chatbot_{uuid4().hex[:12]}",
-                    user_identifier=self.user_identifier,
-                    username=self.username,
-                    email=self.email,
-                    device_id=self.device_id,
-                    conversation_type='chatbot'
-                )
-                db.session.add(user_conversation)
+            )
+            db.session.add(user_conversation)
+        return user_conversation
+    
+    def _append_to_database(self, messages: List[BaseMessage]) -> None:
+        """Insert only the given new messages, in a single transaction (all of them or none)."""
+        try:
+            user_conversation = self._get_or_create_conversation()
             
-            # Convert messages to serializable format
-            history = []
-            for msg in self.messages:
+            for msg in messages:
                 if isinstance(msg, HumanMessage):
-                    history.append({'type': 'human', 'content': msg.content})
+                    user_conversation.add_message(
+                        sender_type='user',
+                        content=msg.content,
+                        sender_name='User'
+                    )
                 elif isinstance(msg, AIMessage):
-                    entry = {'type': 'ai', 'content': msg.content}
                     # Get response type from AIMessage metadata
-                    if hasattr(msg, 'additional_kwargs') and 'response_type' in msg.additional_kwargs:
-                        entry['response_type'] = msg.additional_kwargs['response_type']
-                    history.append(entry)
+                    user_conversation.add_message(
+                        sender_type='assistant',
+                        content=msg.content,
+                        sender_name='Assistant',
+                        response_type=msg.additional_kwargs.get('response_type')
+                    )
             
-            # Clear existing messages and add new ones
-            user_conversation.messages.delete()
-            for msg in history:
-                user_conversation.add_message(
-                    sender_type='user' if msg['type'] == 'human' else 'assistant',
-                    content=msg['content'],
-                    sender_name='User' if msg['type'] == 'human' else 'Assistant',
-                    response_type=msg.get('response_type') if msg['type'] == 'ai' else None
-                )
             # Update user info if provided
             if self.username:
                 user_conversation.username = self.username
@@ -98,14 +166,18 @@ class PersistentChatMessageHistory(BaseChatMessageHistory):
             print(f"Error saving conversation history: {e}")
             db.session.rollback()
     
-    def add_message(self, message: BaseMessage) -> None:
-        """Add a message to the session history and save to database."""
-        self.messages.append(message)
-        self._save_to_database()
+    def add_messages(self, messages: List[BaseMessage]) -> None:
+        """Append messages to the database in one transaction, then to the session history."""
+        # Earlier context must be in the backend before new messages are appended to it (and be read
+        # before the new messages are in the database)
+        if not self.backend.get_messages(self.memory_key, 1):
+            self._rehydrate()
+        self._append_to_database(list(messages))
+        self.backend.append(self.memory_key, list(messages))
     
     def clear(self) -> None:
         """Clear all messages from the session and database."""
-        self.messages.clear()
+        self.backend.clear(self.memory_key)
         try:
             user_conversation = UnifiedConversation.query.filter_by(
                 user_identifier=self.user_identifier,
@@ -119,30 +191,22 @@ class PersistentChatMessageHistory(BaseChatMessageHistory):
             db.session.rollback()
 
 
-class SessionChatMessageHistory(BaseChatMessageHistory):
-    """In-memory chat message history for temporary sessions."""
+class SessionChatMessageHistory(BackendChatMessageHistory):
+    """Chat message history for temporary (anonymous) sessions."""
     
-    def __init__(self, session_id: str):
+    def __init__(self, session_id: str, backend, max_messages: int = 20):
+        super().__init__(f"session:{session_id}", backend, max_messages)
         self.session_id = session_id
-        self.messages: List[BaseMessage] = []
-    
-    def add_message(self, message: BaseMessage) -> None:
-        """Add a message to the session history."""
-        self.messages.append(message)
-    
-    def clear(self) -> None:
-        """Clear all messages from the session."""
-        self.messages.clear()
 
 
 class SessionMemoryManager:
     """Manages conversation memory for multiple user sessions with persistent storage."""
     
-    def __init__(self, max_token_limit: int = 2000):
+    def __init__(self, max_token_limit: int = 2000, backend=None, max_messages_per_session: int = 20):
         self.max_token_limit = max_token_limit
-        self.sessions: Dict[str, SessionChatMessageHistory] = {}  # Temporary sessions
-        self.user_sessions: Dict[str, PersistentChatMessageHistory] = {}  # Persistent user sessions
-        self.memory_stores: Dict[str, ConversationBufferWindowMemory] = {}
+        # Only the most recent messages are used for context (10 exchanges), so that is all the backend keeps
+        self.max_messages_per_session = max_messages_per_session
+        self.backend = backend or InProcessMemoryBackend(max_messages=max_messages_per_session)
         
         # Initialize OpenAI client
         self.openai_api_key = os.environ.get("OPENAI_API_KEY")
@@ -160,82 +224,59 @@ class SessionMemoryManager:
         return str(uuid.uuid4())
     
     def get_or_create_user_session(self, user_identifier: str, username: str = None, email: str = None, device_id: str = None) -> PersistentChatMessageHistory:
-        """Get existing user session or create new one with persistent storage."""
-        if user_identifier not in self.user_sessions:
-            self.user_sessions[user_identifier] = PersistentChatMessageHistory(
-                user_identifier=user_identifier,
-                username=username,
-                email=email,
-                device_id=device_id
-            )
-            # Create memory store for this user session
-            self.memory_stores[user_identifier] = ConversationBufferWindowMemory(
-                chat_memory=self.user_sessions[user_identifier],
-                k=10,  # Keep last 10 exchanges
-                return_messages=True
-            )
-        return self.user_sessions[user_identifier]
+        """Get the history of a user with persistent storage."""
+        return PersistentChatMessageHistory(
+            user_identifier=user_identifier,
+            backend=self.backend,
+            username=username,
+            email=email,
+            device_id=device_id,
+            max_messages=self.max_messages_per_session
+        )
     
     def get_or_create_session(self, session_id: str) -> SessionChatMessageHistory:
-        """Get existing temporary session or create new one."""
-        if session_id not in self.sessions:
-            self.sessions[session_id] = SessionChatMessageHistory(session_id)
-            # Create memory store for this session
-            self.memory_stores[session_id] = ConversationBufferWindowMemory(
-                chat_memory=self.sessions[session_id],
-                k=10,  # Keep last 10 exchanges
-                return_messages=True
-            )
-        return self.sessions[session_id]
+        """Get the history of a temporary session."""
+        return SessionChatMessageHistory(session_id, self.backend, self.max_messages_per_session)
     
-    def add_user_message(self, session_id: str, message: str, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None) -> None:
-        """Add user message to session history (persistent or temporary)."""
+    def _get_history(self, session_id: str, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None) -> BackendChatMessageHistory:
         if user_identifier:
-            session = self.get_or_create_user_session(user_identifier, username, email, device_id)
-        else:
-            session = self.get_or_create_session(session_id)
-        session.add_message(HumanMessage(content=message))
+            return self.get_or_create_user_session(user_identifier, username, email, device_id)
+        return self.get_or_create_session(session_id)
     
-    def add_ai_message(self, session_id: str, message: str, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None, response_type: str = None) -> None:
-        """Add AI message to session history (persistent or temporary)."""
-        if user_identifier:
-            session = self.get_or_create_user_session(user_identifier, username, email, device_id)
-        else:
-            session = self.get_or_create_session(session_id)
-        
+    def _ai_message(self, message: str, response_type: str = None) -> AIMessage:
         # Store response type in AIMessage metadata
         ai_message = AIMessage(content=message)
         if response_type:
             ai_message.additional_kwargs['response_type'] = response_type
-        
-        session.add_message(ai_message)
+        return ai_message
+    
+    def add_user_message(self, session_id: str, message: str, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None) -> None:
+        """Add user message to session history (persistent or temporary)."""
+        self._get_history(session_id, user_identifier, username, email, device_id).add_messages([HumanMessage(content=message)])
+    
+    def add_ai_message(self, session_id: str, message: str, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None, response_type: str = None) -> None:
+        """Add AI message to session history (persistent or temporary)."""
+        self._get_history(session_id, user_identifier, username, email, device_id).add_messages([self._ai_message(message, response_type)])
+    
+    def add_exchange(self, session_id: str, question: str, answer: str, user_identifier: str = None, username: str = None, email: str = None, device_id: str = None, response_type: str = None) -> None:
+        """Add a user question and the AI answer to session history together (one database write for persistent users)."""
+        history = self._get_history(session_id, user_identifier, username, email, device_id)
+        history.add_messages([HumanMessage(content=question), self._ai_message(answer, response_type)])
     
     def get_session_history(self, session_id: str, user_identifier: str = None) -> List[BaseMessage]:
-        """Get conversation history for a session (persistent or temporary)."""
-        if user_identifier:
-            if user_identifier not in self.user_sessions:
-                return []
-            return self.user_sessions[user_identifier].messages
-        else:
-            if session_id not in self.sessions:
-                return []
-            return self.sessions[session_id].messages
+        """Get recent conversation history for a session (persistent or temporary)."""
+        return self._get_history(session_id, user_identifier).messages
     
     def get_memory_context(self, session_id: str, user_identifier: str = None) -> str:
         """Get formatted conversation context for RAG."""
-        identifier = user_identifier or session_id
-        if identifier not in self.memory_stores:
-            return ""
-        
-        memory = self.memory_stores[identifier]
-        messages = memory.chat_memory.messages
+        messages = self._get_history(session_id, user_identifier).get_recent(6)  # Last 6 messages (3 exchanges)
         
         if not messages:
             return ""
         
         # Format recent conversation for context
         context_parts = []
-        for msg in messages[-6:]:  # Last 6 messages (3 exchanges)
+        for msg in messages:
             if isinstance(msg, HumanMessage):
                 context_parts.append(f"User: {msg.content}")
             elif isinstance(msg, AIMessage):
@@ -245,38 +286,18 @@ class SessionMemoryManager:
     
     def clear_session(self, session_id: str, user_identifier: str = None) -> None:
         """Clear conversation history for a session (persistent or temporary)."""
-        if user_identifier:
-            if user_identifier in self.user_sessions:
-                self.user_sessions[user_identifier].clear()
-            if user_identifier in self.memory_stores:
-                self.memory_stores[user_identifier].clear()
-        else:
-            if session_id in self.sessions:
-                self.sessions[session_id].clear()
-            if session_id in self.memory_stores:
-                self.memory_stores[session_id].clear()
-    
-    def cleanup_old_sessions(self, max_sessions: int = 100) -> None:
-        """Clean up old sessions if too many exist."""
-        if len(self.sessions) > max_sessions:
-            # Remove oldest sessions (simple cleanup)
-            sessions_to_remove = list(self.sessions.keys())[:-max_sessions]
-            for session_id in sessions_to_remove:
-                self.sessions.pop(session_id, None)
-                self.memory_stores.pop(session_id, None)
+        self._get_history(session_id, user_identifier).clear()
+    
+    def cleanup_old_sessions(self) -> int:
+        """Drop expired sessions from the backend now instead of waiting for it to do so."""
+        return self.backend.purge_expired()
     
     def get_session_stats(self, session_id: str, user_identifier: str = None) -> Dict[str, Any]:
         """Get statistics about a session (persistent or temporary)."""
-        if user_identifier:
-            if user_identifier not in self.user_sessions:
-                return {"exists": False, "type": "user", "persistent": True}
-            messages = self.user_sessions[user_identifier].messages
-            session_type = "user"
-        else:
-            if session_id not in self.sessions:
-                return {"exists": False, "type": "temporary", "persistent": False}
-            messages = self.sessions[session_id].messages
-            session_type = "temporary"
+        messages = self._get_history(session_id, user_identifier).messages
+        if not user_identifier and not messages:
+            return {"exists": False, "type": "temporary", "persistent": False}
+        session_type = "user" if user_identifier else "temporary"
         
         user_messages = sum(1 for msg in messages if isinstance(msg, HumanMessage))
         ai_messages = sum(1 for msg in messages if isinstance(msg, AIMessage))
@@ -291,6 +312,14 @@ class SessionMemoryManager:
             "last_message_type": type(messages[-1]).__name__ if messages else None
         }
     
+    def get_store_stats(self) -> Dict[str, Any]:
+        """Get metrics of the session memory backend (size, hits, evictions, rehydrations)."""
+        stats = self.backend.get_stats()
+        stats['rehydrations'] = PersistentChatMessageHistory.rehydrations
+        stats['empty_rehydrations'] = PersistentChatMessageHistory.empty_rehydrations
+        stats['max_messages_per_session'] = self.max_messages_per_session
+        return stats
+    
     def get_user_conversation_info(self, user_identifier: str) -> Optional[Dict[str, Any]]:
         """Get information about a user's conversation from database."""
         try:
@@ -304,14 +333,23 @@ class SessionMemoryManager:
     
     def get_memory_for_session(self, session_id: str, user_identifier: str = None) -> ConversationBufferWindowMemory:
         """Get memory object for a session (for use with LangChain)."""
-        identifier = user_identifier or session_id
-        if identifier not in self.memory_stores:
-            if user_identifier:
-                self.get_or_create_user_session(user_identifier)
-            else:
-                self.get_or_create_session(session_id)
-        return self.memory_stores[identifier]
+        return ConversationBufferWindowMemory(
+            chat_memory=self._get_history(session_id, user_identifier),
+            k=10,  # Keep last 10 exchanges
+            return_messages=True
+        )
 
 
 # Global session manager instance
-session_manager = SessionMemoryManager()
\ No newline at end of file
+# SESSION_MEMORY_BACKEND=database or redis shares memory between gunicorn workers
+session_manager = SessionMemoryManager(
+    backend=create_memory_backend(
+        os.environ.get('SESSION_MEMORY_BACKEND', 'memory'),
+        max_messages=int(os.environ.get('SESSION_MAX_MESSAGES', 20)),
+        max_sessions=int(os.environ.get('SESSION_STORE_MAX_SESSIONS', 1000)),
+        max_bytes=int(float(os.environ.get('SESSION_STORE_MAX_MB', 32)) * 1024 * 1024),
+        ttl_seconds=int(os.environ.get('SESSION_STORE_TTL_SECONDS', 3600)),
+        redis_url=os.environ.get('REDIS_URL')
+    ),
+    max_messages_per_session=int(os.environ.get('SESSION_MAX_MESSAGES', 20))
+)
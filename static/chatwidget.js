@@ -63,7 +63,8 @@
         autoPlayVoice: false, // Auto-play bot voice responses
         continuousVoice: false, // Continuous voice conversation mode
         selectedVoice: 'indian_female', // Default voice selection (Indian English female for natural accent)
-        showVoiceControls: true // Show voice control buttons in the interface
+        showVoiceControls: true, // Show voice control buttons in the interface
+        streamingEnabled: true // Stream answers token by token from /ask/stream (falls back to /ask)
     };
 
     // Widget state
@@ -1087,17 +1088,7 @@
             
             // Store in history with security limits (only for new messages, not loaded history)
             if (storeInHistory) {
-                conversationHistory.push({ 
-                    text: SecurityManager.sanitizeInput(text, sender === 'user'), 
-                    sender, 
-                    timestamp: new Date().toISOString(),
-                    sessionId: sessionId
-                });
-                
-                // Limit conversation history size
-                if (conversationHistory.length > SECURITY_CONFIG.maxConversationHistory) {
-                    conversationHistory = conversationHistory.slice(-SECURITY_CONFIG.maxConversationHistory);
-                }
+                this.recordHistory(text, sender);
             }
             
             // Enable typing effect for bot messages based on backend settings
@@ -1117,6 +1108,46 @@
             }
         },
 
+        recordHistory: function(text, sender) {
+            conversationHistory.push({ 
+                text: SecurityManager.sanitizeInput(text, sender === 'user'), 
+                sender, 
+                timestamp: new Date().toISOString(),
+                sessionId: sessionId
+            });
+            
+            // Limit conversation history size
+            if (conversationHistory.length > SECURITY_CONFIG.maxConversationHistory) {
+                conversationHistory = conversationHistory.slice(-SECURITY_CONFIG.maxConversationHistory);
+            }
+        },
+
+        createStreamingMessage: function() {
+            // Empty bot bubble that is filled in as tokens arrive
+            const messageDiv = document.createElement('div');
+            messageDiv.className = 'chat-widget-message bot';
+            
+            const bubble = document.createElement('div');
+            bubble.className = 'chat-widget-message-bubble';
+            
+            messageDiv.appendChild(bubble);
+            messagesContainer.appendChild(messageDiv);
+            
+            return { messageDiv, bubble, text: '' };
+        },
+
+        finishStreamingMessage: function(streamed, text, responseData) {
+            // Replace the streamed text with the final answer and finalize like addMessage does
+            streamed.bubble.innerHTML = this.formatMessage(text, false);
+            this.recordHistory(text, 'bot');
+            
+            if (responseData && this.shouldShowFeedback(responseData)) {
+                this.addFeedbackButtons(streamed.messageDiv, text, responseData);
+            }
+            
+            this.scrollToBottom();
+        },
+
         typeMessage: function(element, text, index = 0, responseData = null) {
             const formattedText = this.formatMessage(text, false); // false = not user input
             
@@ -1237,8 +1268,12 @@
                 // Show typing indicator
                 const typingDiv = this.showTyping();
 
-                // Send to API
-                this.sendToAPI(sanitizedMessage).then(response => {
+                // Send to API (streaming when supported)
+                const request = this.canStream()
+                    ? this.sendToAPIStream(sanitizedMessage, typingDiv)
+                    : this.sendToAPI(sanitizedMessage);
+                
+                request.then(response => {
                     this.hideTyping(typingDiv);
                     
                     // Track RAG responses for feedback timing and add user question for feedback
@@ -1247,8 +1282,13 @@
                         this.trackRAGResponse();
                     }
                     
-                    // Pass the full response data including user question for feedback
-                    this.addMessage(response.answer, 'bot', false, true, true, responseData); // Enable typing effect with response data
+                    if (response.streamedMessage) {
+                        // Answer was already rendered while streaming
+                        this.finishStreamingMessage(response.streamedMessage, response.answer, responseData);
+                    } else {
+                        // Pass the full response data including user question for feedback
+                        this.addMessage(response.answer, 'bot', false, true, true, responseData); // Enable typing effect with response data
+                    }
                     this.updateSessionInfo(response.user_info);
                     
                     // Handle voice synthesis if enabled and voice data is available
@@ -1275,7 +1315,7 @@
             }
         },
 
-        sendToAPI: function(question) {
+        buildAPIRequest: function(question) {
             const payload = {
                 question: question,
                 user_id: config.user_id,
@@ -1301,6 +1341,12 @@
                 headers['Authorization'] = `Bearer ${config.apiKey}`;
             }
 
+            return { payload, headers };
+        },
+
+        sendToAPI: function(question) {
+            const { payload, headers } = this.buildAPIRequest(question);
+
             // Create abort controller for timeout
             const controller = new AbortController();
             const timeoutId = setTimeout(() => controller.abort(), SECURITY_CONFIG.requestTimeout);
@@ -1343,6 +1389,142 @@
             });
         },
 
+        canStream: function() {
+            return config.streamingEnabled &&
+                typeof window.ReadableStream !== 'undefined' &&
+                typeof window.TextDecoder !== 'undefined';
+        },
+
+        sendToAPIStream: function(question, typingDiv) {
+            const { payload, headers } = this.buildAPIRequest(question);
+
+            // Timeout only applies until the first token arrives; long answers may stream for longer
+            const controller = new AbortController();
+            const timeoutId = setTimeout(() => controller.abort(), SECURITY_CONFIG.requestTimeout);
+
+            let streamed = null;
+            // Set once the server has answered; after that the question may already have been
+            // processed (and stored), so it must not be sent a second time through /ask
+            let responded = false;
+            let streamUnavailable = false;
+
+            return fetch(`${config.apiUrl}/ask/stream`, {
+                method: 'POST',
+                headers: headers,
+                body: JSON.stringify(payload),
+                signal: controller.signal,
+                credentials: 'same-origin'
+            }).then(response => {
+                responded = true;
+                
+                // Servers without the streaming endpoint never saw the question
+                if (response.status === 404 || response.status === 405) {
+                    streamUnavailable = true;
+                }
+                
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                
+                const contentType = response.headers.get('content-type') || '';
+                
+                // Live chat hand-offs are answered with a plain JSON response
+                if (contentType.includes('application/json')) {
+                    clearTimeout(timeoutId);
+                    return response.json();
+                }
+                
+                if (!contentType.includes('text/event-stream') || !response.body) {
+                    throw new Error('Invalid response format');
+                }
+                
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                let result = null;
+                
+                const handleEvent = (rawEvent) => {
+                    const data = rawEvent.split('\n')
+                        .filter(line => line.startsWith('data:'))
+                        .map(line => line.slice(5).trim())
+                        .join('\n');
+                    if (!data) return;
+                    
+                    const event = JSON.parse(data);
+                    if (event.type === 'token') {
+                        clearTimeout(timeoutId);
+                        if (!streamed) {
+                            this.hideTyping(typingDiv);
+                            streamed = this.createStreamingMessage();
+                        }
+                        streamed.text += event.content;
+                        streamed.bubble.innerHTML = this.formatMessage(streamed.text, false);
+                        if (chatSettings.auto_scroll_during_typing) {
+                            this.scrollToBottom();
+                        }
+                    } else if (event.type === 'done') {
+                        result = event;
+                    } else if (event.type === 'error') {
+                        throw new Error(event.error || 'Streaming error');
+                    }
+                };
+                
+                const read = () => reader.read().then(({ done, value }) => {
+                    if (value) {
+                        buffer += decoder.decode(value, { stream: true });
+                    }
+                    
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        handleEvent(buffer.slice(0, boundary));
+                        buffer = buffer.slice(boundary + 2);
+                    }
+                    
+                    if (done) {
+                        if (!result) {
+                            throw new Error('Stream ended unexpectedly');
+                        }
+                        return result;
+                    }
+                    return read();
+                });
+                
+                return read();
+            }).then(data => {
+                clearTimeout(timeoutId);
+                
+                // Basic response validation
+                if (!data || typeof data !== 'object') {
+                    throw new Error('Invalid response data');
+                }
+                
+                if (streamed) {
+                    data.streamedMessage = streamed;
+                }
+                return data;
+            }).catch(error => {
+                clearTimeout(timeoutId);
+                
+                // A partly streamed answer is incomplete: remove it, the caller shows an error message instead
+                if (streamed) {
+                    streamed.messageDiv.remove();
+                    streamed = null;
+                }
+                
+                if (error.name === 'AbortError') {
+                    throw new Error('Request timeout');
+                }
+                
+                // The question never reached the streaming endpoint - send it through the regular JSON endpoint
+                if (!responded || streamUnavailable) {
+                    console.warn('Streaming failed, falling back to /ask:', error);
+                    return this.sendToAPI(question);
+                }
+                
+                throw error;
+            });
+        },
+
         // Voice synthesis methods
         loadAvailableVoices: function() {
             if (availableVoices.length > 0) {
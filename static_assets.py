@@ -0,0 +1,106 @@
+"""
+Cached lookup of the uploaded logo and widget icon.
+
+Every /ask response carries the logo URL, which used to cost a directory listing per request.
+The resolver scans the asset folders once and afterwards only stats them (at most every
+STATIC_ASSET_CHECK_SECONDS) to notice uploads made through another worker; the upload routes
+call invalidate() so their own worker sees the change immediately.
+"""
+
+import os
+import logging
+import threading
+import time
+from typing import Dict, Any, Optional
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'svg'}
+
+WIDGET_ICON_FILENAME = 'widget_icon.png'
+
+
+def is_image_file(filename: str) -> bool:
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in IMAGE_EXTENSIONS
+
+
+class StaticAssetResolver:
+    """Current logo and widget icon, rescanned only when their folders change"""
+
+    def __init__(self, logo_folder: str = 'static/logos', widget_icon_folder: str = 'static/widget_icons',
+                 check_interval_seconds: float = 30):
+        self.logo_folder = logo_folder
+        self.widget_icon_folder = widget_icon_folder
+        self.check_interval_seconds = check_interval_seconds
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._signature = None
+        self._checked_at = 0.0
+        self.scans = 0
+        self.logger = logging.getLogger(__name__)
+
+    def _folder_signature(self) -> tuple:
+        # Adding, removing or renaming a file changes its folder's modification time
+        signature = []
+        for folder in (self.logo_folder, self.widget_icon_folder):
+            try:
+                signature.append(os.stat(folder).st_mtime_ns)
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _scan(self) -> Dict[str, Any]:
+        logo = None
+        if os.path.exists(self.logo_folder):
+            for filename in sorted(os.listdir(self.logo_folder)):
+                if is_image_file(filename):
+                    logo = filename
+                    break
+        self.scans += 1
+        return {
+            'logo': logo,
+            'widget_icon': os.path.exists(os.path.join(self.widget_icon_folder, WIDGET_ICON_FILENAME))
+        }
+
+    def _get_snapshot(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        if snapshot is not None and time.time() - self._checked_at < self.check_interval_seconds:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and time.time() - self._checked_at < self.check_interval_seconds:
+                return self._snapshot
+            signature = self._folder_signature()
+            if self._snapshot is None or signature != self._signature:
+                self._snapshot = self._scan()
+                self._signature = signature
+            self._checked_at = time.time()
+            return self._snapshot
+
+    def get_logo_filename(self) -> Optional[str]:
+        """File name of the uploaded logo, or None"""
+        return self._get_snapshot()['logo']
+
+    def get_logo_url(self) -> Optional[str]:
+        """Static URL path of the uploaded logo, or None"""
+        logo = self.get_logo_filename()
+        return f'/static/logos/{logo}' if logo else None
+
+    def has_widget_icon(self) -> bool:
+        """Whether a custom widget icon has been uploaded"""
+        return self._get_snapshot()['widget_icon']
+
+    def invalidate(self) -> None:
+        """Rescan on next use (call after the logo or widget icon is uploaded or removed)"""
+        with self._lock:
+            self._snapshot = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'snapshot': self._snapshot,
+            'scans': self.scans,
+            'check_interval_seconds': self.check_interval_seconds
+        }
+
+
+# Global static asset resolver instance
+static_assets = StaticAssetResolver(
+    check_interval_seconds=float(os.environ.get('STATIC_ASSET_CHECK_SECONDS', 30))
+)
@@ -0,0 +1,193 @@
+"""
+Precompiled matcher for response template trigger keywords.
+
+The trigger keywords of all active templates are compiled into one Aho-Corasick automaton, so a
+question is checked against every template in a single pass. The automaton is only rebuilt when
+templates change: immediately after the admin routes call invalidate(), and in other workers when
+the templates' count or last update time changes.
+"""
+
+import os
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Any, Optional, Tuple
+from models import ResponseTemplate, db
+
+# Short keywords are ignored for longer questions that start like a general question
+COMMON_STARTERS = ['can you', 'how to', 'how do', 'what is', 'tell me', 'explain']
+
+
+class AhoCorasickAutomaton:
+    """Multi-pattern substring search that reports every occurrence, including overlapping ones"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[tuple]] = [[]]
+
+    def add(self, pattern: str, value: Any) -> None:
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[node][char] = next_node
+            node = next_node
+        self._output[node].append((len(pattern), value))
+
+    def build(self) -> None:
+        """Compute failure links (breadth first); call once after all patterns are added"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def iter_matches(self, text: str):
+        """Yield (start, end, value) for every pattern occurrence in text"""
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, value in self._output[node]:
+                yield index - length + 1, index + 1, value
+
+
+class TemplateMatcher:
+    """Finds the highest-priority active response template triggered by a question"""
+
+    def __init__(self, check_interval_seconds: int = 30):
+        self.check_interval_seconds = check_interval_seconds
+        self._lock = threading.Lock()
+        # (automaton, active templates with keywords highest priority first), swapped as one reference
+        self._current: Optional[Tuple[AhoCorasickAutomaton, List[Dict[str, Any]]]] = None
+        self._signature = None
+        self._checked_at = 0.0
+        self.builds = 0
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _parse_keywords(trigger_keywords) -> List[str]:
+        # The admin UI stores a JSON encoded string, API clients may store a list
+        if not trigger_keywords:
+            return []
+        if isinstance(trigger_keywords, str):
+            try:
+                trigger_keywords = json.loads(trigger_keywords)
+            except json.JSONDecodeError:
+                return []
+        if not isinstance(trigger_keywords, list):
+            return []
+        return [str(keyword) for keyword in trigger_keywords]
+
+    @staticmethod
+    def _is_word_char(char: str) -> bool:
+        return char.isalnum() or char == '_'
+
+    def _is_boundary(self, text: str, index: int) -> bool:
+        """Same rule as regex \\b: a word character on exactly one side of index"""
+        before = index > 0 and self._is_word_char(text[index - 1])
+        after = index < len(text) and self._is_word_char(text[index])
+        return before != after
+
+    def _db_signature(self) -> tuple:
+        count, last_update = db.session.query(
+            db.func.count(ResponseTemplate.id), db.func.max(ResponseTemplate.updated_at)
+        ).one()
+        return count, last_update
+
+    def _build(self, signature: tuple) -> Tuple[AhoCorasickAutomaton, List[Dict[str, Any]]]:
+        templates = ResponseTemplate.query.filter_by(is_active=True).order_by(
+            ResponseTemplate.priority.desc(), ResponseTemplate.id.asc()
+        ).all()
+
+        automaton = AhoCorasickAutomaton()
+        entries = []
+        for template in templates:
+            keywords = [keyword.lower().strip() for keyword in self._parse_keywords(template.trigger_keywords)]
+            keywords = [keyword for keyword in keywords if keyword]
+            if not keywords:
+                continue
+            rank = len(entries)
+            entries.append({'id': template.id, 'name': template.name, 'template_text': template.template_text})
+            for keyword in keywords:
+                # Keywords of 1-2 words must match on word boundaries; longer ones match as substrings
+                automaton.add(keyword, (rank, len(keyword.split()) <= 2, keyword))
+        automaton.build()
+
+        self._current = (automaton, entries)
+        self._signature = signature
+        self.builds += 1
+        self.logger.info(f"Built response template matcher: {len(entries)} templates")
+        return self._current
+
+    def _ensure_current(self) -> Tuple[AhoCorasickAutomaton, List[Dict[str, Any]]]:
+        """Return the current (automaton, templates) pair, rebuilding it first if templates changed"""
+        current = self._current
+        if current is not None and time.time() - self._checked_at < self.check_interval_seconds:
+            return current
+        with self._lock:
+            current = self._current
+            if current is not None and time.time() - self._checked_at < self.check_interval_seconds:
+                return current
+            signature = self._db_signature()
+            if current is None or signature != self._signature:
+                current = self._build(signature)
+            self._checked_at = time.time()
+            return current
+
+    def match(self, question: str) -> Optional[Dict[str, Any]]:
+        """Return {'id', 'name', 'template_text', 'keyword'} of the best matching template, or None"""
+        automaton, templates = self._ensure_current()
+        if not templates:
+            return None
+
+        question_lower = question.lower().strip()
+        allow_short = not (
+            any(starter in question_lower for starter in COMMON_STARTERS) and len(question_lower.split()) >= 6
+        )
+
+        best = None
+        for start, end, (rank, is_short, keyword) in automaton.iter_matches(question_lower):
+            if best is not None and rank >= best[0]:
+                continue
+            if is_short and not (allow_short and self._is_boundary(question_lower, start) and self._is_boundary(question_lower, end)):
+                continue
+            best = (rank, keyword)
+            if rank == 0:
+                break
+
+        if best is None:
+            return None
+        return dict(templates[best[0]], keyword=best[1])
+
+    def invalidate(self) -> None:
+        """Rebuild on the next match (call after templates are created, updated or deleted)"""
+        with self._lock:
+            self._current = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        current = self._current
+        return {
+            'templates': len(current[1]) if current else 0,
+            'builds': self.builds,
+            'check_interval_seconds': self.check_interval_seconds
+        }
+
+
+# Global template matcher instance
+template_matcher = TemplateMatcher(
+    check_interval_seconds=int(os.environ.get('TEMPLATE_MATCHER_CHECK_SECONDS', 30))
+)
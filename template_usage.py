@@ -0,0 +1,113 @@
+"""
+Batched usage counters for response templates.
+
+Template matches are counted in memory and written to ResponseTemplate.usage_count by a background
+thread in a single UPDATE every few seconds (and on shutdown), so template answers never wait on a
+database commit.
+"""
+
+import os
+import atexit
+import logging
+import threading
+from typing import Dict, Any
+from models import ResponseTemplate, db
+
+
+class TemplateUsageCounter:
+    """Aggregates template usage counts per worker and flushes them periodically"""
+
+    def __init__(self, flush_interval_seconds: int = 10):
+        self.flush_interval_seconds = flush_interval_seconds
+        self._pending: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._app = None
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+        self.flushes = 0
+        self.flushed_count = 0
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app) -> None:
+        """Enable background flushing for this Flask app and flush pending counts on shutdown"""
+        self._app = app
+        atexit.register(self.shutdown)
+
+    def record(self, template_id: int) -> None:
+        """Count one use of a template"""
+        with self._lock:
+            self._pending[template_id] = self._pending.get(template_id, 0) + 1
+
+        if self._app is None:
+            # No app to flush from in the background: write immediately
+            self.flush()
+        else:
+            self._ensure_worker()
+
+    def _ensure_worker(self) -> None:
+        # Started lazily so that every gunicorn worker (after fork) runs its own flusher
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='template-usage-flusher', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval_seconds):
+            with self._app.app_context():
+                self.flush()
+
+    def flush(self) -> int:
+        """Write pending counts in one UPDATE; returns the number of uses written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            # Keep updated_at so the template matcher is not rebuilt for usage changes
+            ResponseTemplate.query.filter(ResponseTemplate.id.in_(list(pending))).update({
+                ResponseTemplate.usage_count: db.func.coalesce(ResponseTemplate.usage_count, 0) + db.case(pending, value=ResponseTemplate.id, else_=0),
+                ResponseTemplate.updated_at: ResponseTemplate.updated_at
+            }, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.logger.error(f"Error flushing template usage counts: {str(e)}")
+            # Keep the counts for the next flush
+            with self._lock:
+                for template_id, count in pending.items():
+                    self._pending[template_id] = self._pending.get(template_id, 0) + count
+            return 0
+
+        written = sum(pending.values())
+        self.flushes += 1
+        self.flushed_count += written
+        return written
+
+    def shutdown(self) -> None:
+        """Stop the background flusher and write whatever is still pending"""
+        self._stop.set()
+        if self._app is not None:
+            with self._app.app_context():
+                self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = sum(self._pending.values())
+        return {
+            'pending': pending,
+            'flushes': self.flushes,
+            'flushed_count': self.flushed_count,
+            'flush_interval_seconds': self.flush_interval_seconds
+        }
+
+
+# Global template usage counter instance
+template_usage_counter = TemplateUsageCounter(
+    flush_interval_seconds=int(os.environ.get('TEMPLATE_USAGE_FLUSH_SECONDS', 10))
+)
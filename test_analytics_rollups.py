@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test the analytics rollups against counts taken straight from the rows, with rows on hour and day edges
+(in-memory SQLite database, no server needed)
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from models import db, UnifiedConversation, UnifiedMessage, RagFeedback
+from analytics_rollups import AnalyticsRollups
+
+NOW = datetime(2026, 3, 10, 10, 30)
+
+# Rows right before, on and right after hour and day boundaries, plus older history to backfill
+MOMENTS = [
+    datetime(2026, 2, 20, 8, 15),
+    datetime(2026, 3, 1, 0, 0),
+    datetime(2026, 3, 1, 23, 59, 59, 999999),
+    datetime(2026, 3, 8, 23, 59, 59, 999999),
+    datetime(2026, 3, 9, 0, 0),
+    datetime(2026, 3, 9, 0, 0, 0, 1),
+    datetime(2026, 3, 9, 13, 59, 59),
+    datetime(2026, 3, 9, 14, 0),
+    datetime(2026, 3, 9, 14, 45),
+    datetime(2026, 3, 10, 9, 59, 59, 999999),
+]
+
+RANGES = [
+    (None, None),
+    (datetime(2026, 3, 9), None),
+    (None, datetime(2026, 3, 9)),
+    (datetime(2026, 3, 9), datetime(2026, 3, 9, 14)),
+    (datetime(2026, 3, 8, 23), datetime(2026, 3, 9, 1)),
+    (datetime(2026, 3, 1), datetime(2026, 3, 10)),
+    (datetime(2026, 3, 1, 1), datetime(2026, 3, 9, 14)),
+    (datetime(2026, 3, 9, 14), datetime(2026, 3, 9, 14)),
+]
+
+
+def in_range(moment, start, end):
+    return (start is None or moment >= start) and (end is None or moment < end)
+
+
+def expected_stats(start, end):
+    """Conversation and feedback numbers counted directly from the rows"""
+    conversations = [c for c in UnifiedConversation.query.all() if in_range(c.created_at, start, end)]
+    first_seen = {}
+    for c in UnifiedConversation.query.order_by(UnifiedConversation.created_at).all():
+        first_seen.setdefault(c.user_identifier, c.created_at)
+    feedback = [f for f in RagFeedback.query.all() if in_range(f.feedback_timestamp, start, end)]
+    return {
+        'total_conversations': len(conversations),
+        'chatbot_conversations': sum(c.conversation_type == 'chatbot' for c in conversations),
+        'live_chat_conversations': sum(c.conversation_type == 'live_chat' for c in conversations),
+        'total_messages': sum(in_range(m.created_at, start, end) for m in UnifiedMessage.query.all()),
+        'new_users': sum(in_range(moment, start, end) for moment in first_seen.values()),
+        'total_feedback': len(feedback),
+        'thumbs_up': sum(f.feedback_type == 'thumbs_up' for f in feedback),
+        'used_for_training': sum(bool(f.used_for_training) for f in feedback),
+    }
+
+
+def rollup_stats(rollups, start, end):
+    stats = dict(rollups.conversation_stats(start, end))
+    stats.pop('unique_users')
+    feedback = rollups.feedback_stats(start, end)
+    for key in ('total_feedback', 'thumbs_up', 'used_for_training'):
+        stats[key] = feedback[key]
+    return stats
+
+
+def assert_matches(rollups, ranges=RANGES):
+    for start, end in ranges:
+        assert rollup_stats(rollups, start, end) == expected_stats(start, end), (start, end)
+
+
+def test_analytics_rollups():
+    """totals() adds up to the live counts for whole-hour ranges, before, during and after backfill"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    rollups = AnalyticsRollups(lookback_hours=2, backfill_hours=24 * 5)
+
+    print("Testing analytics rollups")
+    print("=" * 50)
+
+    with app.app_context():
+        db.create_all()
+        for i, moment in enumerate(MOMENTS):
+            db.session.add(UnifiedConversation(session_id=f"s{i}", user_identifier=f"u{i % 4}",
+                                               conversation_type='live_chat' if i % 3 == 0 else 'chatbot',
+                                               created_at=moment))
+            for j in range(i % 3 + 1):
+                db.session.add(UnifiedMessage(session_id=f"s{i}", message_id=f"m{i}-{j}", sender_type='user',
+                                              message_content='hello', created_at=moment))
+            db.session.add(RagFeedback(session_id=f"s{i}", user_question='q', bot_response='a',
+                                       response_type='rag' if i % 2 else 'tool',
+                                       feedback_type='thumbs_up' if i % 3 else 'thumbs_down',
+                                       used_for_training=i % 4 == 0, feedback_timestamp=moment))
+        db.session.commit()
+
+        # Nothing compacted yet: counted live
+        assert_matches(rollups)
+        assert rollups.live_fallbacks > 0
+        print("✓ Live counts before compaction")
+
+        # Backfill goes back backfill_hours per pass; older ranges are counted live meanwhile
+        passes = 0
+        while rollups.compact(now=NOW) > rollups.lookback_hours:
+            passes += 1
+            assert_matches(rollups)
+        assert passes > 1
+        fallbacks = rollups.live_fallbacks
+        assert_matches(rollups)
+        assert rollups.live_fallbacks == fallbacks
+        print(f"✓ Rollups match live counts on hour and day edges ({passes} backfill passes)")
+
+        # Ranges inside an hour are widened to the whole hour
+        assert (rollup_stats(rollups, datetime(2026, 3, 9, 13, 30), datetime(2026, 3, 9, 14, 0, 0, 500000))
+                == expected_stats(datetime(2026, 3, 9, 13), datetime(2026, 3, 9, 15)))
+        print("✓ Partial hours widened to whole hours")
+
+        # Changes to compacted rows show up once their hours are marked dirty and recomputed
+        conversation = UnifiedConversation.query.filter_by(session_id='s4').first()
+        conversation.conversation_type = 'live_chat'
+        rollups.mark_dirty(conversation.created_at)
+        feedback = RagFeedback.query.filter_by(session_id='s3').first()
+        feedback.used_for_training = True
+        rollups.mark_dirty(feedback.feedback_timestamp)
+        conversation = UnifiedConversation.query.filter_by(session_id='s6').first()
+        rollups.mark_rows_dirty(conversation.messages, UnifiedMessage.created_at)
+        conversation.messages.delete()
+        db.session.commit()
+        assert rollups.compact(now=NOW) == 3 + rollups.lookback_hours
+        assert_matches(rollups)
+        print("✓ Dirty hours recomputed")
+
+
+if __name__ == "__main__":
+    test_analytics_rollups()
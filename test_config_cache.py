@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test the config cache: bump() reaching this worker on commit and other workers within one check
+interval, and rolled back changes leaving the cache alone (in-memory SQLite database, no server needed)
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from models import db, ChatSettings, SystemPrompt, ConfigVersion
+from config_cache import ConfigCache, config_cache
+
+
+def version(group):
+    row = db.session.get(ConfigVersion, group)
+    return row.version if row else 0
+
+
+def test_config_cache():
+    """Committed bumps invalidate at once here and after the check interval elsewhere; rollbacks don't"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    config_cache.check_interval_seconds = 3600
+    other_worker = ConfigCache(check_interval_seconds=3600)
+
+    print("Testing config cache")
+    print("=" * 50)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(ChatSettings(setting_name='greeting', setting_value='Hello'))
+        db.session.add(SystemPrompt(name='default', prompt_text='Be helpful', is_active=True))
+        db.session.commit()
+
+        assert config_cache.get_settings()['greeting']['value'] == 'Hello'
+        assert other_worker.get_settings()['greeting']['value'] == 'Hello'
+        assert config_cache.get_active_prompt_text() == 'Be helpful'
+        loads = config_cache.loads
+
+        # Without a bump the cached copy is served
+        ChatSettings.query.filter_by(setting_name='greeting').first().setting_value = 'Hi'
+        db.session.commit()
+        assert config_cache.get_settings()['greeting']['value'] == 'Hello'
+        assert config_cache.loads == loads
+        print("✓ Cached copy served between changes")
+
+        # bump() invalidates this worker only once the transaction commits
+        config_cache.bump('chat_settings')
+        db.session.flush()
+        assert config_cache.get_settings()['greeting']['value'] == 'Hello'
+        db.session.commit()
+        assert version('chat_settings') == 1
+        assert config_cache.get_settings()['greeting']['value'] == 'Hi'
+        assert config_cache.get_active_prompt_text() == 'Be helpful'
+        print("✓ bump() then commit invalidates this worker")
+
+        # Other workers see the new version after their check interval
+        assert other_worker.get_settings()['greeting']['value'] == 'Hello'
+        other_worker.check_interval_seconds = 0
+        assert other_worker.get_settings()['greeting']['value'] == 'Hi'
+        other_worker.check_interval_seconds = 3600
+        print("✓ Other workers reload after the check interval")
+
+        # A rolled back change leaves version and cache alone, and isn't applied by a later commit
+        loads = config_cache.loads
+        prompt = SystemPrompt.query.filter_by(name='default').first()
+        prompt.prompt_text = 'Be brief'
+        config_cache.bump('system_prompts')
+        db.session.rollback()
+        db.session.commit()
+        assert version('system_prompts') == 0
+        assert config_cache.get_active_prompt_text() == 'Be helpful'
+        assert config_cache.loads == loads
+        print("✓ Rollback discards the pending bump")
+
+        # Losing the race to create the version row rolls back only the savepoint, and the change still lands
+        db.session.expunge_all()
+        increments = []
+        racing_worker = ConfigCache()
+        racing_worker._increment = lambda session, group: increments.append(group) or (
+            ConfigCache._increment(session, group) if len(increments) > 1 else 0)
+        ChatSettings.query.filter_by(setting_name='greeting').first().setting_value = 'Hey'
+        racing_worker.bump('chat_settings')
+        db.session.commit()
+        assert len(increments) == 2
+        assert version('chat_settings') == 2
+        assert config_cache.get_settings()['greeting']['value'] == 'Hey'
+        print("✓ Insert race falls back to incrementing")
+
+
+if __name__ == "__main__":
+    test_config_cache()
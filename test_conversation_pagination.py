@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test keyset (cursor) pagination of conversation lists and the cached total counts
+(in-memory SQLite database, no server needed)
+"""
+import sys
+import os
+import base64
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from models import db, UnifiedConversation
+from conversation_pagination import (order_by_recent, after_cursor, encode_cursor, decode_cursor,
+                                     InvalidCursor, ConversationCountCache)
+
+
+def walk(query, limit):
+    """Ids of every page fetched by following next cursors"""
+    pages = []
+    cursor = None
+    while True:
+        page_query = order_by_recent(query)
+        if cursor:
+            page_query = after_cursor(page_query, cursor)
+        rows = page_query.limit(limit + 1).all()
+        pages.append([row.id for row in rows[:limit]])
+        if len(rows) <= limit:
+            return pages
+        cursor = encode_cursor(rows[limit - 1])
+
+
+def test_cursor_pagination():
+    """Pages follow (last_activity, id) order without gaps or repeats, also when last_activity ties"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+
+    print("Testing conversation cursor pagination")
+    print("=" * 50)
+
+    with app.app_context():
+        db.create_all()
+        base = datetime(2026, 1, 1, 12, 0, 0, 123456)
+        # Four conversations share one last_activity, so only the id tie-break orders them
+        offsets = [0, 5, 5, 5, 5, 10, 20, 20]
+        for i, minutes in enumerate(offsets):
+            db.session.add(UnifiedConversation(
+                session_id=f"s{i}", user_identifier=f"u{i % 3}",
+                conversation_type='live_chat' if i % 2 else 'chatbot',
+                last_activity=base + timedelta(minutes=minutes)
+            ))
+        db.session.commit()
+
+        # Cursor round trip keeps microseconds
+        first = order_by_recent(UnifiedConversation.query).first()
+        assert decode_cursor(encode_cursor(first)) == (first.last_activity, first.id)
+        print("✓ Cursor encode/decode")
+
+        expected = [c.id for c in sorted(UnifiedConversation.query.all(), key=lambda c: (c.last_activity, c.id), reverse=True)]
+        for limit in (1, 2, 3, len(offsets)):
+            pages = walk(UnifiedConversation.query, limit)
+            assert [conversation_id for page in pages for conversation_id in page] == expected, (limit, pages)
+            assert all(len(page) == limit for page in pages[:-1])
+        print("✓ Pages cover every row once in order, including ties")
+
+        # Cursors combine with filters
+        chatbot = UnifiedConversation.query.filter_by(conversation_type='chatbot')
+        expected = [c.id for c in order_by_recent(chatbot).all()]
+        assert [conversation_id for page in walk(chatbot, 2) for conversation_id in page] == expected
+        print("✓ Filtered pagination")
+
+        for cursor in ("not a cursor", base64.urlsafe_b64encode(b'{"a": 1}').decode('ascii'),
+                       base64.urlsafe_b64encode(b'["yesterday", 1]').decode('ascii')):
+            try:
+                after_cursor(order_by_recent(UnifiedConversation.query), cursor)
+            except InvalidCursor:
+                continue
+            raise AssertionError(f"Expected InvalidCursor for {cursor}")
+        print("✓ Invalid cursors rejected")
+
+        # Cached counts are per filter combination and expire after the TTL
+        cache = ConversationCountCache(ttl_seconds=3600)
+        assert cache.get_count(UnifiedConversation.query, {}) == (len(offsets), 0.0)
+        assert cache.get_count(chatbot, {'type': 'chatbot'})[0] == 4
+        db.session.add(UnifiedConversation(session_id='s-new', user_identifier='u0', conversation_type='chatbot'))
+        db.session.commit()
+        assert cache.get_count(UnifiedConversation.query, {})[0] == len(offsets)
+        cache.ttl_seconds = 0
+        assert cache.get_count(UnifiedConversation.query, {})[0] == len(offsets) + 1
+        assert cache.get_stats()['hits'] == 1
+        print("✓ Cached counts")
+
+
+if __name__ == "__main__":
+    test_cursor_pagination()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test the Redis session memory backend against a local in-memory stand-in for Redis
+(no Redis server or redis package needed)
+"""
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.messages import HumanMessage, AIMessage
+from memory_backends import RedisMemoryBackend
+
+
+class FakeRedis:
+    """Dict-backed stand-in implementing the redis-py commands RedisMemoryBackend uses"""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.lists = {}
+        self.expires_at = {}
+
+    def _live(self, key):
+        expires_at = self.expires_at.get(key)
+        if expires_at is not None and self.clock() >= expires_at:
+            self.lists.pop(key, None)
+            self.expires_at.pop(key, None)
+        return self.lists.get(key)
+
+    @staticmethod
+    def _slice(values, start, end):
+        # Redis ranges are inclusive and accept negative indexes
+        length = len(values)
+        start = max(start + length if start < 0 else start, 0)
+        end = end + length if end < 0 else end
+        return values[start:end + 1]
+
+    def rpush(self, key, *values):
+        items = self._live(key)
+        if items is None:
+            items = self.lists[key] = []
+        items.extend(value.encode('utf-8') if isinstance(value, str) else value for value in values)
+        return len(items)
+
+    def lrange(self, key, start, end):
+        return list(self._slice(self._live(key) or [], start, end))
+
+    def ltrim(self, key, start, end):
+        items = self._live(key)
+        if items is not None:
+            self.lists[key] = self._slice(items, start, end)
+        return True
+
+    def expire(self, key, seconds):
+        if self._live(key) is None:
+            return False
+        self.expires_at[key] = self.clock() + seconds
+        return True
+
+    def ttl(self, key):
+        if self._live(key) is None:
+            return -2
+        expires_at = self.expires_at.get(key)
+        return -1 if expires_at is None else int(round(expires_at - self.clock()))
+
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._live(key) is not None:
+                removed += 1
+            self.lists.pop(key, None)
+            self.expires_at.pop(key, None)
+        return removed
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues commands and runs them in order on execute()"""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue_command(*args):
+            self.commands.append((name, args))
+            return self
+        return queue_command
+
+    def execute(self):
+        results = [getattr(self.client, name)(*args) for name, args in self.commands]
+        self.commands = []
+        return results
+
+
+def test_redis_memory_backend():
+    """Append, trim to max_messages, sliding TTL and clear round-trip through the Redis backend"""
+    now = [1000.0]
+    client = FakeRedis(clock=lambda: now[0])
+    backend = RedisMemoryBackend(client=client, max_messages=4, ttl_seconds=60)
+    key = 'user:alice'
+    redis_key = 'chat_memory:user:alice'
+
+    print("Testing Redis session memory backend")
+    print("=" * 50)
+
+    # Append round-trips message types, content and response type
+    backend.append(key, [HumanMessage(content="What is my balance?"),
+                         AIMessage(content="Your balance is 10 credits.", additional_kwargs={'response_type': 'AI_TOOL'})])
+    messages = backend.get_messages(key, 10)
+    assert [type(message) for message in messages] == [HumanMessage, AIMessage]
+    assert messages[0].content == "What is my balance?"
+    assert messages[1].content == "Your balance is 10 credits."
+    assert messages[1].additional_kwargs.get('response_type') == 'AI_TOOL'
+    assert client.ttl(redis_key) == 60
+    print("✓ Append and read back")
+
+    # The list is trimmed to the newest max_messages entries; reads return the last `limit`
+    for i in range(3):
+        backend.append(key, [HumanMessage(content=f"question {i}"), AIMessage(content=f"answer {i}")])
+    messages = backend.get_messages(key, 10)
+    assert [message.content for message in messages] == ["question 1", "answer 1", "question 2", "answer 2"]
+    assert [message.content for message in backend.get_messages(key, 2)] == ["question 2", "answer 2"]
+    print("✓ Trimmed to max_messages")
+
+    # Every append slides the TTL; an idle conversation expires
+    now[0] += 50
+    assert backend.get_messages(key, 10)
+    backend.append(key, [HumanMessage(content="still here")])
+    assert client.ttl(redis_key) == 60
+    now[0] += 59
+    assert backend.get_messages(key, 10)[-1].content == "still here"
+    now[0] += 1
+    assert backend.get_messages(key, 10) == []
+    print("✓ Sliding TTL expiry")
+
+    # Clear removes the conversation
+    backend.append(key, [HumanMessage(content="hello again")])
+    backend.clear(key)
+    assert backend.get_messages(key, 10) == []
+    assert client.ttl(redis_key) == -2
+    print("✓ Clear")
+
+    stats = backend.get_stats()
+    assert stats['backend'] == 'redis' and stats['appends'] == 6
+    print("✓ Stats")
+
+
+if __name__ == "__main__":
+    test_redis_memory_backend()
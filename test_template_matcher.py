@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test the Aho-Corasick response template matcher against the regex matching it replaced
+(in-memory SQLite database, no server needed)
+"""
+import sys
+import os
+import re
+import json
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from models import db, ResponseTemplate
+from template_matcher import TemplateMatcher
+
+TEMPLATES = [
+    # name, priority, trigger keywords
+    ("refund", 10, ["refund", "money back"]),
+    ("pricing", 5, ["price", "how much does it cost to subscribe"]),
+    ("cpp", 5, ["c++", "hi!"]),
+    ("greeting", 1, ["hello there", "good morning"]),
+    ("account", 1, ["account", "log_in"]),
+    ("inactive", 20, ["refund"]),
+]
+
+QUESTIONS = [
+    "I want a refund",
+    "Refunds please",                                      # no word boundary after "refund"
+    "refund?",
+    "Can you give me my money back",
+    "can you tell me how the refund process works today",  # long question with a common starter
+    "what is the price",
+    "what is the price of the premium plan please",       # short keyword skipped, no long keyword
+    "How much does it cost to subscribe monthly?",
+    "pricey",
+    "I love c++ templates",
+    "c++",
+    "hi!",
+    "hi!there",
+    "oh hi! how are you",
+    "Good morning, hello there",
+    "my account",
+    "accounts",
+    "how to log_in",
+    "login",
+    "nothing to see here",
+    "",
+]
+
+
+def legacy_match(question):
+    """The regex matcher RAGChain.check_response_templates used before the automaton"""
+    question_lower = question.lower().strip()
+    templates = ResponseTemplate.query.filter_by(is_active=True).order_by(
+        ResponseTemplate.priority.desc(), ResponseTemplate.id.asc()
+    ).all()
+    for template in templates:
+        for keyword in json.loads(template.trigger_keywords):
+            keyword_lower = keyword.lower().strip()
+            if len(keyword_lower.split()) <= 2:
+                if re.search(r'\b' + re.escape(keyword_lower) + r'\b', question_lower):
+                    common_starters = ['can you', 'how to', 'how do', 'what is', 'tell me', 'explain']
+                    if any(starter in question_lower for starter in common_starters) and len(question_lower.split()) >= 6:
+                        continue
+                    return template.name
+            elif keyword_lower in question_lower:
+                return template.name
+    return None
+
+
+def test_template_matcher():
+    """Every question matches the same template as with the regex matcher; invalidate() picks up changes"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+
+    print("Testing response template matcher")
+    print("=" * 50)
+
+    with app.app_context():
+        db.create_all()
+        for name, priority, keywords in TEMPLATES:
+            db.session.add(ResponseTemplate(name=name, priority=priority, trigger_keywords=json.dumps(keywords),
+                                            template_text=f"{name} answer", is_active=name != 'inactive'))
+        db.session.commit()
+
+        matcher = TemplateMatcher(check_interval_seconds=3600)
+        for question in QUESTIONS:
+            match = matcher.match(question)
+            expected = legacy_match(question)
+            assert (match['name'] if match else None) == expected, (question, match, expected)
+        assert matcher.builds == 1
+        print(f"✓ {len(QUESTIONS)} questions match like the regex matcher")
+
+        # Priority decides between templates, regardless of where the keywords appear
+        assert matcher.match("account refund")['name'] == 'refund'
+        assert matcher.match("account refund")['keyword'] == 'refund'
+        print("✓ Highest priority template wins")
+
+        # Changes are picked up after invalidate()
+        template = ResponseTemplate.query.filter_by(name='inactive').first()
+        template.is_active = True
+        db.session.commit()
+        assert matcher.match("I want a refund")['name'] == 'refund'
+        matcher.invalidate()
+        assert matcher.match("I want a refund")['name'] == 'inactive'
+        assert matcher.builds == 2
+        print("✓ Rebuilt after invalidate()")
+
+
+if __name__ == "__main__":
+    test_template_matcher()
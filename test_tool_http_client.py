@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test the in-process curl command parser and request builder (no network needed)
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from tool_http_client import ToolHttpClient, CurlCommandError, parse_curl_command
+
+
+def test_build_request():
+    """Options, shell quoting and placeholder filling produce the request the shell command sent"""
+    client = ToolHttpClient(timeout_seconds=30, connect_timeout_seconds=10)
+
+    print("Testing curl command parsing")
+    print("=" * 50)
+
+    # -X, -H and -d with shell quoting; placeholders are filled into the body as they are
+    request = client.build_request(
+        """curl -X post 'https://api.example.com/v1/users/{user_id}' -H "Authorization: Bearer {token}" """
+        """-H 'Content-Type: application/json' -d '{"email": "{email}", "note": "it'"'"'s me"}'""",
+        {'user_id': 42, 'token': 'abc', 'email': 'a+b@example.com'}
+    )
+    assert request['method'] == 'POST'
+    assert request['url'] == 'https://api.example.com/v1/users/42'
+    assert request['headers'] == {'Authorization': 'Bearer abc', 'Content-Type': 'application/json'}
+    assert request['data'] == b'{"email": "a+b@example.com", "note": "it\'s me"}'
+    print("✓ -X, -H, -d and quoting")
+
+    # --data-urlencode encodes the filled-in value, not the placeholder
+    request = client.build_request(
+        "curl https://api.example.com/search --data-urlencode 'q={question}' -d 'lang=en' --data-urlencode '=a b'",
+        {'question': 'where is my order #12?'}
+    )
+    assert request['method'] == 'POST'
+    assert request['data'] == b'q=where%20is%20my%20order%20%2312%3F&lang=en&a%20b'
+    assert request['headers'] == {'Content-Type': 'application/x-www-form-urlencoded'}
+    print("✓ --data-urlencode after filling")
+
+    # -G moves the data into the query string; placeholders in the URL are filled raw
+    request = client.build_request(
+        "curl -sSLG 'https://api.example.com/items?type={kind}' --data-urlencode 'q={question}'",
+        {'kind': 'book', 'question': 'a&b'}
+    )
+    assert request['method'] == 'GET' and request['data'] is None
+    assert request['url'] == 'https://api.example.com/items?type=book&q=a%26b'
+    assert request['allow_redirects'] is True
+    print("✓ -G and combined short flags")
+
+    # -u, --json, timeouts and ignored output options
+    request = client.build_request(
+        "curl -u '{user}:{password}' --json '{\"id\": {id}}' -m 5 -o /dev/null -w '%{http_code}' api.example.com",
+        {'user': 'bot', 'password': 's3cret', 'id': 7}
+    )
+    assert request['auth'] == ('bot', 's3cret')
+    assert request['url'] == 'http://api.example.com'
+    assert request['data'] == b'{"id": 7}'
+    assert request['headers']['Content-Type'] == 'application/json'
+    assert request['timeout'] == (5, 5)
+    print("✓ -u, --json, timeouts and ignored options")
+
+    # Parsed commands are cached; unsupported commands are rejected
+    parse_curl_command.cache_clear()
+    client.build_request("curl https://api.example.com/{a}", {'a': 1})
+    client.build_request("curl https://api.example.com/{a}", {'a': 2})
+    assert parse_curl_command.cache_info().hits == 1
+    for command in ("wget https://example.com", "curl -d @body.json https://example.com",
+                    "curl --upload-file x https://example.com", "curl 'https://example.com", "curl -X"):
+        try:
+            client.build_request(command)
+        except CurlCommandError:
+            continue
+        raise AssertionError(f"Expected CurlCommandError for {command}")
+    print("✓ Parse cache and rejected commands")
+
+
+if __name__ == "__main__":
+    test_build_request()
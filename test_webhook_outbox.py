@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test the webhook outbox: claiming, retries with backoff, stale claims and batching
+(in-memory SQLite database, deliveries are recorded instead of sent)
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from models import db, WebhookConfig, WebhookDelivery
+from webhook_manager import webhook_manager
+from webhook_outbox import WebhookOutbox
+
+
+class RecordingDeliver:
+    """Stands in for WebhookManager.deliver: records payloads and answers with scripted status codes"""
+
+    def __init__(self):
+        self.sent = []
+        self.status_codes = {}
+
+    def __call__(self, config, payload):
+        self.sent.append((config.name, payload))
+        codes = self.status_codes.get(config.name) or [200]
+        status_code = codes.pop(0) if len(codes) > 1 else codes[0]
+        success = status_code < 400
+        return {'success': success, 'status_code': status_code, 'error': None if success else f'HTTP {status_code}'}
+
+
+def make_due(deliveries):
+    """Move pending deliveries' next attempt (backoff or batch window) into the past"""
+    for delivery in deliveries:
+        delivery.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_webhook_outbox():
+    """Deliveries are claimed once, retried with backoff until retry_count is used up, and batched in order"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    deliver = RecordingDeliver()
+    webhook_manager.deliver = deliver
+    outbox = WebhookOutbox(base_backoff_seconds=2, max_backoff_seconds=300, stale_claim_seconds=300)
+
+    print("Testing webhook outbox")
+    print("=" * 50)
+
+    with app.app_context():
+        db.create_all()
+        plain = WebhookConfig(name='plain', provider='custom', webhook_url='http://example.invalid/plain',
+                              event_types='["new_message"]', retry_count=2)
+        batched = WebhookConfig(name='batched', provider='custom', webhook_url='http://example.invalid/batched',
+                                event_types='["new_message"]', retry_count=0, batch_enabled=True,
+                                batch_window_seconds=60, batch_max_events=3)
+        db.session.add_all([plain, batched])
+        db.session.commit()
+
+        # Only event types the webhook takes are queued; nothing is sent before the caller commits
+        assert outbox.enqueue(plain, 'session_created', {'i': 0}) is None
+        delivery = outbox.enqueue(plain, 'new_message', {'i': 1})
+        db.session.rollback()
+        assert WebhookDelivery.query.count() == 0
+        assert outbox.process_due() == 0
+        delivery = outbox.enqueue(plain, 'new_message', {'i': 1})
+        db.session.commit()
+
+        # A claimed delivery can't be claimed a second time
+        assert outbox._claim(delivery.id, datetime.utcnow())
+        assert not outbox._claim(delivery.id, datetime.utcnow())
+        db.session.rollback()
+        print("✓ Enqueue in the caller's transaction and claim once")
+
+        # Failures are retried with exponential backoff, then given up after retry_count retries
+        deliver.status_codes['plain'] = [500, 502, 503]
+        backoffs = []
+        for attempt in range(1, 4):
+            assert outbox.process_due() == 1
+            delivery = db.session.get(WebhookDelivery, delivery.id)
+            assert delivery.attempts == attempt and delivery.last_status_code in (500, 502, 503)
+            if attempt < 3:
+                assert delivery.status == 'pending'
+                backoffs.append(round((delivery.next_attempt_at - datetime.utcnow()).total_seconds()))
+                assert outbox.process_due() == 0  # Not due again yet
+                make_due([delivery])
+        assert delivery.status == 'failed'
+        assert backoffs == [2, 4], backoffs
+        assert outbox.retried == 2 and outbox.failed == 1
+        print("✓ Exponential backoff and giving up")
+
+        # A claim left behind by a worker that died is released once stale, then delivered
+        deliver.status_codes['plain'] = [200]
+        delivery = outbox.enqueue(plain, 'new_message', {'i': 2})
+        db.session.commit()
+        delivery.status = 'sending'
+        delivery.locked_at = datetime.utcnow() - timedelta(seconds=301)
+        db.session.commit()
+        assert outbox.process_due() == 1
+        assert db.session.get(WebhookDelivery, delivery.id).status == 'delivered'
+        assert db.session.get(WebhookConfig, plain.id).last_used is not None
+        print("✓ Stale claims are released")
+
+        # Batched events wait for their window, or go out as soon as batch_max_events are waiting
+        deliver.sent.clear()
+        for i in range(2):
+            outbox.enqueue(batched, 'new_message', {'i': i})
+        db.session.commit()
+        assert outbox.process_due() == 0
+        for i in range(2, 5):
+            outbox.enqueue(batched, 'new_message', {'i': i})
+        db.session.commit()
+        assert outbox.process_due() == 3
+        assert outbox.process_due() == 0
+        name, payload = deliver.sent[0]
+        assert name == 'batched' and payload['event_type'] == 'batch' and payload['count'] == 3
+        assert [event['payload']['data']['i'] for event in payload['events']] == [0, 1, 2]
+
+        make_due(WebhookDelivery.query.filter_by(status='pending').all())
+        assert outbox.process_due() == 2
+        assert [event['payload']['data']['i'] for event in deliver.sent[1][1]['events']] == [3, 4]
+        assert WebhookDelivery.query.filter_by(webhook_config_id=batched.id, status='delivered').count() == 5
+        print("✓ Batches in order, by size and by window")
+
+
+if __name__ == "__main__":
+    test_webhook_outbox()
@@ -0,0 +1,337 @@
+"""
+In-process HTTP execution of stored curl commands.
+
+API tools (and API rules) are configured as curl commands with {placeholder} values. Instead of
+running them through a shell, the command is parsed once into a request template; placeholders are
+filled into the parsed URL, headers and body, and the request is sent on a pooled keep-alive
+requests.Session. Timeouts come from the command's --max-time/--connect-timeout (or the defaults),
+and response bodies are capped in size.
+"""
+
+import os
+import shlex
+import logging
+import threading
+from functools import lru_cache
+from typing import Dict, List, Any, Optional
+from urllib.parse import quote
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class CurlCommandError(ValueError):
+    """The curl command can't be converted to an HTTP request"""
+
+
+class ResponseTooLarge(Exception):
+    """The response body is larger than the configured cap"""
+
+
+# Options that take a value, by every spelling
+_VALUE_OPTIONS = {
+    '-X': 'method', '--request': 'method',
+    '-H': 'header', '--header': 'header',
+    '-d': 'data', '--data': 'data', '--data-raw': 'data', '--data-binary': 'data', '--data-ascii': 'data',
+    '--data-urlencode': 'data_urlencode',
+    '--json': 'json',
+    '-u': 'user', '--user': 'user',
+    '-A': 'user_agent', '--user-agent': 'user_agent',
+    '-b': 'cookie', '--cookie': 'cookie',
+    '-e': 'referer', '--referer': 'referer',
+    '-m': 'max_time', '--max-time': 'max_time',
+    '--connect-timeout': 'connect_timeout',
+    '--url': 'url',
+    # Output, retry and transport tuning options: the value is skipped, they don't change the request
+    '-o': None, '--output': None, '-w': None, '--write-out': None, '-D': None, '--dump-header': None,
+    '-c': None, '--cookie-jar': None, '--stderr': None, '--trace': None, '--trace-ascii': None,
+    '--retry': None, '--retry-delay': None, '--retry-max-time': None, '--max-redirs': None,
+    '--limit-rate': None, '-y': None, '--speed-time': None, '-Y': None, '--speed-limit': None,
+}
+
+# Options without a value; output/verbosity options have no meaning in-process
+_FLAG_OPTIONS = {
+    '-k': 'insecure', '--insecure': 'insecure',
+    '-L': 'location', '--location': 'location',
+    '-G': 'get', '--get': 'get',
+    '-I': 'head', '--head': 'head',
+    '-f': 'fail', '--fail': 'fail', '--fail-with-body': 'fail',
+    '-s': None, '--silent': None, '-S': None, '--show-error': None,
+    '-v': None, '--verbose': None, '--compressed': None, '-i': None, '--include': None,
+    '-#': None, '--progress-bar': None, '--no-progress-meter': None, '-N': None, '--no-buffer': None,
+    '-g': None, '--globoff': None, '-4': None, '--ipv4': None, '-6': None, '--ipv6': None,
+    '--http1.0': None, '--http1.1': None, '--http2': None, '--tcp-nodelay': None, '--no-keepalive': None,
+    '--retry-connrefused': None, '--retry-all-errors': None, '--path-as-is': None,
+}
+
+
+@lru_cache(maxsize=256)
+def parse_curl_command(curl_command: str) -> Dict[str, Any]:
+    """Parse a curl command into a request template (cached and shared, do not modify)"""
+    try:
+        # Allow commands copied with shell line continuations
+        args = shlex.split(curl_command.replace('\\\r\n', ' ').replace('\\\n', ' '))
+    except ValueError as e:
+        raise CurlCommandError(f"Invalid curl command: {e}")
+    if not args or args[0] != 'curl':
+        raise CurlCommandError("Invalid command: Only curl commands are allowed")
+
+    parsed = {
+        'method': None, 'url': None, 'headers': [], 'data': [], 'json': None, 'auth': None,
+        'verify': True, 'allow_redirects': False, 'get': False, 'head': False, 'fail': False,
+        'timeout': None, 'connect_timeout': None
+    }
+
+    i = 1
+    while i < len(args):
+        arg = args[i]
+        if arg.startswith('--'):
+            option, sep, value = arg.partition('=')
+            options = [(option, value if sep else None)]
+        elif arg.startswith('-') and len(arg) > 1:
+            # Short options can be combined (-sSL) and take their value attached (-XPOST) or as the next argument
+            options = []
+            for position, char in enumerate(arg[1:], start=1):
+                option = f"-{char}"
+                if option in _VALUE_OPTIONS:
+                    options.append((option, arg[position + 1:] or None))
+                    break
+                options.append((option, None))
+        else:
+            if parsed['url'] is not None:
+                raise CurlCommandError(f"Only one URL is supported, got '{parsed['url']}' and '{arg}'")
+            parsed['url'] = arg
+            i += 1
+            continue
+
+        for option, value in options:
+            if option in _VALUE_OPTIONS:
+                if value is None:
+                    i += 1
+                    if i >= len(args):
+                        raise CurlCommandError(f"Missing value for curl option {option}")
+                    value = args[i]
+                _apply_value_option(parsed, _VALUE_OPTIONS[option], value)
+            elif option in _FLAG_OPTIONS:
+                _apply_flag_option(parsed, _FLAG_OPTIONS[option])
+            else:
+                raise CurlCommandError(f"Unsupported curl option: {option}")
+        i += 1
+
+    if not parsed['url']:
+        raise CurlCommandError("No URL in curl command")
+    if '://' not in parsed['url']:
+        parsed['url'] = f"http://{parsed['url']}"  # Same default scheme as curl
+
+    if parsed['method'] is None:
+        if parsed['head']:
+            parsed['method'] = 'HEAD'
+        elif (parsed['data'] or parsed['json'] is not None) and not parsed['get']:
+            parsed['method'] = 'POST'
+        else:
+            parsed['method'] = 'GET'
+    return parsed
+
+
+def _apply_flag_option(parsed: Dict[str, Any], name: Optional[str]) -> None:
+    if name == 'insecure':
+        parsed['verify'] = False
+    elif name == 'location':
+        parsed['allow_redirects'] = True
+    elif name in ('get', 'head', 'fail'):
+        parsed[name] = True
+
+
+def _apply_value_option(parsed: Dict[str, Any], name: Optional[str], value: str) -> None:
+    if name == 'method':
+        parsed['method'] = value.upper()
+    elif name == 'header':
+        header_name, _, header_value = value.partition(':')
+        parsed['headers'].append((header_name.strip(), header_value.strip()))
+    elif name in ('data', 'data_urlencode'):
+        if value.startswith('@'):
+            raise CurlCommandError("Reading request data from files (@file) is not supported")
+        # --data-urlencode parts are kept raw and encoded after the placeholders are filled
+        parsed['data'].append((value, name == 'data_urlencode'))
+    elif name == 'json':
+        parsed['json'] = value
+    elif name == 'user':
+        username, _, password = value.partition(':')
+        parsed['auth'] = (username, password)
+    elif name == 'user_agent':
+        parsed['headers'].append(('User-Agent', value))
+    elif name == 'cookie':
+        parsed['headers'].append(('Cookie', value))
+    elif name == 'referer':
+        parsed['headers'].append(('Referer', value))
+    elif name in ('max_time', 'connect_timeout'):
+        try:
+            seconds = float(value)
+        except ValueError:
+            raise CurlCommandError(f"Invalid timeout value: {value}")
+        parsed['timeout' if name == 'max_time' else 'connect_timeout'] = seconds
+    elif name == 'url':
+        parsed['url'] = value
+
+
+def _fill(text: Optional[str], substitutions: Dict[str, str]) -> Optional[str]:
+    """Replace {placeholder} values in text, as they are (the same substitution the shell command had)"""
+    if not text or '{' not in text:
+        return text
+    for key, value in substitutions.items():
+        placeholder = f"{{{key}}}"
+        if placeholder in text:
+            text = text.replace(placeholder, value)
+    return text
+
+
+def _data_part(part: tuple, substitutions: Dict[str, str]) -> str:
+    """Fill one -d/--data-urlencode part; like curl, --data-urlencode encodes the content after a '='"""
+    value, urlencode = part
+    if not urlencode:
+        return _fill(value, substitutions)
+    key, sep, content = value.partition('=')
+    if not sep:
+        return quote(_fill(value, substitutions), safe='')
+    content = quote(_fill(content, substitutions), safe='')
+    return f"{key}={content}" if key else content
+
+
+def _response_encoding(response: requests.Response) -> str:
+    """Charset declared by the response, else UTF-8 (requests assumes ISO-8859-1 for text/* without one)"""
+    if 'charset=' in response.headers.get('Content-Type', '').lower() and response.encoding:
+        return response.encoding
+    return 'utf-8'
+
+
+class ToolHttpClient:
+    """Executes parsed curl commands on a pooled keep-alive HTTP session"""
+
+    def __init__(self, timeout_seconds: float = 30, connect_timeout_seconds: float = 10,
+                 max_response_bytes: int = 1024 * 1024, pool_connections: int = 10, pool_maxsize: int = 10):
+        self.timeout_seconds = timeout_seconds
+        self.connect_timeout_seconds = connect_timeout_seconds
+        self.max_response_bytes = max_response_bytes
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+        self.requests = 0
+        self.errors = 0
+        self.logger = logging.getLogger(__name__)
+
+    def _get_session(self) -> requests.Session:
+        # One session (with per-host connection pools) per process: gunicorn workers don't share sockets
+        if self._session is not None and self._session_pid == os.getpid():
+            return self._session
+        with self._lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+                self._session_pid = os.getpid()
+            return self._session
+
+    def build_request(self, curl_command: str, substitutions: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Fill placeholders into the parsed curl command; returns requests.request() keyword arguments"""
+        template = parse_curl_command(curl_command)
+        values = {key: str(value) for key, value in (substitutions or {}).items()}
+
+        # Values go into the URL unencoded, as the shell command had them; requests percent-encodes
+        # characters that can't appear in a URL (spaces, non-ASCII) and leaves / ? & = as given
+        url = _fill(template['url'], values)
+        headers = {name: _fill(value, values) for name, value in template['headers']}
+        data = '&'.join(_data_part(part, values) for part in template['data']) if template['data'] else None
+
+        if template['json'] is not None:
+            data = _fill(template['json'], values)
+            headers.setdefault('Content-Type', 'application/json')
+            headers.setdefault('Accept', 'application/json')
+        elif data is not None and template['get']:
+            # -G sends the data as the query string
+            url = f"{url}{'&' if '?' in url else '?'}{data}"
+            data = None
+        elif data is not None and not any(name.lower() == 'content-type' for name in headers):
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        total = template['timeout'] or self.timeout_seconds
+        connect = min(template['connect_timeout'] or self.connect_timeout_seconds, total)
+        return {
+            'method': template['method'],
+            'url': url,
+            'headers': headers,
+            'data': data.encode('utf-8') if data is not None else None,
+            'auth': tuple(_fill(part, values) for part in template['auth']) if template['auth'] else None,
+            'verify': template['verify'],
+            'allow_redirects': template['allow_redirects'],
+            'timeout': (connect, total),
+            'fail': template['fail']
+        }
+
+    def execute(self, curl_command: str, substitutions: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Run a curl command in-process.
+
+        Returns {'success', 'status_code', 'text'} or {'success': False, 'error'}. Like curl, HTTP
+        error statuses only count as failures when the command uses -f/--fail.
+        """
+        self.requests += 1
+        try:
+            kwargs = self.build_request(curl_command, substitutions)
+        except CurlCommandError as e:
+            self.errors += 1
+            return {'success': False, 'error': str(e)}
+
+        fail_on_error = kwargs.pop('fail')
+        try:
+            with self._get_session().request(stream=True, **kwargs) as response:
+                body = self._read_capped(response)
+                text = body.decode(_response_encoding(response), errors='replace')
+        except ResponseTooLarge:
+            self.errors += 1
+            return {'success': False, 'error': f'Response exceeded {self.max_response_bytes} bytes'}
+        except requests.exceptions.Timeout:
+            self.errors += 1
+            return {'success': False, 'error': f'Request timed out after {kwargs["timeout"][1]:g} seconds'}
+        except requests.exceptions.RequestException as e:
+            self.errors += 1
+            self.logger.error(f"Error executing curl command as HTTP request: {e}")
+            return {'success': False, 'error': f'Request failed: {str(e)}'}
+
+        if fail_on_error and response.status_code >= 400:
+            self.errors += 1
+            return {'success': False, 'status_code': response.status_code,
+                    'error': f'HTTP {response.status_code}', 'text': text}
+        return {'success': True, 'status_code': response.status_code, 'text': text}
+
+    def _read_capped(self, response: requests.Response) -> bytes:
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > self.max_response_bytes:
+            raise ResponseTooLarge()
+        chunks: List[bytes] = []
+        size = 0
+        for chunk in response.iter_content(chunk_size=16384):
+            size += len(chunk)
+            if size > self.max_response_bytes:
+                raise ResponseTooLarge()
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'timeout_seconds': self.timeout_seconds,
+            'max_response_bytes': self.max_response_bytes,
+            'parsed_commands_cached': parse_curl_command.cache_info().currsize
+        }
+
+
+# Global tool HTTP client instance
+tool_http_client = ToolHttpClient(
+    timeout_seconds=float(os.environ.get('TOOL_HTTP_TIMEOUT_SECONDS', 30)),
+    connect_timeout_seconds=float(os.environ.get('TOOL_HTTP_CONNECT_TIMEOUT_SECONDS', 10)),
+    max_response_bytes=int(os.environ.get('TOOL_HTTP_MAX_RESPONSE_BYTES', 1024 * 1024)),
+    pool_maxsize=int(os.environ.get('TOOL_HTTP_POOL_SIZE', 10))
+)
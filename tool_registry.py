@@ -0,0 +1,104 @@
+"""
+Versioned in-memory registry of the active AI tools.
+
+Holds prebuilt OpenAI function specs and tool definitions by name, so tool selection and execution
+don't query ApiTool on every question. The registry is rebuilt only when tools change: immediately
+after the /ai_tools routes call invalidate(), and in other workers when the tools' count or last
+update time changes.
+"""
+
+import os
+import logging
+import threading
+import time
+from typing import Dict, List, Any, Optional
+from models import ApiTool, db
+
+
+class ToolRegistry:
+    """Catalog of active API tools, rebuilt (with a new version) whenever the tools change"""
+
+    def __init__(self, check_interval_seconds: int = 30):
+        self.check_interval_seconds = check_interval_seconds
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._signature = None
+        self._checked_at = 0.0
+        self.version = 0
+        self.logger = logging.getLogger(__name__)
+
+    def _db_signature(self) -> tuple:
+        count, last_update = db.session.query(
+            db.func.count(ApiTool.id), db.func.max(ApiTool.updated_at)
+        ).one()
+        return count, last_update
+
+    def _build(self, signature: tuple) -> None:
+        tools = ApiTool.query.filter_by(active=True).order_by(ApiTool.priority.desc()).all()
+
+        tools_by_name = {}
+        functions = []
+        for tool in tools:
+            tools_by_name[tool.name] = {
+                'id': tool.id,
+                'name': tool.name,
+                'description': tool.description,
+                'curl_command': tool.curl_command,
+                'response_mapping': tool.get_response_mapping(),
+                'response_template': tool.response_template,
+                'priority': tool.priority,
+                'cache_ttl_seconds': tool.cache_ttl_seconds or 0
+            }
+            functions.append({
+                "type": "function",
+                "function": tool.get_openai_function_spec()
+            })
+
+        self.version += 1
+        self._snapshot = {'version': self.version, 'tools': tools_by_name, 'functions': functions}
+        self._signature = signature
+        self.logger.info(f"Built tool registry v{self.version}: {len(functions)} active tools")
+
+    def _get_snapshot(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        if snapshot is not None and time.time() - self._checked_at < self.check_interval_seconds:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and time.time() - self._checked_at < self.check_interval_seconds:
+                return self._snapshot
+            signature = self._db_signature()
+            if self._snapshot is None or signature != self._signature:
+                self._build(signature)
+            self._checked_at = time.time()
+            return self._snapshot
+
+    def get_functions(self) -> List[Dict[str, Any]]:
+        """OpenAI function calling specs of all active tools (shared, do not modify)"""
+        return self._get_snapshot()['functions']
+
+    def get_tool(self, name: str) -> Optional[Dict[str, Any]]:
+        """Active tool definition by function name, or None"""
+        return self._get_snapshot()['tools'].get(name)
+
+    def get_tools(self) -> List[Dict[str, Any]]:
+        """Active tool definitions, highest priority first"""
+        return list(self._get_snapshot()['tools'].values())
+
+    def invalidate(self) -> None:
+        """Rebuild on next use (call after tools are created, updated, deleted or toggled)"""
+        with self._lock:
+            self._snapshot = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            'version': self.version,
+            'tools': len(snapshot['functions']) if snapshot else None,
+            'check_interval_seconds': self.check_interval_seconds
+        }
+
+
+# Global tool registry instance
+tool_registry = ToolRegistry(
+    check_interval_seconds=int(os.environ.get('TOOL_REGISTRY_CHECK_SECONDS', 30))
+)
@@ -0,0 +1,80 @@
+"""
+Per-worker TTL cache for AI tool responses.
+
+Tools with a cache_ttl_seconds greater than zero (read-only lookups such as balances or statuses)
+have their successful results reused for the same user, tool version and resolved arguments until
+the TTL expires. The cache is bounded and evicts the least recently used entries.
+"""
+
+import os
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+class ToolResponseCache:
+    """LRU cache of successful tool results with a per-entry expiry"""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (stored_at, expires_at, result)
+        self._entries: "OrderedDict[tuple, Tuple[float, float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def make_key(tool_name: str, registry_version: int, arguments: Dict[str, Any], scope: str) -> tuple:
+        """Cache key: tool (at this registry version), resolved arguments and the user or session scope"""
+        return tool_name, registry_version, json.dumps(arguments, sort_keys=True, default=str), scope
+
+    def get(self, key: tuple) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (result, age_seconds) if the key is cached and not expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2], now - entry[0]
+
+    def set(self, key: tuple, result: Dict[str, Any], ttl_seconds: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (now, now + ttl_seconds, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions
+        }
+
+
+# Global tool response cache instance
+tool_response_cache = ToolResponseCache(
+    max_entries=int(os.environ.get('TOOL_CACHE_MAX_ENTRIES', 1000))
+)
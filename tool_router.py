@@ -0,0 +1,187 @@
+"""
+Local embedding pre-router for AI tool selection.
+
+The name, description and parameter descriptions of every active tool are embedded once per tool
+registry version. Each question is scored against them with a NumPy cosine similarity, and only
+questions that come close enough to some tool go on to the gpt-4o function calling round trip.
+
+Follow-ups are routed with their context: the question is also scored together with the last turns of
+the conversation (so "and for last month?" after a balance question still reaches the tool), and a
+question answered right after a tool response or a clarification question always escalates.
+
+The default threshold of 0.78 is tuned for text-embedding-ada-002, whose cosine similarities are
+compressed into roughly 0.7-1.0: unrelated sentences usually score about 0.70-0.76 and a question
+about what a tool describes 0.80 or more. Set TOOL_ROUTER_MIN_SIMILARITY lower if tool questions are
+answered from the knowledge base (the router logs every score), or higher to skip more calls.
+"""
+
+import os
+import logging
+import threading
+import numpy as np
+from typing import Dict, List, Any, Optional, Tuple
+from openai import OpenAI
+from rag_cache import embedding_cache
+from tool_registry import tool_registry
+
+# Assistant turns after which the next message is treated as a reply to a tool (clarification
+# questions are returned through the tool path and stored with the same response type)
+TOOL_RESPONSE_TYPES = {'AI_TOOL'}
+
+
+class ToolRouter:
+    """Decides locally whether a question is worth sending to OpenAI function calling"""
+
+    def __init__(self, min_similarity: float = 0.78, embedding_model: str = "text-embedding-ada-002", enabled: bool = True,
+                 context_turns: int = 2):
+        self.min_similarity = min_similarity
+        self.context_turns = context_turns
+        self.embedding_model = embedding_model
+        self.enabled = enabled
+        self._client = None
+        self._lock = threading.Lock()
+        # (registry version, tool names, unit vectors with one row per tool), replaced as a whole so
+        # readers never pair the names of one registry version with the rows of another
+        self._current: Optional[Tuple[Any, List[str], Optional[np.ndarray]]] = None
+        self.escalated = 0
+        self.follow_ups = 0
+        self.skipped = 0
+        self.errors = 0
+        self.logger = logging.getLogger(__name__)
+
+    def _get_client(self) -> OpenAI:
+        if self._client is None:
+            api_key = os.environ.get("OPENAI_API_KEY")
+            self._client = OpenAI(api_key=api_key.strip() if api_key else None)
+        return self._client
+
+    def _embed(self, texts: List[str], known: List[Optional[List[float]]] = None) -> np.ndarray:
+        """Embed texts (through the shared embedding cache) as unit row vectors
+
+        known optionally holds embeddings the caller already has, aligned with texts (None = look up).
+        """
+        known = known or [None] * len(texts)
+        vectors = [vector if vector is not None else embedding_cache.get(text, self.embedding_model)
+                   for text, vector in zip(texts, known)]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            response = self._get_client().embeddings.create(
+                model=self.embedding_model,
+                input=[texts[i] for i in missing]
+            )
+            for i, item in zip(missing, response.data):
+                vectors[i] = item.embedding
+                embedding_cache.set(texts[i], self.embedding_model, item.embedding)
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    @staticmethod
+    def _tool_text(function_spec: Dict[str, Any]) -> str:
+        """Text that represents a tool for routing: name, description and parameter descriptions"""
+        parts = [function_spec.get('name', '').replace('_', ' '), function_spec.get('description', '')]
+        properties = (function_spec.get('parameters') or {}).get('properties') or {}
+        for name, schema in properties.items():
+            description = schema.get('description') if isinstance(schema, dict) else None
+            parts.append(f"{name}: {description}" if description else name)
+        return "\n".join(part for part in parts if part)
+
+    def _get_tool_matrix(self, functions: List[Dict[str, Any]]) -> Tuple[List[str], Optional[np.ndarray]]:
+        # tool_registry.get_functions() refreshes the registry, so its version is current here
+        version = tool_registry.version
+        current = self._current
+        if current is None or current[0] != version:
+            with self._lock:
+                current = self._current
+                if current is None or current[0] != version:
+                    specs = [function['function'] for function in functions]
+                    names = [spec['name'] for spec in specs]
+                    matrix = self._embed([self._tool_text(spec) for spec in specs]) if specs else None
+                    current = self._current = (version, names, matrix)
+                    self.logger.info(f"Embedded {len(specs)} tools for routing (registry v{version})")
+        return current[1], current[2]
+
+    def _with_context(self, question: str, conversation_history: List[Dict[str, Any]] = None) -> Optional[str]:
+        """The question preceded by the last context_turns messages, or None without history"""
+        recent = [message.get('content') or '' for message in (conversation_history or [])[-self.context_turns:]]
+        recent = [content[:500] for content in recent if content]
+        if not recent or self.context_turns <= 0:
+            return None
+        return "\n".join(recent + [question])
+
+    @staticmethod
+    def follows_tool_turn(conversation_history: List[Dict[str, Any]] = None) -> bool:
+        """True if the last assistant message was a tool response or a clarification question"""
+        for message in reversed(conversation_history or []):
+            if message.get('role') == 'assistant':
+                return message.get('response_type') in TOOL_RESPONSE_TYPES
+        return False
+
+    def score(self, question: str, functions: List[Dict[str, Any]], conversation_history: List[Dict[str, Any]] = None,
+              question_embedding: List[float] = None) -> Tuple[Optional[str], float]:
+        """Return the closest tool and its cosine similarity to the question (alone or with its recent context)
+
+        Pass question_embedding when the question has already been embedded for retrieval.
+        """
+        names, matrix = self._get_tool_matrix(functions)
+        if matrix is None:
+            return None, 0.0
+        texts = [question]
+        with_context = self._with_context(question, conversation_history)
+        if with_context:
+            texts.append(with_context)
+        known = [question_embedding] + [None] * (len(texts) - 1)
+        similarities = (self._embed(texts, known) @ matrix.T).max(axis=0)
+        best = int(np.argmax(similarities))
+        return names[best], float(similarities[best])
+
+    def should_escalate(self, question: str, functions: List[Dict[str, Any]], conversation_history: List[Dict[str, Any]] = None,
+                        question_embedding: List[float] = None) -> bool:
+        """True if the question should go to OpenAI function calling"""
+        if not self.enabled:
+            return True
+        if self.follows_tool_turn(conversation_history):
+            # Replies to a tool answer or clarification ("yes", "the second one") rarely resemble any tool
+            self.follow_ups += 1
+            self.logger.info("Tool router: follow-up to a tool response - escalating to function calling")
+            return True
+        try:
+            tool_name, similarity = self.score(question, functions, conversation_history, question_embedding)
+        except Exception as e:
+            # Routing is only an optimization: let function calling decide
+            self.errors += 1
+            self.logger.error(f"Error routing question to tools: {e}")
+            return True
+
+        if similarity >= self.min_similarity:
+            self.escalated += 1
+            self.logger.info(f"Tool router: '{tool_name}' similarity {similarity:.3f} - escalating to function calling")
+            return True
+
+        self.skipped += 1
+        self.logger.info(f"Tool router: best tool '{tool_name}' similarity {similarity:.3f} < {self.min_similarity} - skipping function calling")
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        current = self._current
+        return {
+            'enabled': self.enabled,
+            'min_similarity': self.min_similarity,
+            'tools': len(current[1]) if current else 0,
+            'registry_version': current[0] if current else None,
+            'context_turns': self.context_turns,
+            'escalated': self.escalated,
+            'follow_ups': self.follow_ups,
+            'skipped': self.skipped,
+            'errors': self.errors
+        }
+
+
+# Global tool router instance
+tool_router = ToolRouter(
+    min_similarity=float(os.environ.get('TOOL_ROUTER_MIN_SIMILARITY', 0.78)),
+    enabled=os.environ.get('TOOL_ROUTER_ENABLED', 'true').lower() == 'true',
+    context_turns=int(os.environ.get('TOOL_ROUTER_CONTEXT_TURNS', 2))
+)
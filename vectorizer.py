@@ -162,7 +162,9 @@ class DocumentVectorizer:
         index_path = os.path.join(index_folder, 'index.faiss')
         metadata_path = os.path.join(index_folder, 'metadata.json')
         
-        faiss.write_index(index, index_path)
+        # Write to temporary files first and swap them in, so workers
+        # reading the index never see a partially written file
+        faiss.write_index(index, index_path + '.tmp')
         
         # Save metadata
         metadata = {
@@ -173,7 +175,10 @@ class DocumentVectorizer:
             'chunk_overlap': self.chunk_overlap
         }
         
-        with open(metadata_path, 'w', encoding='utf-8') as f:
+        with open(metadata_path + '.tmp', 'w', encoding='utf-8') as f:
             json.dump(metadata, f, indent=2, ensure_ascii=False)
         
+        os.replace(index_path + '.tmp', index_path)
+        os.replace(metadata_path + '.tmp', metadata_path)
+        
         logging.info(f"FAISS index created successfully with {len(all_chunks)} chunks")
@@ -3,22 +3,75 @@ Webhook Manager for Live Chat Integration
 Handles webhook notifications to third-party chat systems like FreshChat, Zendesk, etc.
 """
 
+import os
 import json
 import requests
 import logging
 import hashlib
 import hmac
 import time
+import threading
 from datetime import datetime
 from typing import Dict, Any, List, Optional
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
 from models import WebhookConfig, db
 
 class WebhookManager:
     """Manages webhook integrations for third-party chat systems"""
     
-    def __init__(self):
+    def __init__(self, pool_maxsize: int = 4):
+        self.pool_maxsize = pool_maxsize
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, requests.Session] = {}  # Keep-alive session per destination (scheme://host:port)
+        self._sessions_pid = None
+        self._metrics: Dict[int, Dict[str, Any]] = {}  # Per webhook config id
         self.logger = logging.getLogger(__name__)
     
+    def _get_session(self, url: str) -> requests.Session:
+        """Pooled session for the webhook's destination; connections are reused across deliveries"""
+        parts = urlsplit(url)
+        destination = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            if self._sessions_pid != os.getpid():
+                # Forked worker: don't share the parent's sockets
+                self._sessions = {}
+                self._sessions_pid = os.getpid()
+            session = self._sessions.get(destination)
+            if session is None:
+                session = requests.Session()
+                session.mount(f"{parts.scheme}://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize))
+                self._sessions[destination] = session
+            return session
+    
+    def _record_metrics(self, config: WebhookConfig, result: Dict[str, Any], latency_ms: float) -> None:
+        with self._lock:
+            metrics = self._metrics.setdefault(config.id, {
+                'name': config.name, 'attempts': 0, 'successes': 0, 'failures': 0,
+                'total_latency_ms': 0.0, 'max_latency_ms': 0.0, 'last_latency_ms': None,
+                'last_status_code': None, 'last_error': None, 'last_attempt_at': None
+            })
+            metrics['name'] = config.name
+            metrics['attempts'] += 1
+            metrics['successes' if result['success'] else 'failures'] += 1
+            metrics['total_latency_ms'] += latency_ms
+            metrics['max_latency_ms'] = max(metrics['max_latency_ms'], latency_ms)
+            metrics['last_latency_ms'] = round(latency_ms, 1)
+            metrics['last_status_code'] = result['status_code']
+            metrics['last_error'] = result['error']
+            metrics['last_attempt_at'] = datetime.utcnow().isoformat()
+    
+    def get_metrics(self) -> Dict[int, Dict[str, Any]]:
+        """Per-webhook delivery metrics of this worker: attempts, failures and latency"""
+        with self._lock:
+            metrics = {config_id: dict(values) for config_id, values in self._metrics.items()}
+        for values in metrics.values():
+            values['avg_latency_ms'] = round(values['total_latency_ms'] / values['attempts'], 1) if values['attempts'] else None
+            values['failure_rate'] = round(values['failures'] / values['attempts'], 3) if values['attempts'] else 0.0
+            values['total_latency_ms'] = round(values['total_latency_ms'], 1)
+            values['max_latency_ms'] = round(values['max_latency_ms'], 1)
+        return metrics
+    
     def send_webhook(self, config: WebhookConfig, event_type: str, payload: Dict[str, Any]) -> bool:
         """
         Send webhook notification to third-party system
@@ -40,15 +93,12 @@ class WebhookManager:
             return False
         
         # Prepare webhook payload
-        webhook_payload = self._prepare_payload(config, event_type, payload)
-        
-        # Prepare headers
-        headers = self._prepare_headers(config, webhook_payload)
+        webhook_payload = self.prepare_payload(config, event_type, payload)
         
         # Send webhook with retries
-        return self._send_with_retries(config, webhook_payload, headers)
+        return self._send_with_retries(config, webhook_payload)
     
-    def _prepare_payload(self, config: WebhookConfig, event_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    def prepare_payload(self, config: WebhookConfig, event_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         """Prepare the webhook payload based on provider format"""
         base_payload = {
             'event_type': event_type,
@@ -226,39 +276,65 @@ class WebhookManager:
             hashlib.sha256
         ).hexdigest()
     
-    def _send_with_retries(self, config: WebhookConfig, payload: Dict[str, Any], headers: Dict[str, str]) -> bool:
-        """Send webhook with retry logic"""
+    def deliver(self, config: WebhookConfig, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Make one delivery attempt of a prepared payload (no retries, no database writes)
+        
+        Returns:
+            Dictionary with success, status_code and error
+        """
+        start = time.perf_counter()
+        try:
+            headers = self._prepare_headers(config, payload)
+            response = self._get_session(config.webhook_url).post(
+                config.webhook_url,
+                json=payload,
+                headers=headers,
+                timeout=config.timeout_seconds
+            )
+            
+            if response.status_code in [200, 201, 202, 204]:
+                result = {'success': True, 'status_code': response.status_code, 'error': None}
+            else:
+                result = {
+                    'success': False,
+                    'status_code': response.status_code,
+                    'error': f"HTTP {response.status_code}: {response.text[:500]}"
+                }
+            
+        except requests.exceptions.Timeout:
+            result = {'success': False, 'status_code': None, 'error': 'Timed out'}
+        except requests.exceptions.ConnectionError:
+            result = {'success': False, 'status_code': None, 'error': 'Connection error'}
+        except Exception as e:
+            result = {'success': False, 'status_code': None, 'error': f'Unexpected error: {str(e)}'}
+        
+        self._record_metrics(config, result, (time.perf_counter() - start) * 1000)
+        return result
+    
+    def _send_with_retries(self, config: WebhookConfig, payload: Dict[str, Any]) -> bool:
+        """Send webhook with retry logic (blocks the caller; notifications go through the webhook outbox)"""
+        if not self._deliver_with_retries(config, payload):
+            return False
+        
+        # Update last_used timestamp
+        config.last_used = datetime.utcnow()
+        db.session.commit()
+        return True
+    
+    def _deliver_with_retries(self, config: WebhookConfig, payload: Dict[str, Any]) -> bool:
+        """Deliver with retries and exponential backoff, without database access"""
         max_retries = config.retry_count
-        timeout = config.timeout_seconds
         
         for attempt in range(max_retries + 1):
-            try:
-                self.logger.info(f"Sending webhook to {config.name} (attempt {attempt + 1}/{max_retries + 1})")
-                
-                response = requests.post(
-                    config.webhook_url,
-                    json=payload,
-                    headers=headers,
-                    timeout=timeout
-                )
-                
-                if response.status_code in [200, 201, 202, 204]:
-                    self.logger.info(f"Webhook {config.name} sent successfully: {response.status_code}")
-                    
-                    # Update last_used timestamp
-                    config.last_used = datetime.utcnow()
-                    db.session.commit()
-                    
-                    return True
-                else:
-                    self.logger.warning(f"Webhook {config.name} failed with status {response.status_code}: {response.text}")
-                    
-            except requests.exceptions.Timeout:
-                self.logger.warning(f"Webhook {config.name} timed out (attempt {attempt + 1})")
-            except requests.exceptions.ConnectionError:
-                self.logger.warning(f"Webhook {config.name} connection error (attempt {attempt + 1})")
-            except Exception as e:
-                self.logger.error(f"Webhook {config.name} unexpected error: {str(e)}")
+            self.logger.info(f"Sending webhook to {config.name} (attempt {attempt + 1}/{max_retries + 1})")
+            result = self.deliver(config, payload)
+            
+            if result['success']:
+                self.logger.info(f"Webhook {config.name} sent successfully: {result['status_code']}")
+                return True
+            
+            self.logger.warning(f"Webhook {config.name} failed (attempt {attempt + 1}): {result['error']}")
             
             # Wait before retry (exponential backoff)
             if attempt < max_retries:
@@ -268,30 +344,6 @@ class WebhookManager:
         self.logger.error(f"Webhook {config.name} failed after {max_retries + 1} attempts")
         return False
     
-    def send_to_all_webhooks(self, event_type: str, payload: Dict[str, Any]) -> List[bool]:
-        """
-        Send event to all active webhooks that support the event type
-        
-        Args:
-            event_type: Type of event to send
-            payload: Event data
-            
-        Returns:
-            List of boolean results for each webhook
-        """
-        webhooks = WebhookConfig.query.filter_by(is_active=True).all()
-        results = []
-        
-        for webhook in webhooks:
-            try:
-                result = self.send_webhook(webhook, event_type, payload)
-                results.append(result)
-            except Exception as e:
-                self.logger.error(f"Error sending to webhook {webhook.name}: {str(e)}")
-                results.append(False)
-        
-        return results
-    
     def test_webhook(self, config: WebhookConfig) -> Dict[str, Any]:
         """
         Test webhook configuration with a sample payload
@@ -330,4 +382,6 @@ class WebhookManager:
             }
 
 # Global webhook manager instance
-webhook_manager = WebhookManager()
\ No newline at end of file
+webhook_manager = WebhookManager(
+    pool_maxsize=int(os.environ.get('WEBHOOK_POOL_SIZE', 4))
+)
\ No newline at end of file
@@ -0,0 +1,366 @@
+"""
+Durable outbox for webhook notifications.
+
+Live chat events are written to the webhook_deliveries table in the caller's transaction and the
+request returns immediately; the delivery exists once that transaction commits. A background thread
+in every worker claims due deliveries, sends them concurrently on a small thread pool, and
+reschedules failures with exponential backoff until the webhook's retry count is used up.
+Deliveries survive restarts, and a delivery claimed by a worker that died is picked up again once
+its claim goes stale. While nothing is queued, a poll is a single indexed read.
+
+Webhooks with batching enabled get their events coalesced, in order, into one payload per batch
+window (or as soon as batch_max_events are waiting).
+"""
+
+import os
+import json
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional
+from sqlalchemy import event as sqlalchemy_event, and_, or_
+from sqlalchemy.orm import Session
+from models import WebhookConfig, WebhookDelivery, db
+from webhook_manager import webhook_manager
+
+_WAKE_KEY = 'webhook_outbox_wake'
+
+
+class WebhookOutbox:
+    """Queues webhook notifications in the database and delivers them in the background"""
+
+    def __init__(self, poll_interval_seconds: float = 5, batch_size: int = 20, max_workers: int = 4,
+                 base_backoff_seconds: float = 2, max_backoff_seconds: float = 300, stale_claim_seconds: int = 300):
+        self.poll_interval_seconds = poll_interval_seconds
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.stale_claim_seconds = stale_claim_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._app = None
+        self._thread = None
+        self._thread_pid = None
+        self._executor = None
+        self._executor_pid = None
+        # Events queued by this worker per batching webhook since its last wake-up
+        self._batched_since_wake: Dict[int, int] = {}
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app) -> None:
+        """Deliver queued notifications in the background of every worker serving this Flask app"""
+        self._app = app
+        # Started on the first request so that every gunicorn worker (after fork) runs its own thread
+        app.before_request(self._ensure_worker)
+        atexit.register(self.shutdown)
+
+    def enqueue(self, config: WebhookConfig, event_type: str, payload: Dict[str, Any]) -> Optional[WebhookDelivery]:
+        """Queue a notification for a webhook; returns the delivery, or None if the webhook doesn't take the event
+
+        The delivery is added to the current transaction and is sent once the caller commits it.
+        """
+        if not config.is_active:
+            self.logger.info(f"Webhook {config.name} is inactive, skipping")
+            return None
+
+        if event_type not in config.get_event_types():
+            self.logger.debug(f"Event type {event_type} not configured for webhook {config.name}")
+            return None
+
+        # The provider payload is built now so the event keeps its original timestamp
+        now = datetime.utcnow()
+        delivery = WebhookDelivery(
+            webhook_config_id=config.id,
+            event_type=event_type,
+            payload=json.dumps(webhook_manager.prepare_payload(config, event_type, payload), default=str),
+            # Batched events wait for the rest of their window
+            next_attempt_at=now + timedelta(seconds=config.batch_window_seconds or 0) if config.batch_enabled else now
+        )
+        if db.session.get_bind().dialect.name == 'sqlite':
+            # pysqlite only opens a transaction before DML, so a SAVEPOINT taken first would start (and its
+            # release commit) a transaction of its own, outside the caller's
+            db.session.add(delivery)
+        else:
+            # The savepoint keeps a failed insert from aborting the caller's transaction
+            with db.session.begin_nested():
+                db.session.add(delivery)
+
+        self._ensure_worker()
+        if not config.batch_enabled or self._batch_filled(config):
+            db.session.info[_WAKE_KEY] = True
+        return delivery
+
+    def enqueue_all(self, event_type: str, payload: Dict[str, Any]) -> List[WebhookDelivery]:
+        """Queue a notification for every active webhook that takes the event type"""
+        deliveries = []
+        for config in WebhookConfig.query.filter_by(is_active=True).order_by(WebhookConfig.id).all():
+            try:
+                delivery = self.enqueue(config, event_type, payload)
+            except Exception as e:
+                # One broken webhook configuration must not keep the others from being notified
+                self.logger.error(f"Error queueing {event_type} for webhook {config.name}: {str(e)}")
+                continue
+            if delivery is not None:
+                deliveries.append(delivery)
+        return deliveries
+
+    def _batch_filled(self, config: WebhookConfig) -> bool:
+        """Whether this worker has queued a full batch for the webhook since it last woke the sender.
+
+        Only an early wake-up: full batches queued across several workers are found by the next poll.
+        """
+        with self._lock:
+            count = self._batched_since_wake.get(config.id, 0) + 1
+            if count >= (config.batch_max_events or 1):
+                self._batched_since_wake.pop(config.id, None)
+                return True
+            self._batched_since_wake[config.id] = count
+            return False
+
+    def wake(self) -> None:
+        """Look for due deliveries now instead of at the next poll"""
+        self._wake.set()
+
+    def _ensure_worker(self) -> None:
+        if self._app is None:
+            return
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='webhook-outbox', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='webhook-delivery')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with self._app.app_context():
+                    processed = self.process_due()
+            except Exception as e:
+                self.logger.error(f"Error processing webhook outbox: {str(e)}")
+                processed = 0
+            if processed < self.batch_size:
+                # Nothing more due right now: sleep until the next poll or a new enqueue
+                self._wake.wait(self.poll_interval_seconds)
+                self._wake.clear()
+
+    def _release_stale_claims(self, now: datetime) -> None:
+        """Release claims of workers that died mid-delivery"""
+        WebhookDelivery.query.filter(
+            WebhookDelivery.status == 'sending',
+            WebhookDelivery.locked_at < now - timedelta(seconds=self.stale_claim_seconds)
+        ).update({WebhookDelivery.status: 'pending', WebhookDelivery.locked_at: None}, synchronize_session=False)
+        db.session.commit()
+
+    def _claim(self, delivery_id: int, now: datetime) -> bool:
+        """Claim one delivery; the conditional UPDATE keeps other workers from sending it too"""
+        return bool(WebhookDelivery.query.filter(
+            WebhookDelivery.id == delivery_id, WebhookDelivery.status == 'pending'
+        ).update({WebhookDelivery.status: 'sending', WebhookDelivery.locked_at: now}, synchronize_session=False))
+
+    def _claim_due(self, now: datetime, batching_config_ids: List[int]) -> List[List[WebhookDelivery]]:
+        """Claim due deliveries of webhooks without batching, one job per delivery"""
+        query = db.session.query(WebhookDelivery.id).filter(
+            WebhookDelivery.status == 'pending',
+            WebhookDelivery.next_attempt_at <= now
+        )
+        if batching_config_ids:
+            query = query.filter(WebhookDelivery.webhook_config_id.notin_(batching_config_ids))
+        candidate_ids = [row.id for row in query.order_by(WebhookDelivery.next_attempt_at).limit(self.batch_size)]
+
+        claimed_ids = [delivery_id for delivery_id in candidate_ids if self._claim(delivery_id, now)]
+        db.session.commit()
+
+        if not claimed_ids:
+            return []
+        return [[delivery] for delivery in WebhookDelivery.query.filter(WebhookDelivery.id.in_(claimed_ids)).all()]
+
+    def _claim_batch(self, config: WebhookConfig, now: datetime) -> List[WebhookDelivery]:
+        """Claim the oldest waiting events of a batching webhook once its window or size threshold is reached.
+
+        Events go out in the order they were queued: a batch is only started when no earlier batch of
+        the webhook is in flight, and a batch waiting to be retried holds back the events queued after it.
+        """
+        in_flight = db.session.query(WebhookDelivery.id).filter(
+            WebhookDelivery.webhook_config_id == config.id,
+            WebhookDelivery.status == 'sending'
+        ).first()
+        if in_flight:
+            return []
+
+        max_events = max(config.batch_max_events or 1, 1)
+        waiting = WebhookDelivery.query.filter(
+            WebhookDelivery.webhook_config_id == config.id,
+            WebhookDelivery.status == 'pending'
+        ).order_by(WebhookDelivery.id).limit(max_events).all()
+        if not waiting:
+            return []
+
+        oldest = waiting[0]
+        full = len(waiting) >= max_events and not oldest.attempts
+        if oldest.next_attempt_at > now and not full:
+            return []
+
+        # Whoever claims the oldest event owns the batch; other workers skip this webhook
+        if not self._claim(oldest.id, now):
+            db.session.rollback()
+            return []
+        claimed = [oldest] + [delivery for delivery in waiting[1:] if self._claim(delivery.id, now)]
+        db.session.commit()
+        return claimed
+
+    def _batch_payload(self, config: WebhookConfig, deliveries: List[WebhookDelivery]) -> Dict[str, Any]:
+        """One payload for a batch of events, in the order they were queued"""
+        return {
+            'event_type': 'batch',
+            'timestamp': datetime.utcnow().isoformat(),
+            'source': 'rag_chatbot',
+            'count': len(deliveries),
+            'events': [
+                {'event_type': delivery.event_type, 'created_at': delivery.created_at.isoformat(), 'payload': delivery.get_payload()}
+                for delivery in deliveries
+            ]
+        }
+
+    def _has_work(self, now: datetime, batching_config_ids: List[int]) -> bool:
+        """Read-only check for anything to claim: a due delivery, a stale claim or an event waiting in a batch"""
+        conditions = [
+            and_(WebhookDelivery.status == 'pending', WebhookDelivery.next_attempt_at <= now),
+            and_(WebhookDelivery.status == 'sending',
+                 WebhookDelivery.locked_at < now - timedelta(seconds=self.stale_claim_seconds))
+        ]
+        if batching_config_ids:
+            # A full batch is sent before its window ends
+            conditions.append(and_(WebhookDelivery.status == 'pending',
+                                   WebhookDelivery.webhook_config_id.in_(batching_config_ids)))
+        return db.session.query(WebhookDelivery.id).filter(or_(*conditions)).first() is not None
+
+    def process_due(self) -> int:
+        """Send all due deliveries and batches and record the outcomes; returns how many deliveries were processed"""
+        now = datetime.utcnow()
+        batching_configs = WebhookConfig.query.filter_by(batch_enabled=True).all()
+        # Idle polls stop here, so an empty queue costs no UPDATE or commit
+        if not self._has_work(now, [config.id for config in batching_configs]):
+            db.session.rollback()
+            return 0
+        self._release_stale_claims(now)
+
+        jobs = self._claim_due(now, [config.id for config in batching_configs])
+        for config in batching_configs:
+            batch = self._claim_batch(config, now)
+            if batch:
+                jobs.append(batch)
+        if not jobs:
+            return 0
+
+        config_ids = {job[0].webhook_config_id for job in jobs}
+        configs = {config.id: config for config in WebhookConfig.query.filter(WebhookConfig.id.in_(config_ids))}
+
+        # HTTP requests run concurrently on the pool; database updates stay on this thread
+        executor = self._get_executor()
+        futures = []
+        for job in jobs:
+            config = configs.get(job[0].webhook_config_id)
+            future = None
+            if config is not None and config.is_active:
+                payload = self._batch_payload(config, job) if config.batch_enabled else job[0].get_payload()
+                future = executor.submit(webhook_manager.deliver, config, payload)
+            futures.append(future)
+
+        processed = 0
+        for job, future in zip(jobs, futures):
+            if future is None:
+                result = {'success': False, 'status_code': None, 'error': 'Webhook deleted or inactive'}
+            else:
+                result = future.result()
+            done_at = datetime.utcnow()
+            for delivery in job:
+                self._record_result(delivery, configs.get(delivery.webhook_config_id), result, done_at)
+            processed += len(job)
+
+        db.session.commit()
+        return processed
+
+    def _record_result(self, delivery: WebhookDelivery, config: Optional[WebhookConfig], result: Dict[str, Any], now: datetime) -> None:
+        delivery.attempts = (delivery.attempts or 0) + 1
+        delivery.locked_at = None
+        delivery.last_status_code = result['status_code']
+        delivery.last_error = result['error']
+
+        if result['success']:
+            delivery.status = 'delivered'
+            delivery.delivered_at = now
+            config.last_used = now
+            self.delivered += 1
+            self.logger.info(f"Webhook {config.name} delivered {delivery.event_type} (attempt {delivery.attempts})")
+            return
+
+        max_attempts = (config.retry_count if config is not None and config.is_active else 0) + 1
+        if delivery.attempts >= max_attempts:
+            delivery.status = 'failed'
+            self.failed += 1
+            self.logger.error(f"Webhook delivery {delivery.id} failed after {delivery.attempts} attempts: {result['error']}")
+            return
+
+        # Exponential backoff: 2s, 4s, 8s... capped
+        delay = min(self.base_backoff_seconds * (2 ** (delivery.attempts - 1)), self.max_backoff_seconds)
+        delivery.status = 'pending'
+        delivery.next_attempt_at = now + timedelta(seconds=delay)
+        self.retried += 1
+        self.logger.warning(f"Webhook delivery {delivery.id} failed (attempt {delivery.attempts}), retrying in {delay:g}s: {result['error']}")
+
+    def shutdown(self) -> None:
+        """Stop the background thread; undelivered notifications stay queued in the database"""
+        self._stop.set()
+        self._wake.set()
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        counts = dict(db.session.query(WebhookDelivery.status, db.func.count(WebhookDelivery.id)).group_by(WebhookDelivery.status).all())
+        return {
+            'queued': counts,
+            'delivered': self.delivered,
+            'retried': self.retried,
+            'failed': self.failed,
+            'worker_running': self._thread is not None and self._thread.is_alive()
+        }
+
+
+@sqlalchemy_event.listens_for(Session, 'after_commit')
+def _wake_after_commit(session) -> None:
+    # Also fired when a SAVEPOINT is released; the deliveries only exist after the outermost commit
+    if session.in_nested_transaction():
+        return
+    if session.info.pop(_WAKE_KEY, None):
+        webhook_outbox.wake()
+
+
+@sqlalchemy_event.listens_for(Session, 'after_soft_rollback')
+def _discard_wake(session, previous_transaction) -> None:
+    if not session.in_transaction():
+        session.info.pop(_WAKE_KEY, None)
+
+
+# Global webhook outbox instance
+webhook_outbox = WebhookOutbox(
+    poll_interval_seconds=float(os.environ.get('WEBHOOK_OUTBOX_POLL_SECONDS', 5)),
+    batch_size=int(os.environ.get('WEBHOOK_OUTBOX_BATCH_SIZE', 20)),
+    max_workers=int(os.environ.get('WEBHOOK_OUTBOX_WORKERS', 4)),
+    max_backoff_seconds=float(os.environ.get('WEBHOOK_OUTBOX_MAX_BACKOFF_SECONDS', 300))
+)